@@ -62,7 +62,7 @@ class HuggingFaceDownloadModel(io.ComfyNode):
     @classmethod
     def execute(cls, target_folder: dict, link: str) -> io.NodeOutput:
         from .parse_link import parse_link
-        from .downloader import run_download
+        from .downloader import find_shard_set, run_download, run_download_shard_set
 
         selected_folder = target_folder["target_folder"]
         custom_path = target_folder.get("custom_path", "")
@@ -79,8 +79,16 @@ class HuggingFaceDownloadModel(io.ComfyNode):
         except Exception as e:
             return io.NodeOutput(f"Error parsing link: {e}")
 
-        # Step 3: sync download
-        final_message, local_path = run_download(parsed, final_folder, sync=True)
+        # Step 3: sync download (a checkpoint shard brings the rest of its set along)
+        try:
+            shard_set = find_shard_set(parsed)
+        except Exception as e:
+            print(f"[ERROR] Failed to resolve shard set: {e}")
+            shard_set = None
+        if shard_set:
+            final_message, local_path = run_download_shard_set(parsed, final_folder, shard_set, sync=True)
+        else:
+            final_message, local_path = run_download(parsed, final_folder, sync=True)
         if local_path:
             try:
                 import server
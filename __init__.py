@@ -4,28 +4,54 @@ import json
 
 # Monkeypatch huggingface_hub to automatically retry public downloads anonymously
 # if they fail with a token (this resolves fine-grained token 403 blocks for other nodes).
+# Repos that needed the anonymous retry are remembered (see access_cache) and go
+# anonymous first next time, skipping the doomed request with the token.
 try:
     import huggingface_hub.file_download
+    from .access_cache import get_access_strategy, note_attempts_avoided, record_access_strategy
     _orig_hf_hub_download = huggingface_hub.file_download.hf_hub_download
 
+    def _call_anonymously(args, kwargs):
+        kwargs_copy = kwargs.copy()
+        kwargs_copy["token"] = False
+        orig_env_token = os.environ.pop("HF_TOKEN", None)
+        try:
+            return _orig_hf_hub_download(*args, **kwargs_copy)
+        finally:
+            if orig_env_token is not None:
+                os.environ["HF_TOKEN"] = orig_env_token
+
     def _patched_hf_hub_download(*args, **kwargs):
+        repo_id = kwargs.get("repo_id") or (args[0] if args else None)
+        token = kwargs.get("token")
+        tried_anonymous = False
+        if token is not False and isinstance(repo_id, str):
+            cached = get_access_strategy(repo_id)
+            if cached and cached.get("anonymous"):
+                tried_anonymous = True
+                try:
+                    result = _call_anonymously(args, kwargs)
+                    note_attempts_avoided(1)
+                    return result
+                except Exception:
+                    pass
         try:
-            return _orig_hf_hub_download(*args, **kwargs)
+            result = _orig_hf_hub_download(*args, **kwargs)
+            if tried_anonymous:
+                record_access_strategy(repo_id, anonymous=False)
+            return result
         except Exception as e:
             e_str = str(e)
             if "403" in e_str or "401" in e_str or "AccessDenied" in e_str or "Forbidden" in e_str:
-                token = kwargs.get("token")
-                if token is not False:
-                    kwargs_copy = kwargs.copy()
-                    kwargs_copy["token"] = False
-                    orig_env_token = os.environ.pop("HF_TOKEN", None)
+                if token is not False and not tried_anonymous:
                     try:
-                        return _orig_hf_hub_download(*args, **kwargs_copy)
+                        result = _call_anonymously(args, kwargs)
                     except Exception:
                         pass
-                    finally:
-                        if orig_env_token is not None:
-                            os.environ["HF_TOKEN"] = orig_env_token
+                    else:
+                        if isinstance(repo_id, str):
+                            record_access_strategy(repo_id, anonymous=True)
+                        return result
             raise e
 
     huggingface_hub.file_download.hf_hub_download = _patched_hf_hub_download
@@ -0,0 +1,161 @@
+"""
+Per-repo memory of which download route last worked.
+
+Some repos always need the same route: Xet-backed repos need the Xet client,
+fine-grained tokens 403 on public repos and only work anonymously, and some
+mirrors only serve the manual redirect download. Recording the route that
+succeeded lets the next download of the same repo start there instead of
+walking the whole fallback chain again. Entries are keyed by Hub endpoint and
+repo id, expire after HF_DOWNLOADER_ACCESS_CACHE_HOURS and are persisted next
+to the other downloader state in user/default.
+
+A route is described by:
+  route      "direct" (resolve URL streamed by download_engine) or "hub" (worker process)
+  anonymous  True if the request only worked without the token
+  xet        hub route only: Xet on/off
+  stage      hub route only: 1-4, see hub_worker.FILE_STAGES
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+ACCESS_CACHE_PATH = os.path.join("user", "default", "hf_access_strategies.json")
+ACCESS_CACHE_VERSION = 1
+ACCESS_CACHE_TTL_SECONDS = _env_int("HF_DOWNLOADER_ACCESS_CACHE_HOURS", 24, 0) * 3600
+ACCESS_CACHE_MAX_ENTRIES = 2000
+
+_cache_lock = threading.Lock()
+_entries = {}
+_loaded = False
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "invalidated": 0,
+    "attempts_avoided": 0,
+}
+
+
+def _hub_endpoint() -> str:
+    try:
+        from huggingface_hub.constants import ENDPOINT
+        return str(ENDPOINT or "").rstrip("/") or "https://huggingface.co"
+    except Exception:
+        return "https://huggingface.co"
+
+
+def _cache_key(repo_id: str) -> str:
+    return f"{_hub_endpoint()}|{str(repo_id or '').strip()}"
+
+
+def _load_locked():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(ACCESS_CACHE_PATH, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"[DEBUG] Ignoring unreadable access cache {ACCESS_CACHE_PATH}: {e}")
+        return
+    if not isinstance(state, dict) or state.get("version") != ACCESS_CACHE_VERSION:
+        return
+    now = time.time()
+    for key, entry in (state.get("entries") or {}).items():
+        if isinstance(entry, dict) and float(entry.get("expires_at") or 0) > now:
+            _entries[key] = entry
+
+
+def _save_locked():
+    if len(_entries) > ACCESS_CACHE_MAX_ENTRIES:
+        oldest = sorted(_entries, key=lambda k: float(_entries[k].get("updated_at") or 0))
+        for key in oldest[:len(_entries) - ACCESS_CACHE_MAX_ENTRIES]:
+            _entries.pop(key, None)
+    try:
+        os.makedirs(os.path.dirname(ACCESS_CACHE_PATH), exist_ok=True)
+        tmp_path = ACCESS_CACHE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": ACCESS_CACHE_VERSION, "entries": _entries}, f, indent=2)
+        os.replace(tmp_path, ACCESS_CACHE_PATH)
+    except Exception as e:
+        print(f"[DEBUG] Failed to persist access cache: {e}")
+
+
+def get_access_strategy(repo_id: str) -> Optional[dict]:
+    """Return the cached route for repo_id, or None if unknown or expired."""
+    if not repo_id or ACCESS_CACHE_TTL_SECONDS <= 0:
+        return None
+    key = _cache_key(repo_id)
+    with _cache_lock:
+        _load_locked()
+        entry = _entries.get(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        if float(entry.get("expires_at") or 0) <= time.time():
+            _entries.pop(key, None)
+            _stats["expired"] += 1
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        return dict(entry)
+
+
+def record_access_strategy(repo_id: str, **fields) -> None:
+    """Merge fields into repo_id's entry and push its expiry out; only writes to disk on change."""
+    if not repo_id or ACCESS_CACHE_TTL_SECONDS <= 0:
+        return
+    key = _cache_key(repo_id)
+    now = time.time()
+    with _cache_lock:
+        _load_locked()
+        entry = dict(_entries.get(key) or {})
+        changed = any(entry.get(name) != value for name, value in fields.items())
+        # Refreshing an unchanged entry only needs a write once half its lifetime is gone.
+        stale = float(entry.get("expires_at") or 0) - now < ACCESS_CACHE_TTL_SECONDS / 2
+        if not changed and not stale:
+            return
+        entry.update(fields)
+        entry["updated_at"] = now
+        entry["expires_at"] = now + ACCESS_CACHE_TTL_SECONDS
+        _entries[key] = entry
+        _save_locked()
+
+
+def forget_access_strategy(repo_id: str) -> None:
+    """Drop repo_id's entry after its cached route stopped working."""
+    key = _cache_key(repo_id)
+    with _cache_lock:
+        _load_locked()
+        if _entries.pop(key, None) is not None:
+            _stats["invalidated"] += 1
+            _save_locked()
+
+
+def note_attempts_avoided(count: int) -> None:
+    if count > 0:
+        with _cache_lock:
+            _stats["attempts_avoided"] += int(count)
+
+
+def get_access_cache_stats() -> dict:
+    with _cache_lock:
+        _load_locked()
+        stats = dict(_stats)
+        stats["entries"] = len(_entries)
+    return stats
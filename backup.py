@@ -12,6 +12,8 @@ from importlib import metadata
 from huggingface_hub import HfApi
 from .parse_link import parse_link
 from .file_manager import get_comfy_root, get_models_root
+from .file_transfer import finalize_file
+from .repo_metadata import get_repo_files_metadata, invalidate_repo_metadata
 
 PLACEHOLDER_MODEL_FILE_RE = re.compile(r"^put[\s._-]*models?[\s._-]*here(?:\.[^/\\]+)?$", re.IGNORECASE)
 LOCAL_SUBGRAPH_PATHS = (
@@ -607,6 +609,7 @@ def _retry_upload(api, upload_path, repo_name, token, path_in_repo, ignore_patte
                 if ignore_patterns:
                     kwargs["ignore_patterns"] = ignore_patterns
                 api.upload_folder(**kwargs)
+            invalidate_repo_metadata(repo_name)
             return True
         except Exception as e:
             last_error = e
@@ -1069,7 +1072,7 @@ def _safe_move_or_copy(src, dst):
         if os.path.isdir(src):
             shutil.copytree(src, dst, dirs_exist_ok=True)
         else:
-            shutil.copy2(src, dst)
+            finalize_file(src, dst, preserve_metadata=True)
 
 def _extract_custom_nodes_archive(src_file, target_dir):
     """
@@ -1275,8 +1278,9 @@ def restore_from_huggingface(repo_name_or_link, target_dir=None):
                                         print(f"[INFO] Updating file: {rel_path}")
                                     else:
                                         print(f"[INFO] Copying new file: {rel_path}")
-                                    shutil.copy2(src_file, dst_file)
-                                    print(f"[DEBUG] Successfully copied {rel_path}")
+                                    # temp_dir is discarded afterwards, so files can be moved out of it
+                                    strategy = finalize_file(src_file, dst_file, move=True, preserve_metadata=True)
+                                    print(f"[DEBUG] Successfully copied {rel_path} ({strategy})")
                             except Exception as e:
                                 print(f"[ERROR] Failed to copy file {rel_path}: {e}")
 
@@ -1703,29 +1707,20 @@ def get_backup_browser_tree(repo_name_or_link: str) -> dict:
     try:
         api = HfApi(token=token)
         comfy_files = []
-        siblings = None
+        repo_files_metadata = None
         try:
-            try:
-                repo_info = api.repo_info(repo_id=repo_name, token=token, files_metadata=True)
-            except TypeError:
-                repo_info = api.repo_info(repo_id=repo_name, token=token)
-            siblings = getattr(repo_info, "siblings", None)
+            repo_files_metadata = get_repo_files_metadata(repo_name, token=token)
         except Exception as e:
             print(f"[WARNING] Could not fetch repo metadata for size info: {e}")
 
-        if siblings:
+        if repo_files_metadata:
             size_acc = 0
             has_size_data = False
-            for sibling in siblings:
-                if isinstance(sibling, dict):
-                    rfilename = sibling.get("rfilename", "")
-                    size = sibling.get("size")
-                else:
-                    rfilename = getattr(sibling, "rfilename", "") or ""
-                    size = getattr(sibling, "size", None)
+            for rfilename, entry in repo_files_metadata.items():
                 if not rfilename.startswith("ComfyUI/"):
                     continue
                 comfy_files.append(rfilename)
+                size = (entry or {}).get("size")
                 if isinstance(size, (int, float)):
                     size_acc += int(size)
                     has_size_data = True
@@ -1822,7 +1817,8 @@ def _copy_repo_file_to_target(src_file: str, repo_file: str, target_dir: str, to
             json.dump(new_settings, handle, indent=2)
         return
 
-    shutil.copy2(src_file, dst_file)
+    # src_file lives in the shared HF cache: clone or copy it, never hardlink.
+    finalize_file(src_file, dst_file, preserve_metadata=True)
 
 
 def restore_selected_from_huggingface(repo_name_or_link: str, selections: list, target_dir=None) -> dict:
@@ -1926,7 +1922,13 @@ def _delete_repo_files(api: HfApi, repo_name: str, token: str, files: list) -> i
     files = sorted(set(files))
     if not files:
         return 0
+    try:
+        return _delete_repo_files_uncached(api, repo_name, token, files)
+    finally:
+        invalidate_repo_metadata(repo_name)
+
 
+def _delete_repo_files_uncached(api: HfApi, repo_name: str, token: str, files: list) -> int:
     try:
         from huggingface_hub import CommitOperationDelete
         operations = [CommitOperationDelete(path_in_repo=path) for path in files]
@@ -0,0 +1,315 @@
+"""
+Local index of model files by SHA256, for reusing weights that are already on disk.
+
+The same weights are often requested under different names or folders (a VAE as
+both ae.safetensors and flux_vae.safetensors, one checkpoint in checkpoints and
+diffusion_models). Files whose SHA256 was verified after a download, or hashed
+by the background indexer, are recorded here. A download whose remote LFS
+SHA256 is already indexed becomes a hardlink or reflink of the local copy.
+
+Entries are trusted only while the file keeps the identity it had when it was
+hashed (device, inode, size, mtime_ns); anything else is dropped on lookup.
+That also makes the index the verification cache: cached_sha256() answers from a
+single stat, for the recorded path or any hardlink of it, so a file that was
+verified once is not read again until it changes. Direct-URL downloads also
+remember which SHA256 their URL produced, so peers (see peer_mirror) can be asked
+for a URL they fetched before. The index is persisted next to the other
+downloader state in user/default.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+CONTENT_INDEX_PATH = os.path.join("user", "default", "hf_content_index.json")
+# 2: signatures carry device and inode besides size and mtime.
+CONTENT_INDEX_VERSION = 2
+# Small files are cheaper to download again than to track.
+CONTENT_INDEX_MIN_BYTES = 1024 * 1024
+# Background hashing reads at most this fast so it doesn't compete with ComfyUI for the disk; 0 = unlimited.
+CONTENT_INDEX_HASH_BYTES_PER_SECOND = _env_int("HF_DOWNLOADER_INDEX_MAX_MB_PER_SEC", 200, 0) * 1024 * 1024
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+_index_lock = threading.Lock()
+# sha256 -> {path: [size, mtime_ns, device, inode]}
+_by_sha = {}
+# path -> sha256
+_by_path = {}
+# (device, inode) -> a path recorded with that identity
+_by_identity = {}
+# source URL -> sha256 of the file it last produced
+_by_source = {}
+_loaded = False
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "stale": 0,
+    "recorded": 0,
+    "verify_hits": 0,
+    "verify_misses": 0,
+    "hashed_files": 0,
+    "hashed_bytes": 0,
+    "linked_files": 0,
+    "saved_bytes": 0,
+}
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _signature(path: str) -> Optional[list]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns, stat.st_dev, stat.st_ino]
+
+
+def _load_locked():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(CONTENT_INDEX_PATH, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"[DEBUG] Ignoring unreadable content index {CONTENT_INDEX_PATH}: {e}")
+        return
+    if not isinstance(state, dict) or state.get("version") not in (1, CONTENT_INDEX_VERSION):
+        return
+    for source, sha in (state.get("sources") or {}).items():
+        if isinstance(sha, str):
+            _by_source[source] = sha
+    for sha, paths in (state.get("files") or {}).items():
+        if not isinstance(paths, dict):
+            continue
+        for path, signature in paths.items():
+            if isinstance(signature, list) and len(signature) == 2:
+                # Version 1 entry: adopt the file's current identity if size and mtime still match.
+                current = _signature(path)
+                signature = current if current and current[:2] == signature else None
+            if isinstance(signature, list) and len(signature) == 4:
+                _by_sha.setdefault(sha, {})[path] = signature
+                _by_path[path] = sha
+                _by_identity[(signature[2], signature[3])] = path
+
+
+def _save_locked():
+    try:
+        os.makedirs(os.path.dirname(CONTENT_INDEX_PATH), exist_ok=True)
+        tmp_path = CONTENT_INDEX_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CONTENT_INDEX_VERSION, "files": _by_sha, "sources": _by_source}, f)
+        os.replace(tmp_path, CONTENT_INDEX_PATH)
+    except Exception as e:
+        print(f"[DEBUG] Failed to persist content index: {e}")
+
+
+def _drop_locked(path: str):
+    sha = _by_path.pop(path, None)
+    if sha is None:
+        return
+    paths = _by_sha.get(sha)
+    if paths is not None:
+        signature = paths.pop(path, None)
+        if signature and _by_identity.get((signature[2], signature[3])) == path:
+            _by_identity.pop((signature[2], signature[3]), None)
+        if not paths:
+            _by_sha.pop(sha, None)
+
+
+def record_file(path: str, sha256: str, save: bool = True, source: Optional[str] = None) -> bool:
+    """
+    Remember that path currently holds content with this SHA256 (only call with a
+    verified digest), and optionally the URL it was downloaded from.
+    """
+    if not path or not sha256:
+        return False
+    signature = _signature(path)
+    if signature is None or signature[0] < CONTENT_INDEX_MIN_BYTES:
+        return False
+    key = _norm(path)
+    sha = str(sha256).strip().lower()
+    with _index_lock:
+        _load_locked()
+        if source and _by_source.get(source) != sha:
+            _by_source[source] = sha
+        elif _by_path.get(key) == sha and _by_sha.get(sha, {}).get(key) == signature:
+            return True
+        _drop_locked(key)
+        _by_sha.setdefault(sha, {})[key] = signature
+        _by_path[key] = sha
+        _by_identity[(signature[2], signature[3])] = key
+        _stats["recorded"] += 1
+        if save:
+            _save_locked()
+    return True
+
+
+def forget_file(path: str) -> None:
+    key = _norm(path)
+    with _index_lock:
+        _load_locked()
+        if key in _by_path:
+            _drop_locked(key)
+            _save_locked()
+
+
+def is_indexed(path: str) -> bool:
+    """True if path is in the index and unchanged since it was hashed."""
+    key = _norm(path)
+    with _index_lock:
+        _load_locked()
+        sha = _by_path.get(key)
+        return bool(sha) and _by_sha.get(sha, {}).get(key) == _signature(key)
+
+
+def find_file(sha256: str, size: Optional[int] = None, exclude: Optional[str] = None) -> Optional[str]:
+    """A local file with this SHA256 (and size, if given), or None. Entries that changed are dropped."""
+    if not sha256:
+        return None
+    sha = str(sha256).strip().lower()
+    skip = _norm(exclude) if exclude else None
+    with _index_lock:
+        _load_locked()
+        stale = []
+        found = None
+        for path, signature in list((_by_sha.get(sha) or {}).items()):
+            if path == skip:
+                continue
+            if _signature(path) != signature:
+                stale.append(path)
+                continue
+            if size is not None and signature[0] != size:
+                continue
+            found = path
+            break
+        for path in stale:
+            _drop_locked(path)
+        _stats["stale"] += len(stale)
+        _stats["hits" if found else "misses"] += 1
+        if stale:
+            _save_locked()
+    return found
+
+
+def cached_sha256(path: str) -> Optional[str]:
+    """
+    SHA256 recorded for the file at path, if it (or a hardlink to it) was hashed
+    with its current device, inode, size and mtime; None means it must be hashed.
+    """
+    signature = _signature(path)
+    if signature is None:
+        return None
+    key = _norm(path)
+    with _index_lock:
+        _load_locked()
+        found = None
+        for candidate in (key, _by_identity.get((signature[2], signature[3]))):
+            sha = _by_path.get(candidate) if candidate else None
+            if sha and _by_sha.get(sha, {}).get(candidate) == signature:
+                found = sha
+                break
+        _stats["verify_hits" if found else "verify_misses"] += 1
+    return found
+
+
+def sha_for_source(source: str) -> Optional[str]:
+    """SHA256 of the file last downloaded from this URL, or None."""
+    with _index_lock:
+        _load_locked()
+        return _by_source.get(source)
+
+
+def note_linked(size: int) -> None:
+    with _index_lock:
+        _stats["linked_files"] += 1
+        _stats["saved_bytes"] += int(size or 0)
+
+
+def hash_file(path: str,
+              should_pause: Optional[Callable[[], bool]] = None,
+              should_stop: Optional[Callable[[], bool]] = None) -> Optional[str]:
+    """
+    SHA256 of a file at CONTENT_INDEX_HASH_BYTES_PER_SECOND, waiting while should_pause()
+    is true. None if stopped or if the file changed while it was read.
+    """
+    before = _signature(path)
+    if before is None:
+        return None
+    digest = hashlib.sha256()
+    buffer = memoryview(bytearray(HASH_CHUNK_BYTES))
+    started = time.monotonic()
+    done = 0
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            if should_stop and should_stop():
+                return None
+            while should_pause and should_pause():
+                if should_stop and should_stop():
+                    return None
+                time.sleep(1.0)
+                started = time.monotonic()
+                done = 0
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(buffer[:count])
+            done += count
+            if CONTENT_INDEX_HASH_BYTES_PER_SECOND > 0:
+                ahead = done / CONTENT_INDEX_HASH_BYTES_PER_SECOND - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+    if _signature(path) != before:
+        return None
+    with _index_lock:
+        _stats["hashed_files"] += 1
+        _stats["hashed_bytes"] += before[0]
+    return digest.hexdigest()
+
+
+def index_files(paths: Iterable[str],
+                should_pause: Optional[Callable[[], bool]] = None,
+                should_stop: Optional[Callable[[], bool]] = None) -> int:
+    """Hash and record every path that is not indexed yet; returns how many were added."""
+    added = 0
+    for path in paths:
+        if should_stop and should_stop():
+            break
+        signature = _signature(path)
+        if signature is None or signature[0] < CONTENT_INDEX_MIN_BYTES or is_indexed(path):
+            continue
+        try:
+            sha = hash_file(path, should_pause, should_stop)
+        except OSError as e:
+            print(f"[DEBUG] Content index: could not hash {path}: {e}")
+            continue
+        if sha and record_file(path, sha):
+            added += 1
+    return added
+
+
+def get_content_index_stats() -> dict:
+    with _index_lock:
+        _load_locked()
+        stats = dict(_stats)
+        stats["files"] = len(_by_path)
+        stats["unique"] = len(_by_sha)
+        stats["sources"] = len(_by_source)
+    return stats
@@ -0,0 +1,193 @@
+"""
+Disk-space admission for downloads.
+
+Before a download starts writing, it reserves the bytes it still needs on the
+volume that holds its destination. The reservation is checked against
+shutil.disk_usage minus the unwritten part of every other reservation on the
+same volume (minus a headroom left for everything else on the machine). A job
+that can never fit is rejected before the first byte; one that only fits
+once the downloads already running give their space back is refused as
+retryable, so the queue can hold it and try again later.
+
+A reservation watches the files (or staging folders) its download writes to,
+and counts their allocated blocks as already consumed. Preallocated and
+partly written files therefore stop being counted twice, and no download has
+to report its progress here.
+"""
+
+import os
+import shutil
+import threading
+import uuid
+from typing import Iterable, Optional
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+# Left free on every volume for ComfyUI, other processes and filesystem metadata.
+DISK_HEADROOM_BYTES = _env_int("HF_DOWNLOADER_DISK_HEADROOM_MB", 1024, 0) * 1024 * 1024
+
+_lock = threading.Lock()
+_reservations = {}
+_stats = {"admitted": 0, "held": 0, "rejected": 0}
+
+
+class InsufficientDiskSpaceError(OSError):
+    """Raised by reserve_disk_space; retryable means it would fit once running downloads finish."""
+
+    def __init__(self, message: str, needed: int, available: int, retryable: bool):
+        super().__init__(message)
+        self.needed = needed
+        self.available = available
+        self.retryable = retryable
+
+
+def _gb(value: int) -> str:
+    return f"{max(0, value) / (1024 ** 3):.2f} GB"
+
+
+def _existing_ancestor(path: str) -> str:
+    current = os.path.abspath(path or ".")
+    while not os.path.exists(current):
+        parent = os.path.dirname(current)
+        if parent == current:
+            break
+        current = parent
+    return current
+
+
+def volume_of(path: str) -> tuple:
+    """(device id, existing path on it) for path, which need not exist yet."""
+    existing = _existing_ancestor(path)
+    try:
+        return os.stat(existing).st_dev, existing
+    except OSError:
+        return existing, existing
+
+
+def allocated_bytes(path: str) -> int:
+    """Bytes actually allocated on disk for a file, or for every file under a folder."""
+    def file_bytes(file_path: str) -> int:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return 0
+        blocks = getattr(stat, "st_blocks", None)
+        return blocks * 512 if blocks is not None else stat.st_size
+
+    if not path:
+        return 0
+    if not os.path.isdir(path):
+        return file_bytes(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += file_bytes(os.path.join(dirpath, name))
+    return total
+
+
+class DiskReservation:
+    """Space promised to one download; release() (or leaving the with block) gives it back."""
+
+    def __init__(self, key: str, volume, needed: int, watch: Iterable[str], label: str):
+        self.key = key
+        self.volume = volume
+        self.needed = int(needed)
+        self.watch = [path for path in watch if path]
+        self.label = label
+        self.baseline = sum(allocated_bytes(path) for path in self.watch)
+
+    def watch_path(self, path: str) -> None:
+        """Also count a path created after the reservation (e.g. a fresh temp folder)."""
+        with _lock:
+            self.watch.append(path)
+
+    def outstanding(self) -> int:
+        """Reserved bytes not yet allocated by the download's own files."""
+        written = sum(allocated_bytes(path) for path in self.watch) - self.baseline
+        return max(0, self.needed - max(0, written))
+
+    def release(self) -> None:
+        with _lock:
+            _reservations.pop(self.key, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def _outstanding_locked(volume) -> int:
+    return sum(r.outstanding() for r in _reservations.values() if r.volume == volume)
+
+
+def reserve_disk_space(path: str,
+                       total_bytes: Optional[int],
+                       watch: Iterable[str] = (),
+                       label: str = "") -> DiskReservation:
+    """
+    Reserve room for total_bytes on the volume holding path (a destination
+    file or folder; it need not exist yet). Bytes already
+    allocated in the watched paths (a resumable .part file, a staging folder)
+    count toward it. Raises InsufficientDiskSpaceError when it doesn't fit.
+    An unknown size reserves nothing and is always admitted.
+    """
+    watch = list(watch or [])
+    volume, existing = volume_of(path)
+    key = uuid.uuid4().hex
+    label = label or os.path.basename(os.path.abspath(path))
+    with _lock:
+        reservation = DiskReservation(key, volume, 0, watch, label)
+        needed = max(0, int(total_bytes or 0) - reservation.baseline)
+        reservation.needed = needed
+        if needed > 0:
+            try:
+                free = shutil.disk_usage(existing).free
+            except OSError as e:
+                print(f"[DEBUG] Could not check free space for {existing}: {e}")
+                free = None
+            if free is not None:
+                usable = free - DISK_HEADROOM_BYTES
+                others = _outstanding_locked(volume)
+                if needed > usable:
+                    _stats["rejected"] += 1
+                    raise InsufficientDiskSpaceError(
+                        f"Not enough disk space for {label}: needs {_gb(needed)}, "
+                        f"{_gb(max(0, usable))} free on {existing} "
+                        f"(keeping {_gb(DISK_HEADROOM_BYTES)} headroom).",
+                        needed, max(0, usable), retryable=False,
+                    )
+                if needed > usable - others:
+                    _stats["held"] += 1
+                    raise InsufficientDiskSpaceError(
+                        f"Waiting for disk space for {label}: needs {_gb(needed)}, "
+                        f"{_gb(max(0, usable - others))} free after running downloads.",
+                        needed, max(0, usable - others), retryable=True,
+                    )
+        _reservations[key] = reservation
+        _stats["admitted"] += 1
+    return reservation
+
+
+def reserved_bytes(path: Optional[str] = None) -> int:
+    """Outstanding reserved bytes on path's volume (all volumes when path is None)."""
+    with _lock:
+        if path is None:
+            return sum(r.outstanding() for r in _reservations.values())
+        return _outstanding_locked(volume_of(path)[0])
+
+
+def get_disk_space_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["active"] = len(_reservations)
+        stats["reserved_bytes"] = sum(r.outstanding() for r in _reservations.values())
+    stats["headroom_bytes"] = DISK_HEADROOM_BYTES
+    return stats
@@ -0,0 +1,925 @@
+import os
+import errno
+import json
+import hashlib
+import socket
+import threading
+import time
+import http.client
+import urllib.error
+import urllib.parse
+from collections import deque
+from typing import Optional, Callable
+
+try:
+    from . import http_pool
+except ImportError:  # loaded as a top-level module by scripts/bench_transfer.py
+    import http_pool
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return str(value).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+# Files smaller than this are always fetched over a single connection.
+SEGMENT_MIN_FILE_BYTES = _env_int("HF_DOWNLOADER_SEGMENT_MIN_BYTES", 64 * 1024 * 1024, 1)
+# Size of one byte range handed to a connection; connections pull ranges until none are left.
+SEGMENT_PIECE_BYTES = _env_int("HF_DOWNLOADER_SEGMENT_PIECE_BYTES", 32 * 1024 * 1024, 1024 * 1024)
+SEGMENT_MAX_CONNECTIONS = _env_int("HF_DOWNLOADER_MAX_CONNECTIONS", 8, 1)
+SEGMENT_INITIAL_CONNECTIONS = min(SEGMENT_MAX_CONNECTIONS, _env_int("HF_DOWNLOADER_INITIAL_CONNECTIONS", 4, 1))
+SEGMENT_MAX_RETRIES = _env_int("HF_DOWNLOADER_SEGMENT_RETRIES", 5, 0)
+# Throughput is re-measured every window; a new connection is only added while it keeps paying off.
+SEGMENT_ADAPT_WINDOW_SECONDS = 3.0
+SEGMENT_ADAPT_MIN_GAIN = 1.10
+# Largest single read of a stream; one buffer of this size is reused per thread.
+READ_CHUNK_BYTES = _env_int("HF_DOWNLOADER_READ_CHUNK_MB", 8, 1) * 1024 * 1024
+# Reads start this small and grow while they fill quickly, so slow links still report progress and cancel promptly.
+READ_CHUNK_MIN_BYTES = min(READ_CHUNK_BYTES, 256 * 1024)
+READ_CHUNK_TARGET_SECONDS = 0.25
+REQUEST_TIMEOUT_SECONDS = 60
+PROGRESS_INTERVAL_SECONDS = 0.25
+# Partial files keep a JSON sidecar next to them; the sidecar is rewritten at most this often.
+PARTIAL_SIDECAR_SUFFIX = ".json"
+PARTIAL_SAVE_INTERVAL_SECONDS = 5.0
+PARTIAL_MAX_AGE_SECONDS = _env_int("HF_DOWNLOADER_PARTIAL_MAX_AGE_DAYS", 7, 0) * 86400
+# Upper bound on bytes the segmented engine's control loop reads back for hashing per tick.
+HASH_CATCH_UP_BYTES_PER_TICK = 64 * 1024 * 1024
+# Allocate a .part file's full size up front (posix_fallocate): less fragmentation, and a full
+# disk fails before the download instead of near its end.
+PREALLOCATE_PARTIAL_FILES = _env_flag("HF_DOWNLOADER_PREALLOCATE", default=True)
+# Combined budget for every stream in the process (all queue workers and connections); 0 = unlimited.
+DOWNLOAD_MAX_BYTES_PER_SECOND = _env_int("HF_DOWNLOADER_MAX_BYTES_PER_SEC", 0, 0)
+# Evict downloaded bytes from the page cache once they are hashed (posix_fadvise DONTNEED), so a
+# multi-GB download doesn't push the models ComfyUI has loaded out of memory.
+DROP_PAGE_CACHE = _env_flag("HF_DOWNLOADER_DROP_PAGE_CACHE", default=False) and hasattr(os, "posix_fadvise")
+PAGE_CACHE_DROP_BYTES = 64 * 1024 * 1024
+
+
+_thread_buffers = threading.local()
+
+
+def stream_buffer() -> memoryview:
+    """This thread's reusable READ_CHUNK_BYTES buffer. Not reentrant: one reader per thread at a time."""
+    view = getattr(_thread_buffers, "view", None)
+    if view is None:
+        view = memoryview(bytearray(READ_CHUNK_BYTES))
+        _thread_buffers.view = view
+    return view
+
+
+class ChunkReader:
+    """
+    Read a stream with readinto() into the thread's reusable buffer instead of
+    allocating a bytes object per chunk. Each read is sized to take about
+    READ_CHUNK_TARGET_SECONDS, between READ_CHUNK_MIN_BYTES and READ_CHUNK_BYTES.
+    The view returned by read() is only valid until the next read.
+    """
+
+    def __init__(self, source, buffer: Optional[memoryview] = None):
+        self.source = source
+        self.buffer = buffer if buffer is not None else stream_buffer()
+        self.size = min(READ_CHUNK_MIN_BYTES, len(self.buffer))
+        self._readinto = getattr(source, "readinto", None)
+
+    def read(self, limit: Optional[int] = None) -> memoryview:
+        """Up to limit bytes (empty at end of stream); short only at the end or on limit."""
+        want = self.size if limit is None else min(self.size, limit)
+        if want <= 0:
+            return self.buffer[:0]
+        started = time.monotonic()
+        filled = 0
+        if self._readinto is None:
+            data = self.source.read(want)
+            filled = len(data)
+            self.buffer[:filled] = data
+        else:
+            while filled < want:
+                count = self._readinto(self.buffer[filled:want])
+                if not count:
+                    break
+                filled += count
+        if filled == want:
+            elapsed = time.monotonic() - started
+            if elapsed < READ_CHUNK_TARGET_SECONDS / 2:
+                self.size = min(len(self.buffer), self.size * 2)
+            elif elapsed > READ_CHUNK_TARGET_SECONDS * 2:
+                self.size = max(min(READ_CHUNK_MIN_BYTES, len(self.buffer)), self.size // 2)
+        return self.buffer[:filled]
+
+
+class PageCacheDropper:
+    """
+    Advise the kernel to drop a file's pages below a frontier, one window of
+    PAGE_CACHE_DROP_BYTES at a time (only with DROP_PAGE_CACHE). DONTNEED drops
+    clean pages and starts writeback of dirty ones, so every window is advised
+    again one window later, once its pages are clean.
+    """
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.dropped = 0
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def _advise(self, offset: int, length: int) -> None:
+        try:
+            os.posix_fadvise(self.fd, offset, length, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+    def advance(self, upto: int, final: bool = False) -> None:
+        """Bytes before upto will not be read again by this download."""
+        if not DROP_PAGE_CACHE:
+            return
+        with self._lock:
+            if upto - self.dropped < (1 if final else PAGE_CACHE_DROP_BYTES):
+                return
+            window = (self.dropped, upto - self.dropped)
+            self._advise(*window)
+            if self._previous:
+                self._advise(*self._previous)
+            self._previous = window
+            self.dropped = upto
+
+
+class RangeNotSupportedError(RuntimeError):
+    """Raised when a server stops honouring Range requests mid-transfer."""
+
+
+def parse_content_length(header_value: str) -> Optional[int]:
+    if header_value is None:
+        return None
+    try:
+        size = int(str(header_value).strip())
+        return size if size >= 0 else None
+    except Exception:
+        return None
+
+
+def parse_content_range_total(header_value: str) -> Optional[int]:
+    """Return the complete length from a `bytes a-b/total` Content-Range header."""
+    text = str(header_value or "").strip().lower()
+    if not text.startswith("bytes") or "/" not in text:
+        return None
+    total = text.rsplit("/", 1)[1].strip()
+    if total == "*":
+        return None
+    return parse_content_length(total)
+
+
+def is_retryable_url_error(error: Exception) -> bool:
+    if isinstance(error, urllib.error.HTTPError):
+        return int(getattr(error, "code", 0) or 0) in (408, 425, 429, 500, 502, 503, 504)
+    if isinstance(error, urllib.error.URLError):
+        reason = getattr(error, "reason", None)
+        if isinstance(reason, (socket.timeout, ConnectionError)):
+            return True
+        text = str(reason or "").lower()
+        return any(token in text for token in ("timeout", "temporarily", "reset", "refused", "unreachable"))
+    if isinstance(error, (ConnectionError, socket.timeout, TimeoutError, http.client.IncompleteRead)):
+        return True
+    text = str(error).lower()
+    return "timeout" in text or "temporarily unavailable" in text
+
+
+class TransferProgress:
+    """Thread-safe byte counter that turns raw byte counts into rate-limited progress_cb payloads."""
+
+    def __init__(self,
+                 total_bytes: Optional[int],
+                 progress_cb: Optional[Callable[[dict], None]] = None,
+                 initial_bytes: int = 0):
+        self.total_bytes = total_bytes
+        self.downloaded_bytes = int(initial_bytes or 0)
+        self.connections = 1
+        self._progress_cb = progress_cb
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._ema_speed = None
+        self._last_bytes = self.downloaded_bytes
+        self._last_time = time.time()
+        self._last_emit = 0.0
+
+    def add(self, count: int):
+        with self._lock:
+            self.downloaded_bytes += count
+
+    def reset(self, downloaded_bytes: int = 0):
+        with self._lock:
+            self.downloaded_bytes = int(downloaded_bytes)
+            self._last_bytes = self.downloaded_bytes
+            self._last_time = time.time()
+            self._ema_speed = None
+
+    def update_to(self, downloaded_bytes: int, total_bytes: Optional[int] = None):
+        """Take an absolute count reported from elsewhere (e.g. a hub worker process); a lower count restarts the speed estimate."""
+        if total_bytes is not None:
+            self.total_bytes = total_bytes
+        if downloaded_bytes < self.downloaded_bytes:
+            self.reset(downloaded_bytes)
+            return
+        with self._lock:
+            self.downloaded_bytes = int(downloaded_bytes)
+
+    def speed_bps(self) -> float:
+        return self._ema_speed or 0
+
+    def maybe_emit(self, force: bool = False, phase: str = "downloading"):
+        now = time.time()
+        if not self._emit_lock.acquire(blocking=force):
+            return
+        try:
+            with self._lock:
+                downloaded = self.downloaded_bytes
+            done = self.total_bytes is not None and downloaded >= self.total_bytes
+            if not force and not done and now - self._last_emit < PROGRESS_INTERVAL_SECONDS:
+                return
+            dt = now - self._last_time
+            if dt > 0:
+                inst_speed = (downloaded - self._last_bytes) / dt
+                self._ema_speed = inst_speed if self._ema_speed is None else (0.2 * inst_speed + 0.8 * self._ema_speed)
+                self._last_time = now
+                self._last_bytes = downloaded
+            self._last_emit = now
+            if not self._progress_cb:
+                return
+            eta_seconds = None
+            if self.total_bytes and self._ema_speed and self._ema_speed > 0:
+                eta_seconds = max(0, (self.total_bytes - downloaded) / self._ema_speed)
+            self._progress_cb({
+                "downloaded_bytes": downloaded,
+                "total_bytes": self.total_bytes,
+                "speed_bps": self._ema_speed or 0,
+                "eta_seconds": eta_seconds,
+                "phase": phase,
+                "connections": self.connections,
+            })
+        finally:
+            self._emit_lock.release()
+
+
+class ByteRateLimiter:
+    """
+    Token bucket shared by all download streams. Callers take what they just read
+    and sleep off any debt, so N concurrent streams split the budget between them.
+    """
+
+    def __init__(self, bytes_per_second: int = 0):
+        self._lock = threading.Lock()
+        self.bytes_per_second = 0
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self.throttled_seconds = 0.0
+        self.set_rate(bytes_per_second)
+
+    def set_rate(self, bytes_per_second: int) -> None:
+        with self._lock:
+            self.bytes_per_second = max(0, int(bytes_per_second or 0))
+            self._tokens = float(self.bytes_per_second)
+            self._stamp = time.monotonic()
+
+    def consume(self, count: int, should_stop: Optional[Callable[[], bool]] = None) -> None:
+        with self._lock:
+            rate = self.bytes_per_second
+            if rate <= 0:
+                return
+            now = time.monotonic()
+            # At most one second of unused budget carries over.
+            self._tokens = min(float(rate), self._tokens + (now - self._stamp) * rate)
+            self._stamp = now
+            self._tokens -= count
+            wait_seconds = -self._tokens / rate if self._tokens < 0 else 0.0
+            self.throttled_seconds += wait_seconds
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if should_stop and should_stop():
+                raise InterruptedError("Download cancelled")
+            time.sleep(min(0.1, remaining))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "bytes_per_second": self.bytes_per_second,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+            }
+
+
+rate_limiter = ByteRateLimiter(DOWNLOAD_MAX_BYTES_PER_SECOND)
+
+
+def headers_for_url(headers: dict, origin_url: str, target_url: str) -> dict:
+    """Drop credentials when a request is sent to a different host than the one they were meant for."""
+    request_headers = dict(headers or {})
+    origin_host = urllib.parse.urlparse(origin_url or "").netloc.lower()
+    target_host = urllib.parse.urlparse(target_url or "").netloc.lower()
+    if origin_host != target_host:
+        for name in list(request_headers):
+            if name.lower() in ("authorization", "cookie"):
+                request_headers.pop(name, None)
+    return request_headers
+
+
+def open_url(url: str, headers: dict, range_start: Optional[int] = None, range_end: Optional[int] = None):
+    request_headers = dict(headers or {})
+    if range_start is not None:
+        end_text = "" if range_end is None else str(range_end)
+        request_headers["Range"] = f"bytes={range_start}-{end_text}"
+    return http_pool.open_url(url, request_headers, timeout=REQUEST_TIMEOUT_SECONDS)
+
+
+def probe_url(url: str, headers: dict) -> tuple:
+    """
+    Open `url` with an open-ended `Range: bytes=0-` request.
+
+    The returned response always streams the whole file from byte zero, so the
+    single-stream path can consume it directly; the info dict records whether the
+    server honoured the range and how large the file is.
+    """
+    try:
+        response = open_url(url, headers, range_start=0)
+    except urllib.error.HTTPError as e:
+        # 416 is returned by some servers for empty files; retry without a range.
+        if int(getattr(e, "code", 0) or 0) != 416:
+            raise
+        response = open_url(url, headers)
+
+    status = int(getattr(response, "status", 200) or 200)
+    response_headers = getattr(response, "headers", None)
+
+    def header(name: str) -> str:
+        try:
+            return str(response_headers.get(name, "") or "") if response_headers else ""
+        except Exception:
+            return ""
+
+    total_bytes = None
+    accepts_ranges = False
+    if status == 206:
+        total_bytes = parse_content_range_total(header("Content-Range"))
+        accepts_ranges = total_bytes is not None
+    else:
+        total_bytes = parse_content_length(header("Content-Length"))
+
+    info = {
+        "final_url": str(getattr(response, "geturl", lambda: url)() or url),
+        "status": status,
+        "total_bytes": total_bytes,
+        "accepts_ranges": accepts_ranges,
+        "content_disposition": header("Content-Disposition"),
+        "etag": header("ETag"),
+        "last_modified": header("Last-Modified"),
+    }
+    return response, info
+
+
+class StreamingHasher:
+    """
+    SHA256 of a file that is written in arbitrary order. Chunks written at the
+    hash frontier are hashed straight from memory; bytes that landed ahead of it
+    (other segments, a resumed prefix) are read back once, normally from page
+    cache, when catch_up() is told they are contiguous.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.read_back_bytes = 0
+        self._hash = hashlib.sha256()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.offset = 0
+            self.read_back_bytes = 0
+            self._hash = hashlib.sha256()
+
+    def update_at(self, offset: int, data) -> None:
+        with self._lock:
+            if offset == self.offset:
+                self._hash.update(data)
+                self.offset += len(data)
+
+    def catch_up(self, upto: int, max_bytes: Optional[int] = None) -> None:
+        """Hash [offset, upto) from disk; those bytes must already be written."""
+        budget = max_bytes if max_bytes is not None else upto
+        if upto <= self.offset or budget <= 0:
+            return
+        buffer = stream_buffer()
+        with open(self.path, "rb", buffering=0) as f:
+            while budget > 0:
+                with self._lock:
+                    if self.offset >= upto:
+                        return
+                    f.seek(self.offset)
+                    count = f.readinto(buffer[:min(len(buffer), upto - self.offset, budget)])
+                    if not count:
+                        return
+                    self._hash.update(buffer[:count])
+                    self.offset += count
+                    self.read_back_bytes += count
+                budget -= count
+
+    def hexdigest(self, total_bytes: int) -> str:
+        """Finish hashing the first total_bytes of the file and return the hex digest."""
+        self.catch_up(total_bytes)
+        with self._lock:
+            if self.offset != total_bytes:
+                raise RuntimeError(f"Hashed {self.offset} of {total_bytes} bytes")
+            if self.read_back_bytes:
+                print(f"[DEBUG] Hashed {os.path.basename(self.path)}: {self.read_back_bytes} bytes read back, rest inline.")
+            return self._hash.hexdigest()
+
+
+def partial_path_for(target_dir: str, target_name: str) -> str:
+    """Stable .part path for a destination so a later attempt can find the bytes again."""
+    return os.path.join(target_dir, f".{target_name}.part")
+
+
+def is_resumable_partial(part_path: str) -> bool:
+    """True when part_path has a sidecar and is young enough to be worth resuming."""
+    sidecar_path = part_path + PARTIAL_SIDECAR_SUFFIX
+    if not os.path.isfile(part_path) or not os.path.isfile(sidecar_path):
+        return False
+    if PARTIAL_MAX_AGE_SECONDS <= 0:
+        return True
+    try:
+        return (time.time() - os.path.getmtime(sidecar_path)) < PARTIAL_MAX_AGE_SECONDS
+    except OSError:
+        return False
+
+
+def _strong_validator(etag: str, last_modified: str) -> str:
+    # If-Range only accepts strong ETags; fall back to Last-Modified otherwise.
+    etag = str(etag or "").strip()
+    if etag and not etag.startswith("W/"):
+        return etag
+    return str(last_modified or "").strip()
+
+
+class PartialDownload:
+    """
+    A .part file plus a JSON sidecar recording the source URL, validator, total size
+    and which byte ranges have been written. Only bytes listed in the sidecar are
+    trusted when resuming.
+    """
+
+    def __init__(self, part_path: str, url: str, total_bytes: Optional[int], validator: str):
+        self.part_path = part_path
+        self.sidecar_path = part_path + PARTIAL_SIDECAR_SUFFIX
+        self.url = url
+        self.total_bytes = total_bytes
+        self.validator = validator
+        self.ranges = []
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._last_save = 0.0
+        self.hasher = StreamingHasher(part_path)
+
+    @classmethod
+    def open(cls, part_path: str, url: str, probe: dict) -> "PartialDownload":
+        """Load the sidecar for part_path if it still describes the same remote file, else start fresh."""
+        validator = _strong_validator(probe.get("etag"), probe.get("last_modified"))
+        partial = cls(part_path, url, probe.get("total_bytes"), validator)
+        state = None
+        if os.path.isfile(part_path) and os.path.isfile(partial.sidecar_path):
+            try:
+                with open(partial.sidecar_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except Exception:
+                state = None
+        if (
+            isinstance(state, dict)
+            and validator
+            and state.get("url") == url
+            and state.get("validator") == validator
+            and state.get("total_bytes") == partial.total_bytes
+        ):
+            ranges = []
+            for item in state.get("ranges") or []:
+                try:
+                    start, end = int(item[0]), int(item[1])
+                except Exception:
+                    continue
+                if 0 <= start <= end:
+                    ranges.append([start, end])
+            on_disk = os.path.getsize(part_path)
+            partial.ranges = [r for r in ranges if r[1] < on_disk]
+            if partial.ranges:
+                print(f"[DEBUG] Resuming {os.path.basename(part_path)} with {partial.validated_bytes()} bytes already on disk.")
+        else:
+            partial.discard()
+        return partial
+
+    @property
+    def resumable(self) -> bool:
+        return bool(self.validator)
+
+    def validated_bytes(self) -> int:
+        with self._lock:
+            return sum(end - start + 1 for start, end in self.ranges)
+
+    def contiguous_bytes(self) -> int:
+        with self._lock:
+            if self.ranges and self.ranges[0][0] == 0:
+                return self.ranges[0][1] + 1
+        return 0
+
+    def missing_ranges(self, total_bytes: int) -> list:
+        """Byte ranges of [0, total_bytes) not yet written, as inclusive (start, end) pairs."""
+        missing = []
+        cursor = 0
+        with self._lock:
+            for start, end in self.ranges:
+                if start > cursor:
+                    missing.append((cursor, min(start, total_bytes) - 1))
+                cursor = max(cursor, end + 1)
+        if cursor < total_bytes:
+            missing.append((cursor, total_bytes - 1))
+        return [r for r in missing if r[0] <= r[1]]
+
+    def mark(self, start: int, end: int, data=None):
+        """
+        Record [start, end] as written and periodically persist the sidecar.
+        Pass the written bytes as data so they can be hashed without a re-read.
+        """
+        if end < start:
+            return
+        if data is not None:
+            self.hasher.update_at(start, data)
+        with self._lock:
+            merged = []
+            for item in sorted(self.ranges + [[start, end]]):
+                if merged and item[0] <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], item[1])
+                else:
+                    merged.append(list(item))
+            self.ranges = merged
+            due = time.time() - self._last_save >= PARTIAL_SAVE_INTERVAL_SECONDS
+        if due:
+            self.save()
+
+    def reset(self):
+        with self._lock:
+            self.ranges = []
+        self.hasher.reset()
+        _remove_quietly(self.sidecar_path)
+
+    def save(self):
+        if not self.resumable:
+            return
+        with self._save_lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        with self._lock:
+            self._last_save = time.time()
+            state = {
+                "url": self.url,
+                "validator": self.validator,
+                "total_bytes": self.total_bytes,
+                "ranges": [list(r) for r in self.ranges],
+                "saved_at": self._last_save,
+            }
+        try:
+            # Make sure the recorded bytes are on disk before the sidecar claims them.
+            fd = os.open(self.part_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            tmp_path = self.sidecar_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.sidecar_path)
+        except Exception as e:
+            print(f"[DEBUG] Failed to save partial download state for {self.part_path}: {e}")
+
+    def keep_or_discard(self):
+        """After a failed attempt keep resumable bytes on disk, drop the rest."""
+        if self.resumable and self.ranges:
+            self.save()
+        else:
+            self.discard()
+
+    def discard(self):
+        with self._lock:
+            self.ranges = []
+        self.hasher.reset()
+        _remove_quietly(self.part_path)
+        _remove_quietly(self.sidecar_path)
+
+    def sha256(self, total_bytes: int) -> str:
+        """SHA256 of the completed .part file, reading back only bytes that were not hashed in flight."""
+        return self.hasher.hexdigest(total_bytes)
+
+    def finish(self):
+        """Forget the sidecar once the .part file has been completed and moved into place."""
+        _remove_quietly(self.sidecar_path)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"[DEBUG] Failed to remove {path}: {e}")
+
+
+def preallocate(handle, offset: int, length: int) -> bool:
+    """
+    Allocate [offset, offset + length) of an open file. Filesystems or platforms
+    without posix_fallocate just skip it; running out of space raises.
+    """
+    if not PREALLOCATE_PARTIAL_FILES or length <= 0 or not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(handle.fileno(), offset, length)
+        return True
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+        return False
+
+
+def _write_at(handle, offset: int, data) -> None:
+    if hasattr(os, "pwrite"):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(handle.fileno(), view, offset)
+            offset += written
+            view = view[written:]
+        return
+    handle.seek(offset)
+    handle.write(data)
+
+
+def stream_response(response,
+                    partial: PartialDownload,
+                    progress: TransferProgress,
+                    cancel_check: Optional[Callable[[], bool]] = None,
+                    offset: int = 0) -> int:
+    """
+    Stream a response body sequentially into partial.part_path starting at offset.
+    Returns the total number of bytes in the file afterwards.
+    """
+    position = offset
+    mode = "r+b" if offset > 0 else "wb"
+    if offset > 0:
+        # Resumed prefix was written by an earlier attempt; hash it once before streaming on.
+        partial.hasher.catch_up(offset)
+    with open(partial.part_path, mode) as out:
+        out.truncate(offset)
+        if isinstance(partial.total_bytes, int):
+            preallocate(out, offset, partial.total_bytes - offset)
+        out.seek(offset)
+        reader = ChunkReader(response)
+        dropper = PageCacheDropper(out.fileno())
+        while True:
+            if cancel_check and cancel_check():
+                raise InterruptedError("Download cancelled")
+            chunk = reader.read()
+            if not chunk:
+                break
+            out.write(chunk)
+            partial.mark(position, position + len(chunk) - 1, chunk)
+            position += len(chunk)
+            progress.add(len(chunk))
+            progress.maybe_emit()
+            rate_limiter.consume(len(chunk), cancel_check)
+            dropper.advance(partial.hasher.offset)
+        out.flush()
+        dropper.advance(partial.hasher.offset, final=True)
+    return position
+
+
+def _fetch_piece(url: str,
+                 headers: dict,
+                 handle,
+                 start: int,
+                 end: int,
+                 partial: PartialDownload,
+                 progress: TransferProgress,
+                 stop_event: threading.Event) -> None:
+    """Fetch bytes [start, end] into handle, resuming inside the piece on retryable errors."""
+    position = start
+    attempt = 0
+    while position <= end:
+        if stop_event.is_set():
+            raise InterruptedError("Download cancelled")
+        try:
+            with open_url(url, headers, range_start=position, range_end=end) as response:
+                if int(getattr(response, "status", 200) or 200) != 206:
+                    raise RangeNotSupportedError("Server ignored Range request")
+                reader = ChunkReader(response)
+                while position <= end:
+                    if stop_event.is_set():
+                        raise InterruptedError("Download cancelled")
+                    chunk = reader.read(end - position + 1)
+                    if not chunk:
+                        break
+                    _write_at(handle, position, chunk)
+                    partial.mark(position, position + len(chunk) - 1, chunk)
+                    position += len(chunk)
+                    progress.add(len(chunk))
+                    rate_limiter.consume(len(chunk), stop_event.is_set)
+            if position <= end:
+                raise ConnectionError(f"Connection closed at byte {position} of range {start}-{end}")
+        except (InterruptedError, RangeNotSupportedError):
+            raise
+        except Exception as e:
+            if attempt >= SEGMENT_MAX_RETRIES or not is_retryable_url_error(e):
+                raise
+            attempt += 1
+            backoff_seconds = min(8.0, 0.5 * float(2 ** attempt))
+            print(
+                f"[DEBUG] Segment {start}-{end} retry {attempt}/{SEGMENT_MAX_RETRIES} "
+                f"at byte {position} after {backoff_seconds:.1f}s: {e}"
+            )
+            if stop_event.wait(backoff_seconds):
+                raise InterruptedError("Download cancelled")
+
+
+def download_segmented(url: str,
+                       partial: PartialDownload,
+                       total_bytes: int,
+                       headers: dict,
+                       progress: TransferProgress,
+                       cancel_check: Optional[Callable[[], bool]] = None,
+                       max_connections: int = SEGMENT_MAX_CONNECTIONS,
+                       initial_connections: int = SEGMENT_INITIAL_CONNECTIONS) -> None:
+    """
+    Download the missing ranges of `total_bytes` from `url` over several parallel
+    Range requests into a preallocated partial.part_path. Connections are added
+    while measured throughput keeps improving, up to max_connections.
+    """
+    pieces = deque()
+    for gap_start, gap_end in partial.missing_ranges(total_bytes):
+        offset = gap_start
+        while offset <= gap_end:
+            end = min(gap_end, offset + SEGMENT_PIECE_BYTES - 1)
+            pieces.append((offset, end))
+            offset = end + 1
+    if not pieces:
+        return
+
+    dest_path = partial.part_path
+    with open(dest_path, "r+b" if os.path.exists(dest_path) else "wb") as out:
+        out.truncate(total_bytes)
+        # Only fills the holes; ranges written by an earlier attempt keep their blocks.
+        preallocate(out, 0, total_bytes)
+
+    pieces_lock = threading.Lock()
+    stop_event = threading.Event()
+    errors = []
+    workers = []
+
+    def worker():
+        try:
+            with open(dest_path, "r+b") as handle:
+                while not stop_event.is_set():
+                    with pieces_lock:
+                        if not pieces:
+                            return
+                        start, end = pieces.popleft()
+                    _fetch_piece(url, headers, handle, start, end, partial, progress, stop_event)
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+
+    def spawn_worker():
+        thread = threading.Thread(target=worker, daemon=True)
+        workers.append(thread)
+        progress.connections = len(workers)
+        thread.start()
+
+    max_connections = max(1, min(int(max_connections), len(pieces)))
+    for _ in range(max(1, min(int(initial_connections), max_connections))):
+        spawn_worker()
+
+    window_start = time.time()
+    window_bytes = progress.downloaded_bytes
+    best_throughput = None
+    growth_stopped = False
+    cache_fd = os.open(dest_path, os.O_RDONLY)
+    dropper = PageCacheDropper(cache_fd)
+    try:
+        while any(thread.is_alive() for thread in workers):
+            if cancel_check and cancel_check():
+                stop_event.set()
+                raise InterruptedError("Download cancelled")
+            if errors:
+                break
+            progress.maybe_emit()
+            # Pieces behind the frontier finished out of order; fold them into the hash while they are hot.
+            partial.hasher.catch_up(partial.contiguous_bytes(), HASH_CATCH_UP_BYTES_PER_TICK)
+            dropper.advance(partial.hasher.offset)
+
+            now = time.time()
+            if not growth_stopped and now - window_start >= SEGMENT_ADAPT_WINDOW_SECONDS:
+                throughput = (progress.downloaded_bytes - window_bytes) / (now - window_start)
+                window_start = now
+                window_bytes = progress.downloaded_bytes
+                with pieces_lock:
+                    remaining = len(pieces)
+                if best_throughput is not None and throughput < best_throughput * SEGMENT_ADAPT_MIN_GAIN:
+                    growth_stopped = True
+                elif len(workers) < max_connections and remaining > 0:
+                    best_throughput = max(best_throughput or 0, throughput)
+                    spawn_worker()
+                else:
+                    growth_stopped = True
+            time.sleep(0.1)
+    finally:
+        stop_event.set()
+        for thread in workers:
+            thread.join(timeout=REQUEST_TIMEOUT_SECONDS)
+        os.close(cache_fd)
+
+    if errors:
+        raise errors[0]
+    with pieces_lock:
+        if pieces:
+            raise RuntimeError("Segmented download stopped before all ranges were fetched.")
+
+
+def _validator_headers(headers: dict, partial: PartialDownload) -> dict:
+    request_headers = dict(headers or {})
+    if partial.validator:
+        request_headers["If-Range"] = partial.validator
+    return request_headers
+
+
+def download_to_file(url: str,
+                     partial: PartialDownload,
+                     headers: dict,
+                     response,
+                     probe: dict,
+                     progress: TransferProgress,
+                     cancel_check: Optional[Callable[[], bool]] = None) -> int:
+    """
+    Download into partial.part_path, resuming from the bytes recorded in its
+    sidecar. Uses the segmented engine when the probe showed range support and the
+    file is large enough, otherwise streams over one connection (the already-open
+    probe response when starting from zero, a `Range` + `If-Range` request when
+    resuming). Falls back to a fresh single stream if ranges stop working.
+    Returns the number of bytes in the finished file.
+    """
+    total_bytes = probe.get("total_bytes")
+    final_url = probe.get("final_url") or url
+    request_headers = _validator_headers(headers_for_url(headers, url, final_url), partial)
+    progress.reset(partial.validated_bytes())
+    use_segments = (
+        probe.get("accepts_ranges")
+        and isinstance(total_bytes, int)
+        and total_bytes >= SEGMENT_MIN_FILE_BYTES
+        and SEGMENT_MAX_CONNECTIONS > 1
+    )
+
+    if use_segments:
+        response.close()
+        try:
+            download_segmented(final_url, partial, total_bytes, request_headers, progress, cancel_check)
+            return total_bytes
+        except RangeNotSupportedError as e:
+            print(f"[DEBUG] {e}; falling back to a single-stream download.")
+        partial.reset()
+        progress.reset(0)
+        progress.connections = 1
+        with open_url(url, headers) as fallback_response:
+            return stream_response(fallback_response, partial, progress, cancel_check)
+
+    resume_from = partial.contiguous_bytes() if probe.get("accepts_ranges") else 0
+    if isinstance(total_bytes, int) and total_bytes > 0 and resume_from >= total_bytes:
+        response.close()
+        return total_bytes
+    if resume_from <= 0:
+        partial.reset()
+        progress.reset(0)
+        return stream_response(response, partial, progress, cancel_check)
+
+    response.close()
+    with open_url(final_url, request_headers, range_start=resume_from) as resumed:
+        status = int(getattr(resumed, "status", 200) or 200)
+        if status == 206:
+            progress.reset(resume_from)
+            return stream_response(resumed, partial, progress, cancel_check, offset=resume_from)
+        # If-Range mismatch: the server sent the whole (changed) file instead.
+        print("[DEBUG] Remote file changed since the partial download; restarting from zero.")
+        partial.reset()
+        progress.reset(0)
+        return stream_response(resumed, partial, progress, cancel_check)
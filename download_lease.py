@@ -0,0 +1,374 @@
+"""
+Cross-process coordination for downloads into a shared models folder.
+
+Several ComfyUI instances can share one models/ tree (NFS, CephFS, SMB). The
+dedup in web_api only sees its own queue, so each file download also takes a
+lease on its destination: a small JSON file next to it (.<name>.lease) created
+with O_CREAT | O_EXCL, so exactly one process wins. The owner rewrites the
+lease every LEASE_HEARTBEAT_SECONDS with a beat counter and its current
+progress, which makes the lease double as the shared status file. Another
+instance that wants the same file follows the lease instead of downloading: it
+mirrors the owner's progress and returns once the lease is gone, so the caller
+can use the finished file (or download it itself if the owner gave up).
+
+A lease is stale when its owner is a dead process on this machine, or when its
+contents have not changed for LEASE_STALE_SECONDS as measured by the follower
+(on the follower's own clock, so clock skew between hosts doesn't matter). A
+stale lease is renamed aside, which only one follower can do, and replaced.
+
+Stdlib only, so scripts/bench_transfer.py can drive it from several processes.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Tuple
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return str(value).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+DOWNLOAD_LEASES = _env_flag("HF_DOWNLOADER_LEASES", default=True)
+LEASE_SUFFIX = ".lease"
+# The owner republishes its lease (and progress) this often.
+LEASE_HEARTBEAT_SECONDS = _env_int("HF_DOWNLOADER_LEASE_HEARTBEAT_SECONDS", 2, 1)
+# A lease nobody has rewritten for this long is taken over; several missed heartbeats, not one slow write.
+LEASE_STALE_SECONDS = max(3 * LEASE_HEARTBEAT_SECONDS, _env_int("HF_DOWNLOADER_LEASE_STALE_SECONDS", 30, 1))
+LEASE_POLL_SECONDS = 1.0
+# Progress fields an owner publishes for followers.
+LEASE_PROGRESS_FIELDS = ("downloaded_bytes", "total_bytes", "speed_bps", "eta_seconds", "phase")
+
+
+def _pid_namespace() -> str:
+    # Containers on one host can share a hostname while numbering pids independently.
+    try:
+        return os.readlink("/proc/self/ns/pid")
+    except OSError:
+        return ""
+
+
+_HOST = socket.gethostname()
+_PID_NAMESPACE = _pid_namespace()
+
+_leases_lock = threading.Lock()
+# lease path -> DownloadLease held by this process
+_held = {}
+_stats = {"acquired": 0, "followed": 0, "finished_elsewhere": 0, "taken_over": 0, "lost": 0}
+
+
+def lease_path_for(dest_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(dest_path))
+    return os.path.join(directory, f".{name}{LEASE_SUFFIX}")
+
+
+def _read(path: str) -> Optional[dict]:
+    """The lease record, None when there is no lease, {} while it is being created or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        return {}
+    return record if isinstance(record, dict) else {}
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill would terminate the process there; fall back to heartbeat staleness.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _owner_dead(record: dict) -> bool:
+    """True only when the owner provably is gone: a process on this machine that no longer runs."""
+    pid = record.get("pid")
+    if not isinstance(pid, int) or record.get("host") != _HOST or record.get("pid_ns") != _PID_NAMESPACE:
+        return False
+    if pid == os.getpid():
+        with _leases_lock:
+            return all(lease.owner != record.get("owner") for lease in _held.values())
+    return not _pid_alive(pid)
+
+
+def _create(path: str, record: dict) -> bool:
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    return True
+
+
+def _break(path: str, expected: dict) -> bool:
+    """Remove a stale lease, unless it changed after the caller judged it stale."""
+    aside = f"{path}.{uuid.uuid4().hex}.stale"
+    try:
+        os.rename(path, aside)
+    except FileNotFoundError:
+        return True
+    except OSError as e:
+        print(f"[DEBUG] Could not move stale lease {path} aside: {e}")
+        return False
+    current = _read(aside)
+    if current != expected:
+        # The owner heartbeated between our read and the rename: put its lease back.
+        try:
+            if not os.path.exists(path):
+                os.rename(aside, path)
+        except OSError:
+            pass
+    try:
+        os.remove(aside)
+    except OSError:
+        pass
+    return current == expected
+
+
+class DownloadLease:
+    """A lease owned by this process; update() publishes progress, release() gives it up."""
+
+    def __init__(self, path: str, dest_path: str, record: dict):
+        self.path = path
+        self.dest_path = dest_path
+        self.owner = record["owner"]
+        self.record = record
+        # Set when another process took the lease over (this one was presumed dead).
+        self.lost = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, name="hf-download-lease", daemon=True)
+
+    def update(self, fields: dict) -> None:
+        """Merge progress fields; followers see them with the next heartbeat."""
+        with self._lock:
+            for key in LEASE_PROGRESS_FIELDS:
+                if key in fields:
+                    self.record[key] = fields[key]
+
+    def _write(self) -> bool:
+        current = _read(self.path)
+        if current is None or current.get("owner") != self.owner:
+            self.lost = True
+            with _leases_lock:
+                _stats["lost"] += 1
+            print(f"[DEBUG] Download lease {self.path} was taken over by another process")
+            return False
+        with self._lock:
+            self.record["beat"] += 1
+            self.record["heartbeat_at"] = time.time()
+            data = json.dumps(self.record)
+        tmp_path = f"{self.path}.{self.owner}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        return True
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(LEASE_HEARTBEAT_SECONDS):
+            try:
+                if not self._write():
+                    return
+            except OSError as e:
+                # A shared filesystem hiccup; the next beat tries again well before the lease goes stale.
+                print(f"[DEBUG] Download lease heartbeat failed for {self.path}: {e}")
+
+    def release(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            # A heartbeat mid-write would otherwise recreate the lease after it is removed.
+            self._thread.join(timeout=2 * LEASE_HEARTBEAT_SECONDS)
+        with _leases_lock:
+            if _held.get(self.path) is self:
+                _held.pop(self.path, None)
+        if self.lost:
+            return
+        current = _read(self.path)
+        if current is not None and current.get("owner") == self.owner:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[DEBUG] Failed to remove download lease {self.path}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def acquire_download_lease(dest_path: str,
+                           label: str = "",
+                           stale_record: Optional[dict] = None) -> Optional[DownloadLease]:
+    """
+    Take the lease on dest_path, or return None while another live owner holds it.
+    stale_record is a lease the caller watched stay unchanged for LEASE_STALE_SECONDS
+    (see follow_download_lease); it is replaced if it is still the current one.
+    """
+    path = lease_path_for(dest_path)
+    now = time.time()
+    record = {
+        "owner": uuid.uuid4().hex,
+        "host": _HOST,
+        "pid_ns": _PID_NAMESPACE,
+        "pid": os.getpid(),
+        "label": label or os.path.basename(dest_path),
+        "acquired_at": now,
+        "heartbeat_at": now,
+        "beat": 0,
+        "phase": "starting",
+    }
+    for _ in range(2):
+        if _create(path, record):
+            lease = DownloadLease(path, dest_path, record)
+            with _leases_lock:
+                _held[path] = lease
+                _stats["acquired"] += 1
+            lease._thread.start()
+            return lease
+        current = _read(path)
+        if current is None:
+            # Released between our create and read; try again.
+            continue
+        if not (_owner_dead(current) or (stale_record is not None and current == stale_record)):
+            return None
+        if not _break(path, current):
+            return None
+        print(f"[DEBUG] Took over stale download lease {path} (owner {current.get('host')}:{current.get('pid')})")
+        with _leases_lock:
+            _stats["taken_over"] += 1
+    return None
+
+
+def follow_download_lease(dest_path: str,
+                          on_progress: Optional[Callable[[dict], None]] = None,
+                          cancel_check: Optional[Callable[[], bool]] = None) -> Tuple[Optional[dict], bool]:
+    """
+    Wait while another process holds dest_path's lease, passing its record to
+    on_progress whenever it changes. Returns (last record seen, stale); stale is
+    True when the owner stopped heartbeating, and that record can then be passed
+    to acquire_download_lease as stale_record.
+    """
+    path = lease_path_for(dest_path)
+    last = None
+    changed_at = time.monotonic()
+    while True:
+        if cancel_check and cancel_check():
+            raise InterruptedError("Download cancelled")
+        current = _read(path)
+        if current is None:
+            return last, False
+        if current and _owner_dead(current):
+            return current, True
+        if current != last:
+            last = current
+            changed_at = time.monotonic()
+            if on_progress and current:
+                on_progress(current)
+        elif time.monotonic() - changed_at >= LEASE_STALE_SECONDS:
+            return current, True
+        time.sleep(LEASE_POLL_SECONDS)
+
+
+def _finished_file(dest_path: str, record: Optional[dict]) -> bool:
+    try:
+        size = os.path.getsize(dest_path)
+    except OSError:
+        return False
+    expected = (record or {}).get("total_bytes")
+    return size > 0 and (not isinstance(expected, int) or size == expected)
+
+
+def claim_download(dest_path: str,
+                   label: str = "",
+                   on_progress: Optional[Callable[[dict], None]] = None,
+                   cancel_check: Optional[Callable[[], bool]] = None,
+                   on_wait: Optional[Callable[[], None]] = None) -> Tuple[Optional[DownloadLease], Optional[dict]]:
+    """
+    Become the one process downloading dest_path, following another instance's
+    download of it first if there is one (on_wait is called once before that).
+    Returns (lease, None) once this process should download (release the lease
+    when done), or (None, owner record) when the other instance left the finished
+    file at dest_path. (None, None) means leases are off or can't be created
+    here; download without coordination.
+    """
+    if not DOWNLOAD_LEASES:
+        return None, None
+    stale = None
+    waited = False
+    while True:
+        try:
+            lease = acquire_download_lease(dest_path, label, stale_record=stale)
+        except OSError as e:
+            print(f"[DEBUG] Download lease unavailable for {dest_path}, downloading without it: {e}")
+            return None, None
+        if lease is not None:
+            return lease, None
+        if not waited:
+            waited = True
+            with _leases_lock:
+                _stats["followed"] += 1
+            if on_wait:
+                on_wait()
+        record, is_stale = follow_download_lease(dest_path, on_progress, cancel_check)
+        stale = record if is_stale else None
+        if not is_stale and _finished_file(dest_path, record):
+            with _leases_lock:
+                _stats["finished_elsewhere"] += 1
+            return None, record or {}
+
+
+def active_lease_names(directory: str) -> set:
+    """
+    Names of files in directory that some process is downloading right now.
+    Leases left by dead processes on this machine are removed on the way.
+    """
+    names = set()
+    try:
+        entries = os.listdir(directory)
+    except OSError:
+        return names
+    for entry in entries:
+        if not (entry.startswith(".") and entry.endswith(LEASE_SUFFIX)):
+            continue
+        path = os.path.join(directory, entry)
+        record = _read(path)
+        if record is None:
+            continue
+        if record and _owner_dead(record):
+            _break(path, record)
+            continue
+        names.add(entry[1:-len(LEASE_SUFFIX)])
+    return names
+
+
+def get_download_lease_stats() -> dict:
+    with _leases_lock:
+        stats = dict(_stats)
+        stats["held"] = len(_held)
+    stats["enabled"] = DOWNLOAD_LEASES
+    return stats
@@ -0,0 +1,139 @@
+"""
+Pick queued downloads for a pool of worker threads.
+
+The queue stays a plain list guarded by its lock (web_api owns both). Workers
+call claim() to take the first item whose slot keys (e.g. ("host", ...),
+("repo", ...)) are all under their caps, so a big repo can't occupy every
+worker while small files from other hosts wait behind it, and release() when
+the item is finished. Items that don't fit yet keep their place in the queue,
+as do items whose "not_before" timestamp (set when a job is put back to wait,
+e.g. for disk space) is still in the future.
+
+Stdlib only, so scripts/bench_transfer.py can drive it against a local server.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+DOWNLOAD_WORKERS = _env_int("HF_DOWNLOADER_WORKERS", 3, 1)
+DOWNLOAD_PER_HOST_LIMIT = _env_int("HF_DOWNLOADER_PER_HOST", 2, 1)
+DOWNLOAD_PER_REPO_LIMIT = _env_int("HF_DOWNLOADER_PER_REPO", 2, 1)
+# Deferred SHA256 checks get their own workers, at most VERIFY_PER_DEVICE_LIMIT reading from one disk.
+VERIFY_WORKERS = _env_int("HF_DOWNLOADER_VERIFY_WORKERS", 2, 1)
+VERIFY_PER_DEVICE_LIMIT = _env_int("HF_DOWNLOADER_VERIFY_PER_DEVICE", 1, 1)
+
+
+class DownloadScheduler:
+    """Per-key concurrency caps over a shared queue list."""
+
+    def __init__(self,
+                 queue: list,
+                 queue_lock: threading.Lock,
+                 slot_keys: Callable[[dict], Iterable[Tuple[str, str]]],
+                 limits: Optional[Dict[str, int]] = None):
+        self.queue = queue
+        self.queue_lock = queue_lock
+        self.slot_keys = slot_keys
+        self.limits = dict(limits or {})
+        self._lock = threading.Lock()
+        self._active = {}
+        self._running = 0
+        self._stats = {"claimed": 0, "deferred": 0, "peak_running": 0}
+
+    def _keys_for(self, item: dict) -> List[Tuple[str, str]]:
+        try:
+            return [key for key in self.slot_keys(item) if key and key[1]]
+        except Exception:
+            return []
+
+    def _fits_locked(self, keys) -> bool:
+        for key in keys:
+            limit = self.limits.get(key[0])
+            if limit and self._active.get(key, 0) >= limit:
+                return False
+        return True
+
+    def claim(self) -> Tuple[Optional[dict], List[Tuple[str, str]]]:
+        """Pop the first queued item that fits under every cap; (None, []) if none does."""
+        with self.queue_lock:
+            if not self.queue:
+                return None, []
+            now = time.time()
+            keyed = [(index, item, self._keys_for(item)) for index, item in enumerate(self.queue)]
+            with self._lock:
+                for index, item, keys in keyed:
+                    if float(item.get("not_before") or 0) > now or not self._fits_locked(keys):
+                        continue
+                    del self.queue[index]
+                    for key in keys:
+                        self._active[key] = self._active.get(key, 0) + 1
+                    self._running += 1
+                    self._stats["claimed"] += 1
+                    self._stats["deferred"] += index
+                    self._stats["peak_running"] = max(self._stats["peak_running"], self._running)
+                    return item, keys
+        return None, []
+
+    def release(self, keys: List[Tuple[str, str]]) -> None:
+        with self._lock:
+            self._running = max(0, self._running - 1)
+            for key in keys:
+                count = self._active.get(key, 0) - 1
+                if count > 0:
+                    self._active[key] = count
+                else:
+                    self._active.pop(key, None)
+
+    def running(self) -> int:
+        with self._lock:
+            return self._running
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["running"] = self._running
+            stats["limits"] = dict(self.limits)
+            stats["active"] = {f"{kind}:{name}": count for (kind, name), count in self._active.items()}
+        return stats
+
+
+def run_workers(scheduler: DownloadScheduler,
+                handle_item: Callable[[dict], None],
+                count: int,
+                keep_running: Callable[[], bool],
+                on_idle: Optional[Callable[[], None]] = None,
+                idle_sleep: float = 0.2) -> List[threading.Thread]:
+    """Start `count` daemon threads that claim items and pass them to handle_item."""
+
+    def loop():
+        while keep_running():
+            item, keys = scheduler.claim()
+            if item is None:
+                if on_idle:
+                    on_idle()
+                time.sleep(idle_sleep)
+                continue
+            try:
+                handle_item(item)
+            except Exception as e:
+                print(f"[DEBUG] Download worker error: {e}")
+            finally:
+                scheduler.release(keys)
+
+    threads = []
+    for index in range(max(1, int(count))):
+        thread = threading.Thread(target=loop, name=f"hf-download-{index}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
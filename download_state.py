@@ -0,0 +1,216 @@
+"""
+Crash-recovery store for the download queue.
+
+Only records that must survive a restart (queued, running and interrupted jobs)
+are stored, and only when their status actually changes; byte counts, speed and
+ETA stay in memory. Each change is one line appended to a JSON-lines journal:
+
+  {"op": "put", "id": "...", "record": {...}}
+  {"op": "del", "id": "..."}
+
+Once the journal holds several times more lines than live records it is
+compacted into a fresh file of puts and swapped in with os.replace, so neither a
+crash mid-append (the torn last line is ignored on load) nor mid-compaction
+loses the previous state.
+
+Callers write to the journal after releasing their own status lock, so two
+transitions of one download can arrive out of order. put() and delete() take the
+caller's status version and drop an op older than the last one applied to that
+id; versions live in memory only, since they order ops within one process.
+
+Stdlib only, so scripts/bench_transfer.py can import it without ComfyUI.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return str(value).strip().lower() in {"1", "true", "yes", "on"}
+
+
+DOWNLOAD_JOURNAL_VERSION = 1
+# Compact once the journal has this many lines and at least JOURNAL_COMPACT_RATIO per live record.
+JOURNAL_COMPACT_MIN_LINES = 256
+JOURNAL_COMPACT_RATIO = 4
+# fsync each append; transitions are rare enough (a handful per download) that this is cheap.
+JOURNAL_FSYNC = _env_flag("HF_DOWNLOADER_JOURNAL_FSYNC", default=True)
+# Versions of deleted ids remembered (so a late put can't revive them), newest kept.
+VERSION_TOMBSTONES_KEEP = 1024
+
+
+class DownloadStateStore:
+    """Append-only journal of persisted download records, keyed by download id."""
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+        self._live = {}
+        # download id -> status version of the last op applied
+        self._versions = {}
+        self._handle = None
+        self._lines = 0
+        self._stats = {"appends": 0, "skipped": 0, "stale": 0, "compactions": 0}
+
+    def load(self) -> Dict[str, dict]:
+        """Replay the journal (and a pre-journal state file, if any) and return the live records."""
+        with self._lock:
+            self._close_locked()
+            self._live = {}
+            self._versions = {}
+            self._lines = 0
+            migrated = self._load_legacy_locked()
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        self._lines += 1
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # Torn write from a crash; everything before it is intact.
+                            continue
+                        self._apply_locked(entry)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[DEBUG] Failed to read download journal {self.path}: {e}")
+            # The legacy file goes only once its records are safely in the journal.
+            if self._compact_locked() and migrated:
+                try:
+                    os.remove(self.legacy_path)
+                except OSError:
+                    pass
+            return {download_id: dict(record) for download_id, record in self._live.items()}
+
+    def put(self, download_id: str, record: dict, version: Optional[int] = None) -> None:
+        with self._lock:
+            if self._is_stale_locked(download_id, version):
+                return
+            if self._live.get(download_id) == record:
+                self._stats["skipped"] += 1
+                return
+            self._live[download_id] = dict(record)
+            self._append_locked({"op": "put", "id": download_id, "record": record})
+
+    def delete(self, download_id: str, version: Optional[int] = None) -> None:
+        with self._lock:
+            if self._is_stale_locked(download_id, version):
+                return
+            if download_id not in self._live:
+                self._stats["skipped"] += 1
+                return
+            self._live.pop(download_id, None)
+            self._append_locked({"op": "del", "id": download_id})
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["live"] = len(self._live)
+            stats["journal_lines"] = self._lines
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
+
+    def _is_stale_locked(self, download_id: str, version: Optional[int]) -> bool:
+        """True for an op older than the last one applied to download_id; ops without a version always apply."""
+        if version is None:
+            return False
+        last = self._versions.get(download_id)
+        if last is not None and version < last:
+            self._stats["stale"] += 1
+            return True
+        self._versions[download_id] = version
+        if len(self._versions) > len(self._live) + 2 * VERSION_TOMBSTONES_KEEP:
+            tombstones = sorted((v, i) for i, v in self._versions.items() if i not in self._live)
+            for _, old_id in tombstones[:-VERSION_TOMBSTONES_KEEP]:
+                self._versions.pop(old_id, None)
+        return False
+
+    def _apply_locked(self, entry) -> None:
+        if not isinstance(entry, dict) or not entry.get("id"):
+            return
+        if entry.get("op") == "put" and isinstance(entry.get("record"), dict):
+            self._live[entry["id"]] = entry["record"]
+        elif entry.get("op") == "del":
+            self._live.pop(entry["id"], None)
+
+    def _load_legacy_locked(self) -> bool:
+        """Read the pre-journal state file into _live; True when it exists and may be removed."""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return False
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            for item in state.get("items", []) or []:
+                if isinstance(item, dict) and item.get("download_id"):
+                    self._live[item["download_id"]] = item
+            print(f"[DEBUG] Migrated {len(self._live)} download(s) from {self.legacy_path}")
+        except Exception as e:
+            print(f"[DEBUG] Ignoring unreadable download state {self.legacy_path}: {e}")
+        return True
+
+    def _open_locked(self):
+        if self._handle is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._handle = open(self.path, "a", encoding="utf-8")
+        return self._handle
+
+    def _close_locked(self) -> None:
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except Exception:
+                pass
+            self._handle = None
+
+    def _append_locked(self, entry: dict) -> None:
+        try:
+            handle = self._open_locked()
+            handle.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            handle.flush()
+            if JOURNAL_FSYNC:
+                os.fsync(handle.fileno())
+            self._lines += 1
+            self._stats["appends"] += 1
+        except Exception as e:
+            print(f"[DEBUG] Failed to append to download journal: {e}")
+            self._close_locked()
+            return
+        if self._lines >= max(JOURNAL_COMPACT_MIN_LINES, JOURNAL_COMPACT_RATIO * len(self._live)):
+            self._compact_locked()
+
+    def _compact_locked(self) -> bool:
+        """Rewrite the journal as one put per live record (or remove it when nothing is live); False on failure."""
+        self._close_locked()
+        try:
+            if not self._live:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                self._lines = 0
+                return True
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"op": "meta", "id": "", "version": DOWNLOAD_JOURNAL_VERSION,
+                                    "compacted_at": time.time()}) + "\n")
+                for download_id, record in self._live.items():
+                    f.write(json.dumps({"op": "put", "id": download_id, "record": record},
+                                       separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._live) + 1
+            self._stats["compactions"] += 1
+            return True
+        except Exception as e:
+            print(f"[DEBUG] Failed to compact download journal: {e}")
+            return False
@@ -1,5 +1,4 @@
 import os
-import sys
 import shutil
 import tempfile
 import time
@@ -7,22 +6,51 @@ import json
 import zipfile
 import hashlib
 import re
-import socket
+import threading
 import yaml
-import subprocess
-import urllib.error
 import urllib.parse
-import urllib.request
+import urllib.error
 from typing import Optional, Tuple, Callable
 
 from .file_manager import resolve_target_dir
+from .download_engine import (
+    PARTIAL_SIDECAR_SUFFIX,
+    ChunkReader,
+    PartialDownload,
+    TransferProgress,
+    download_to_file,
+    is_retryable_url_error,
+    partial_path_for,
+    probe_url,
+)
+from .file_transfer import STRATEGY_BUFFERED, STRATEGY_REFLINK, finalize_file
+from .hub_worker import FILE_STAGES, run_hub_job
+from .repo_metadata import get_file_metadata, get_repo_files_metadata
+from .disk_space import InsufficientDiskSpaceError, reserve_disk_space
+from .content_index import cached_sha256, find_file, note_linked, record_file, sha_for_source
+from .model_integrity import structural_problem
+from .peer_mirror import (
+    MIRROR_SHA_HEADER,
+    UPSTREAM_SOURCE,
+    hub_file_candidates,
+    note_bytes,
+    note_result,
+    note_unreachable,
+    url_candidates,
+)
+from .download_lease import DownloadLease, claim_download
+from .hf_cache import evict_cache_path, evict_cached_file, evict_cached_repo
+from .access_cache import (
+    forget_access_strategy,
+    get_access_strategy,
+    note_attempts_avoided,
+    record_access_strategy,
+)
 
 
 from huggingface_hub import (
-    HfApi,
     hf_hub_download,
     snapshot_download,
-    scan_cache_dir,
     list_repo_files
 )
 
@@ -40,7 +68,30 @@ def _env_flag(name: str, default: bool = False) -> bool:
         return default
     return str(value).strip().lower() in {"1", "true", "yes", "on"}
 
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
 VERIFY_EXISTING_DOWNLOADS = _env_flag("HF_DOWNLOADER_VERIFY_EXISTING", default=False)
+# Stream Hub files straight into the destination folder instead of going through huggingface_hub.
+HF_DIRECT_DOWNLOADS = _env_flag("HF_DOWNLOADER_DIRECT", default=True)
+HF_STAGE_DIR_SUFFIX = ".hf_stage"
+# Mirror downloads get their own .part so they never discard an upstream partial (different URL).
+MIRROR_PART_SUFFIX = ".mirror"
+# Hardlink/reflink a file whose SHA256 is already on disk (see content_index) instead of downloading it.
+DEDUP_LOCAL_FILES = _env_flag("HF_DOWNLOADER_DEDUP", default=True)
+# Files of one folder download fetched at the same time.
+FOLDER_WORKERS = _env_int("HF_DOWNLOADER_FOLDER_WORKERS", 4, 1)
+# model-00001-of-00006.safetensors, and the model.safetensors.index.json that maps tensors to them.
+SHARD_FILE_RE = re.compile(r"^(?P<stem>.+)-(?P<index>\d{5})-of-(?P<count>\d{5})(?P<ext>\.[^./]+)$")
+SHARD_INDEX_SUFFIX = ".index.json"
+# Inside a shard set's staging folder: the old entry points while changed shards are swapped in.
+SHARD_ASIDE_DIR = ".previous"
+# Non-LFS files are at most 10 MB on the Hub; their git blob id is cheap to recompute.
+GIT_BLOB_CHECK_MAX_BYTES = 10 * 1024 * 1024
 
 def folder_size(directory: str) -> int:
     total = 0
@@ -63,20 +114,11 @@ def traverse_subfolders(root_folder: str, segments: list[str]) -> str:
 
 
 def clear_cache_for_path(downloaded_path: str):
-    print(f"[DEBUG] Attempting to clean cache for {downloaded_path}")
+    """Evict a hf_hub_download/snapshot_download result from the HF cache (no-op for local_dir paths)."""
     try:
-        cache_info = scan_cache_dir()
-        for repo in cache_info.repos:
-            for revision in repo.revisions:
-                # Match snapshot folder or file path
-                if str(revision.snapshot_path) == downloaded_path or any(
-                    str(f.file_path) == downloaded_path for f in revision.files
-                ):
-                    delete_strategy = cache_info.delete_revisions(revision.commit_hash)
-                    print(f"[DEBUG] Deleting cached revision: {revision.commit_hash}")
-                    delete_strategy.execute()
-                    print("[DEBUG] Cache cleaned.")
-                    return
+        removed = evict_cache_path(downloaded_path)
+        if removed:
+            print(f"[DEBUG] Removed {removed} cache entries for {downloaded_path}")
     except Exception as e:
         print(f"[DEBUG] Cache cleaning failed: {e}")
 
@@ -86,41 +128,9 @@ def clear_cache_for_repo(repo_id: str):
     normalized_repo = str(repo_id or "").strip()
     if not normalized_repo:
         return
-    print(f"[DEBUG] Attempting to clean cache for repo {normalized_repo}")
-
-    try:
-        cache_info = scan_cache_dir()
-        commit_hashes = []
-        for repo in getattr(cache_info, "repos", []) or []:
-            repo_key = str(getattr(repo, "repo_id", "") or "").strip()
-            if repo_key.lower() != normalized_repo.lower():
-                continue
-            for revision in getattr(repo, "revisions", []) or []:
-                commit_hash = str(getattr(revision, "commit_hash", "") or "").strip()
-                if commit_hash:
-                    commit_hashes.append(commit_hash)
-        for commit_hash in commit_hashes:
-            try:
-                delete_strategy = cache_info.delete_revisions(commit_hash)
-                print(f"[DEBUG] Deleting cached revision for repo cleanup: {commit_hash}")
-                delete_strategy.execute()
-            except Exception as inner:
-                print(f"[DEBUG] Failed to delete revision {commit_hash}: {inner}")
-    except Exception as e:
-        print(f"[DEBUG] Repo cache cleanup via scan_cache_dir failed: {e}")
-
-    # Interrupted downloads can leave orphaned *.incomplete blobs outside tracked revisions.
     try:
-        repo_folder = f"models--{normalized_repo.replace('/', '--')}"
-        repo_cache_dir = os.path.join(_get_hf_cache_dir(), repo_folder)
-        blobs_dir = os.path.join(repo_cache_dir, "blobs")
-        if os.path.isdir(blobs_dir):
-            for name in os.listdir(blobs_dir):
-                if name.endswith(".incomplete"):
-                    _safe_remove(os.path.join(blobs_dir, name))
-        if os.path.isdir(repo_cache_dir):
-            shutil.rmtree(repo_cache_dir, ignore_errors=True)
-        print(f"[DEBUG] Repo cache cleaned for {normalized_repo}")
+        if evict_cached_repo(normalized_repo):
+            print(f"[DEBUG] Repo cache cleaned for {normalized_repo}")
     except Exception as e:
         print(f"[DEBUG] Repo cache directory cleanup failed: {e}")
 
@@ -195,80 +205,121 @@ def _safe_remove(path: str):
         print(f"[DEBUG] Failed to remove {path}: {e}")
 
 
-def _extract_lfs_value(lfs, key: str):
-    if not lfs:
-        return None
-    if isinstance(lfs, dict):
-        return lfs.get(key)
-    return getattr(lfs, key, None)
-
-
 def get_remote_file_metadata(repo_id: str,
                              remote_filename: str,
                              revision: str = None,
                              token: str = None) -> Tuple[Optional[int], Optional[str], Optional[str]]:
+    """(size, sha256, etag) of one Hub file, via the shared repo_metadata cache."""
     try:
-        api = HfApi()
-        info = api.model_info(repo_id, revision=revision, token=token, files_metadata=True)
-        siblings = getattr(info, "siblings", []) or []
-        for sibling in siblings:
-            if getattr(sibling, "rfilename", None) != remote_filename:
-                continue
-            size = getattr(sibling, "size", None)
-            blob_id = getattr(sibling, "blob_id", None)
-            etag = getattr(sibling, "etag", None)
-            lfs = getattr(sibling, "lfs", None)
-            if lfs:
-                sha = _extract_lfs_value(lfs, "sha256") or _extract_lfs_value(lfs, "oid")
-                size = _extract_lfs_value(lfs, "size") or size
-                etag = sha or blob_id or etag
-            else:
-                sha = None
-                etag = blob_id or etag
-            return size, sha, etag
+        return get_file_metadata(repo_id, remote_filename, revision=revision, token=token)
     except Exception as e:
         print(f"[DEBUG] Failed to fetch metadata for {repo_id}/{remote_filename}: {e}")
     return None, None, None
 
 
-def _get_hf_cache_dir() -> str:
+def clear_cache_for_file(repo_id: str,
+                         etag: Optional[str],
+                         filename: Optional[str] = None,
+                         revision: Optional[str] = None):
+    """
+    Remove one file's blob (finished or *.incomplete) from the HF cache, plus its
+    snapshot link when filename is known. Other blobs of the same repo are left alone.
+    """
+    normalized_repo = str(repo_id or "").strip()
+    if not normalized_repo or not etag:
+        return
     try:
-        from huggingface_hub.constants import HF_HUB_CACHE
-        return HF_HUB_CACHE
-    except Exception:
-        return os.path.join(os.path.expanduser("~"), ".cache", "huggingface", "hub")
-
-
-def get_blob_paths(repo_id: str, etag: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
-    if not etag:
-        return None, None
-    repo_folder = f"models--{repo_id.replace('/', '--')}"
-    blob_dir = os.path.join(_get_hf_cache_dir(), repo_folder, "blobs")
-    blob_path = os.path.join(blob_dir, etag)
-    return blob_path, blob_path + ".incomplete"
+        removed = evict_cached_file(normalized_repo, etag, filename=filename, revision=revision)
+        print(f"[DEBUG] Removed {removed} cached file(s) for {normalized_repo} ({etag})")
+    except Exception as e:
+        print(f"[DEBUG] Cache cleanup for {normalized_repo} ({etag}) failed: {e}")
 
 
 def _verify_file_integrity(dest_path: str,
                            expected_size: Optional[int],
-                           expected_sha: Optional[str]):
+                           expected_sha: Optional[str],
+                           actual_sha: Optional[str] = None,
+                           cancel_check: Optional[Callable[[], bool]] = None):
+    """
+    Check size and, when known, SHA256. Pass actual_sha when the digest was computed
+    while the file was written; otherwise the content index answers for files
+    hashed before, and the file is only re-read when neither knows its digest.
+    Files whose SHA256 can't be checked get the header-level structural check.
+    """
     if expected_size is not None:
         actual_size = os.path.getsize(dest_path)
         if actual_size != expected_size:
             raise RuntimeError(
                 f"Size mismatch (expected {expected_size} bytes, got {actual_size} bytes)"
             )
+    if expected_sha and actual_sha:
+        if actual_sha.lower() != expected_sha.lower():
+            raise RuntimeError("SHA256 mismatch")
+        record_file(dest_path, expected_sha)
+        return
     if expected_sha:
+        cached_sha = cached_sha256(dest_path)
+        if cached_sha:
+            # Hashed before and unchanged since (same device, inode, size and mtime).
+            if cached_sha != expected_sha.lower():
+                raise RuntimeError("SHA256 mismatch")
+            return
         size_for_sha = expected_size if expected_size is not None else os.path.getsize(dest_path)
         if SHA_VERIFY_MAX_BYTES is not None and size_for_sha > SHA_VERIFY_MAX_BYTES:
             print(f"[DEBUG] Skipping SHA256 for large file ({size_for_sha} bytes).")
+            _check_structure(dest_path)
             return
         sha256 = hashlib.sha256()
-        with open(dest_path, "rb") as f:
-            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        with open(dest_path, "rb", buffering=0) as f:
+            reader = ChunkReader(f)
+            for chunk in iter(reader.read, b""):
+                if cancel_check and cancel_check():
+                    raise InterruptedError("Verification cancelled")
                 sha256.update(chunk)
         actual_sha = sha256.hexdigest().lower()
         if actual_sha != expected_sha.lower():
             raise RuntimeError("SHA256 mismatch")
+        record_file(dest_path, expected_sha)
+        return
+    _check_structure(dest_path)
+
+
+def _check_structure(path: str):
+    problem = structural_problem(path)
+    if problem:
+        raise RuntimeError(f"Corrupt {os.path.basename(path)}: {problem}")
+
+
+def _link_indexed_copy(expected_sha: Optional[str],
+                       expected_size: Optional[int],
+                       dest_path: str,
+                       cancel_check: Optional[Callable[[], bool]] = None) -> Optional[Tuple[str, str]]:
+    """
+    Hardlink (same volume) or reflink an indexed local file with this SHA256 to
+    dest_path. Returns (source path, strategy), or None when there is no local copy
+    or it can't be shared without copying its bytes.
+    """
+    if not DEDUP_LOCAL_FILES or not expected_sha:
+        return None
+    source = find_file(expected_sha, expected_size, exclude=dest_path)
+    if not source:
+        return None
+    try:
+        strategy = finalize_file(
+            source,
+            dest_path,
+            allow_hardlink=True,
+            cancel_check=cancel_check,
+            copy_strategies=(STRATEGY_REFLINK,),
+        )
+    except InterruptedError:
+        raise
+    except OSError as e:
+        print(f"[DEBUG] Local copy {source} can't be linked to {dest_path}, downloading instead: {e}")
+        return None
+    record_file(dest_path, expected_sha)
+    note_linked(os.path.getsize(dest_path))
+    return source, strategy
 
 
 def _existing_file_result(
@@ -351,27 +402,221 @@ def _filename_from_url_path(url_value: str) -> str:
     return _sanitize_download_filename(tail)
 
 
-def _parse_content_length(header_value: str) -> Optional[int]:
-    if header_value is None:
-        return None
+def _hf_resolve_url(repo_id: str, remote_filename: str, revision: Optional[str] = None) -> str:
     try:
-        size = int(str(header_value).strip())
-        return size if size >= 0 else None
+        from huggingface_hub.constants import ENDPOINT
     except Exception:
+        ENDPOINT = "https://huggingface.co"
+    quoted_revision = urllib.parse.quote(str(revision or "main"), safe="")
+    quoted_path = urllib.parse.quote(remote_filename, safe="/")
+    return f"{ENDPOINT.rstrip('/')}/{repo_id}/resolve/{quoted_revision}/{quoted_path}"
+
+
+def _download_hf_file_direct(repo_id: str,
+                             remote_filename: str,
+                             revision: Optional[str],
+                             token: Optional[str],
+                             target_dir: str,
+                             target_name: str,
+                             progress_cb: Optional[Callable[[dict], None]] = None,
+                             cancel_check: Optional[Callable[[], bool]] = None) -> Tuple[str, str]:
+    """
+    Stream a Hub file from its resolve URL into a resumable .part file in target_dir.
+    Returns the completed .part path and its SHA256 (hashed as it was written);
+    the caller renames it into place.
+    """
+    url = _hf_resolve_url(repo_id, remote_filename, revision)
+    headers = {
+        "User-Agent": "ComfyUI-HuggingFace-Downloader/1.0",
+        "Accept": "*/*",
+    }
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    response, probe = probe_url(url, headers)
+    with response:
+        partial = PartialDownload.open(partial_path_for(target_dir, target_name), url, probe)
+        progress = TransferProgress(probe.get("total_bytes"), progress_cb)
+        try:
+            written = download_to_file(url, partial, headers, response, probe, progress, cancel_check=cancel_check)
+            total_bytes = probe.get("total_bytes")
+            if total_bytes is not None and written != total_bytes:
+                raise RuntimeError(f"Incomplete download (expected {total_bytes} bytes, got {written} bytes)")
+            content_sha = partial.sha256(written)
+        except InterruptedError:
+            partial.discard()
+            raise
+        except Exception:
+            partial.keep_or_discard()
+            raise
+    progress.maybe_emit(force=True)
+    partial.finish()
+    return partial.part_path, content_sha
+
+
+def _fetch_from_mirrors(candidates: list,
+                        target_dir: str,
+                        target_name: str,
+                        expected_size: Optional[int],
+                        expected_sha: Optional[str],
+                        progress_cb: Optional[Callable[[dict], None]] = None,
+                        cancel_check: Optional[Callable[[], bool]] = None) -> Optional[Tuple[str, str, str]]:
+    """
+    Try each mirror candidate (see peer_mirror) in turn. Returns (completed .part
+    path, SHA256, source) for the first one whose bytes hash to expected_sha, or to
+    the SHA256 the peer advertises when expected_sha is None (only for token-
+    authenticated peers, see peer_mirror.url_candidates). None when no mirror
+    delivered the file; the caller then downloads it upstream.
+    """
+    part_path = partial_path_for(target_dir, f"{target_name}{MIRROR_PART_SUFFIX}")
+    for candidate in candidates:
+        if cancel_check and cancel_check():
+            raise InterruptedError("Download cancelled")
+        source = candidate["source"]
+        url = candidate["url"]
+        headers = candidate["headers"]
+        try:
+            response, probe = probe_url(url, headers)
+        except urllib.error.HTTPError:
+            note_result("misses")
+            continue
+        except Exception as e:
+            note_unreachable(source, e)
+            continue
+        with response:
+            advertised_sha = str(response.headers.get(MIRROR_SHA_HEADER) or "").strip().lower()
+            wanted_sha = str(expected_sha or advertised_sha).lower()
+            if not wanted_sha or (expected_size is not None and probe.get("total_bytes") != expected_size):
+                print(f"[DEBUG] Mirror {source} offers a different {target_name} (size {probe.get('total_bytes')}), skipping")
+                note_result("rejected")
+                continue
+            partial = PartialDownload.open(part_path, url, probe)
+            progress = TransferProgress(probe.get("total_bytes"), progress_cb)
+            try:
+                written = download_to_file(url, partial, headers, response, probe, progress, cancel_check=cancel_check)
+                content_sha = partial.sha256(written)
+            except InterruptedError:
+                partial.discard()
+                raise
+            except Exception as e:
+                partial.keep_or_discard()
+                print(f"[DEBUG] Mirror {source} failed for {target_name}: {e}")
+                note_result("misses")
+                continue
+        if content_sha != wanted_sha:
+            partial.discard()
+            print(f"[DEBUG] Mirror {source} sent {target_name} with the wrong SHA256, discarded")
+            note_result("rejected")
+            continue
+        progress.maybe_emit(force=True)
+        partial.finish()
+        note_result("hits")
+        print(f"[DEBUG] Fetched {target_name} from {source}")
+        return partial.part_path, content_sha, source
+    return None
+
+
+def _hub_progress_handler(progress: TransferProgress) -> Callable[[dict], None]:
+    """on_message for run_hub_job: feed the worker's byte counts into progress."""
+    def on_message(message: dict):
+        kind = message.get("type")
+        if kind == "stage":
+            # A fallback stage starts its file from scratch.
+            progress.reset(0)
+        elif kind == "progress":
+            progress.update_to(int(message.get("downloaded_bytes") or 0), message.get("total_bytes") or None)
+            progress.maybe_emit()
+    return on_message
+
+
+def _follower_progress(progress_cb: Optional[Callable[[dict], None]]) -> Optional[Callable[[dict], None]]:
+    """on_progress for claim_download: show another instance's progress as this job's own."""
+    if not progress_cb:
         return None
 
+    def on_progress(record: dict):
+        progress_cb({
+            "downloaded_bytes": record.get("downloaded_bytes") or 0,
+            "total_bytes": record.get("total_bytes"),
+            "speed_bps": record.get("speed_bps"),
+            "eta_seconds": record.get("eta_seconds"),
+            "phase": f"Downloading in another instance ({record.get('host') or 'unknown host'})",
+        })
+    return on_progress
+
+
+def _publish_to_lease(lease: Optional[DownloadLease], progress_cb: Optional[Callable[[dict], None]]) -> Optional[Callable[[dict], None]]:
+    """Wrap progress_cb so followers in other processes see the same progress through the lease."""
+    if lease is None:
+        return progress_cb
+
+    def publish(payload: dict):
+        lease.update(payload)
+        if progress_cb:
+            progress_cb(payload)
+    return publish
+
+
+def _publish_phase_to_lease(lease: Optional[DownloadLease], status_cb: Optional[Callable[[str], None]]) -> Optional[Callable[[str], None]]:
+    if lease is None:
+        return status_cb
+
+    def publish(phase: str):
+        lease.update({"phase": phase})
+        if status_cb:
+            status_cb(phase)
+    return publish
+
+
+def _finished_elsewhere_message(target_name: str, dest_path: str, owner: dict) -> str:
+    size_gb = os.path.getsize(dest_path) / (1024 ** 3)
+    message = f"{target_name} downloaded by another instance ({owner.get('host') or 'unknown host'}) | {size_gb:.3f} GB"
+    print("[DEBUG]", message)
+    return message
 
-def _is_retryable_url_error(error: Exception) -> bool:
-    if isinstance(error, urllib.error.HTTPError):
-        return int(getattr(error, "code", 0) or 0) in (408, 425, 429, 500, 502, 503, 504)
-    if isinstance(error, urllib.error.URLError):
-        reason = getattr(error, "reason", None)
-        if isinstance(reason, socket.timeout):
-            return True
-        text = str(reason or "").lower()
-        return any(token in text for token in ("timeout", "temporarily", "reset", "refused", "unreachable"))
-    text = str(error).lower()
-    return "timeout" in text or "temporarily unavailable" in text
+
+def _route_key(route: dict) -> str:
+    if route.get("route") == "direct":
+        return "direct:anonymous" if route.get("anonymous") else "direct:token"
+    return f"hub:xet={'on' if route.get('xet') else 'off'}:stage={route.get('stage') or 1}"
+
+
+def _plan_hf_download_routes(repo_id: str, token: Optional[str]) -> tuple:
+    """
+    Order the routes run_download tries for a Hub file. The default chain is the
+    direct stream (with token, then anonymously if the token is refused), then the
+    worker with Xet on, then with Xet off, each walking hub_worker's four stages.
+    A route cached by access_cache for this repo goes first.
+    Returns (plan, cached_route or None, attempts the cached route skips).
+    """
+    routes = []
+    if HF_DIRECT_DOWNLOADS:
+        routes.append({"route": "direct", "anonymous": False})
+        if token:
+            routes.append({"route": "direct", "anonymous": True})
+    routes.append({"route": "hub", "xet": True, "stage": 1})
+    routes.append({"route": "hub", "xet": False, "stage": 1})
+
+    cached = get_access_strategy(repo_id)
+    if not cached:
+        return routes, None, 0
+    cached_route = None
+    skipped = 0
+    if cached.get("route") == "direct" and HF_DIRECT_DOWNLOADS:
+        anonymous = bool(cached.get("anonymous"))
+        if not anonymous or token:
+            cached_route = {"route": "direct", "anonymous": anonymous}
+            skipped = 1 if anonymous else 0
+    elif cached.get("route") == "hub":
+        stage = min(max(int(cached.get("stage") or 1), 1), len(FILE_STAGES))
+        use_xet = bool(cached.get("xet"))
+        cached_route = {"route": "hub", "xet": use_xet, "stage": stage}
+        direct_attempts = sum(1 for route in routes if route["route"] == "direct")
+        skipped = direct_attempts + (0 if use_xet else len(FILE_STAGES)) + stage - 1
+    if cached_route is None:
+        return routes, None, 0
+    print(f"[DEBUG] Trying cached download route {_route_key(cached_route)} for {repo_id} first.")
+    return [cached_route] + routes, cached_route, skipped
 
 
 def run_download(parsed_data: dict,
@@ -382,10 +627,17 @@ def run_download(parsed_data: dict,
                  return_info: bool = False,
                  target_filename: Optional[str] = None,
                  status_cb: Optional[Callable[[str], None]] = None,
-                 cancel_check: Optional[Callable[[], bool]] = None) -> tuple:
+                 cancel_check: Optional[Callable[[], bool]] = None,
+                 progress_cb: Optional[Callable[[dict], None]] = None,
+                 reserve_space: bool = True) -> tuple:
     """
-    Downloads a single file from Hugging Face Hub and copies it to models/<final_folder>.
-    Cleans up the cached copy to save disk space.
+    Downloads a single file from Hugging Face Hub into models/<final_folder>.
+    The file is streamed from the resolve URL into a .part file next to the
+    destination and renamed into place; if that fails, huggingface_hub downloads
+    it into a staging folder in the same directory (local_dir). The global HF
+    cache is never written, so each model hits the disk once.
+    reserve_space=False is for callers that reserved room for the file already
+    (a folder download reserves the whole folder up front).
     """
     token = get_token()
     print("[DEBUG] run_download (single-file) started")
@@ -399,13 +651,14 @@ def run_download(parsed_data: dict,
         target_name = os.path.basename(remote_filename)
     expected_size = None
     expected_sha = None
+    expected_etag = None
     metadata_loaded = False
 
     def ensure_remote_metadata() -> tuple[Optional[int], Optional[str]]:
-        nonlocal expected_size, expected_sha, metadata_loaded
+        nonlocal expected_size, expected_sha, expected_etag, metadata_loaded
         if metadata_loaded:
             return expected_size, expected_sha
-        expected_size, expected_sha, _ = get_remote_file_metadata(
+        expected_size, expected_sha, expected_etag = get_remote_file_metadata(
             parsed_data["repo"],
             remote_filename,
             revision=parsed_data.get("revision"),
@@ -415,11 +668,33 @@ def run_download(parsed_data: dict,
         return expected_size, expected_sha
 
     dest_path = ""
-    copy_tmp_path = ""
+    stage_dir = ""
+    reservation = None
+    lease = None
     try:
         target_dir = resolve_target_dir(final_folder)
         os.makedirs(target_dir, exist_ok=True)
-        dest_path = os.path.join(target_dir, target_name)
+        # Another process on a shared models folder may already be fetching this file;
+        # follow it instead of downloading the same bytes twice (see download_lease).
+        claimed_path = os.path.join(target_dir, target_name)
+        lease, finished_by = claim_download(
+            claimed_path,
+            target_name,
+            on_progress=_follower_progress(progress_cb),
+            cancel_check=cancel_check,
+        )
+        if finished_by is not None:
+            message = _finished_elsewhere_message(target_name, claimed_path, finished_by)
+            if return_info:
+                return (
+                    message,
+                    claimed_path,
+                    {"skip_verify": True, "existing_file": True, "downloaded_elsewhere": finished_by.get("host")},
+                )
+            return (message, claimed_path) if sync else ("", "")
+        dest_path = claimed_path
+        progress_cb = _publish_to_lease(lease, progress_cb)
+        status_cb = _publish_phase_to_lease(lease, status_cb)
 
         if os.path.exists(dest_path):
             if os.path.getsize(dest_path) == 0:
@@ -452,197 +727,158 @@ def run_download(parsed_data: dict,
                     print(f"[DEBUG] Existing file failed verification, re-downloading: {e}")
                     _safe_remove(dest_path)
 
-        if not defer_verify or return_info:
-            ensure_remote_metadata()
-
-        def run_file_download_with_cancel(download_kwargs: dict) -> str:
-            # We try to run the download subprocess in two configurations:
-            # 1. First with Xet enabled (xet_flag="1"). This is required for Xet-backed repos (e.g. black-forest-labs/FLUX.2-klein-9b-fp8)
-            #    because cas-bridge.xethub.hf.co blocks standard HTTP downloads without the Xet client authentication flow.
-            # 2. If that fails, we retry with Xet disabled (xet_flag="0") as a fallback to handle normal repos and fine-grained token issues.
-
-            comfy_temp = os.path.join(os.getcwd(), "temp")
-            os.makedirs(comfy_temp, exist_ok=True)
-
-            script = (
-                "import json, sys, os, urllib.request, shutil\n"
-                "use_xet = sys.argv[3] == '1'\n"
-                "if use_xet:\n"
-                "    os.environ['HF_HUB_DISABLE_XET'] = '0'\n"
-                "    os.environ['HF_HUB_ENABLE_HF_XET'] = '1'\n"
-                "else:\n"
-                "    os.environ['HF_HUB_DISABLE_XET'] = '1'\n"
-                "    os.environ['HF_HUB_ENABLE_HF_XET'] = '0'\n"
-                "    # Block hf_xet entirely - env vars are ignored by wild imports\n"
-                "    for _m in list(sys.modules):\n"
-                "        if 'xet' in _m:\n"
-                "            del sys.modules[_m]\n"
-                "    import importlib\n"
-                "    class _XetBlocker:\n"
-                "        def find_module(self, name, path=None):\n"
-                "            return self if 'xet' in name else None\n"
-                "        def load_module(self, name):\n"
-                "            raise ImportError(name)\n"
-                "    sys.meta_path.insert(0, _XetBlocker())\n"
-                "payload_path = sys.argv[1]\n"
-                "result_path = sys.argv[2]\n"
-                "with open(payload_path, 'r', encoding='utf-8') as f:\n"
-                "    kwargs = json.load(f)\n"
-                "from huggingface_hub import hf_hub_download\n"
-                "result = {}\n"
-                "try:\n"
-                "    # Stage 1: huggingface_hub download with token\n"
-                "    path = hf_hub_download(**kwargs)\n"
-                "    result = {'ok': True, 'path': path}\n"
-                "except Exception as e1:\n"
-                "    try:\n"
-                "        # Stage 2: huggingface_hub download without token (handles restricted fine-grained tokens on public repos)\n"
-                "        no_tok_kwargs = kwargs.copy()\n"
-                "        no_tok_kwargs['token'] = False\n"
-                "        orig_hf_token = os.environ.pop('HF_TOKEN', None)\n"
-                "        try:\n"
-                "            path = hf_hub_download(**no_tok_kwargs)\n"
-                "            result = {'ok': True, 'path': path}\n"
-                "        finally:\n"
-                "            if orig_hf_token is not None:\n"
-                "                os.environ['HF_TOKEN'] = orig_hf_token\n"
-                "    except Exception as e2:\n"
-                "        repo_id = kwargs.get('repo_id')\n"
-                "        filename = kwargs.get('filename')\n"
-                "        revision = kwargs.get('revision') or 'main'\n"
-                "        token = kwargs.get('token')\n"
-                "        url = f'https://huggingface.co/{repo_id}/resolve/{revision}/{filename}'\n"
-                "        class NoAuthRedirectHandler(urllib.request.HTTPRedirectHandler):\n"
-                "            def redirect_request(self, req, fp, code, msg, headers, newurl):\n"
-                "                new_req = urllib.request.Request(newurl)\n"
-                "                new_req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')\n"
-                "                return new_req\n"
-                "        opener = urllib.request.build_opener(NoAuthRedirectHandler)\n"
-                "        comfy_temp = os.path.join(os.getcwd(), 'temp')\n"
-                "        os.makedirs(comfy_temp, exist_ok=True)\n"
-                "        dest_file = os.path.join(comfy_temp, os.path.basename(filename))\n"
-                "        try:\n"
-                "            # Stage 3: manual redirect download with token\n"
-                "            req = urllib.request.Request(url)\n"
-                "            req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')\n"
-                "            if token:\n"
-                "                req.add_header('Authorization', f'Bearer {token}')\n"
-                "            with opener.open(req) as response:\n"
-                "                with open(dest_file, 'wb') as f:\n"
-                "                    shutil.copyfileobj(response, f)\n"
-                "            result = {'ok': True, 'path': dest_file}\n"
-                "        except Exception as e3:\n"
-                "            try:\n"
-                "                # Stage 4: manual redirect download without token\n"
-                "                req = urllib.request.Request(url)\n"
-                "                req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')\n"
-                "                with opener.open(req) as response:\n"
-                "                    with open(dest_file, 'wb') as f:\n"
-                "                        shutil.copyfileobj(response, f)\n"
-                "                result = {'ok': True, 'path': dest_file}\n"
-                "            except Exception as e4:\n"
-                "                result = {'ok': False, 'error': f'All download stages failed. Stage 1: {e1}. Stage 2: {e2}. Stage 3: {e3}. Stage 4: {e4}'}\n"
-                "with open(result_path, 'w', encoding='utf-8') as f:\n"
-                "    json.dump(result, f)\n"
-                "sys.exit(0 if result.get('ok') else 1)\n"
+        # The size is needed for admission anyway (and is cached by repo_metadata).
+        ensure_remote_metadata()
+        linked = _link_indexed_copy(expected_sha, expected_size, dest_path, cancel_check)
+        if linked:
+            source_path, strategy = linked
+            saved_bytes = os.path.getsize(dest_path)
+            final_message = (
+                f"Linked {target_name} to identical local file {source_path} ({strategy}) | "
+                f"{saved_bytes / (1024 ** 3):.3f} GB not downloaded"
             )
+            print("[DEBUG]", final_message)
+            if return_info:
+                return (
+                    final_message,
+                    dest_path,
+                    {
+                        "expected_size": expected_size,
+                        "expected_sha": expected_sha,
+                        "skip_verify": True,
+                        "deduplicated_from": source_path,
+                        "saved_bytes": saved_bytes,
+                    },
+                )
+            return (final_message, dest_path) if sync else ("", "")
+        reservation = None if not reserve_space else reserve_disk_space(
+            dest_path,
+            expected_size,
+            watch=[
+                dest_path,
+                partial_path_for(target_dir, target_name),
+                partial_path_for(target_dir, f"{target_name}{MIRROR_PART_SUFFIX}"),
+                os.path.join(target_dir, f".{target_name}{HF_STAGE_DIR_SUFFIX}"),
+            ],
+        )
 
-            last_error = "Unknown error"
-            for xet_flag in ["1", "0"]:
-                payload_fd, payload_path = tempfile.mkstemp(prefix="hf_file_payload_", suffix=".json", dir=comfy_temp)
-                result_fd, result_path = tempfile.mkstemp(prefix="hf_file_result_", suffix=".json", dir=comfy_temp)
-                os.close(payload_fd)
-                os.close(result_fd)
-
-                try:
-                    with open(payload_path, "w", encoding="utf-8") as f:
-                        json.dump(download_kwargs, f)
-
-                    proc = subprocess.Popen(
-                        [sys.executable, "-u", "-c", script, payload_path, result_path, xet_flag],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT,
-                        text=True,
-                    )
-
-                    import threading
-                    def log_output(pipe):
-                        try:
-                            for line in iter(pipe.readline, ""):
-                                # Only print real errors if the subprocess output starts with Traceback or error
-                                val = line.strip()
-                                if val and ("Traceback" in val or "Error:" in val or "Exception" in val):
-                                    print(f"[DEBUG] Subprocess Error: {val}")
-                        except Exception:
-                            pass
-
-                    log_thread = threading.Thread(target=log_output, args=(proc.stdout,), daemon=True)
-                    log_thread.start()
-
-                    while True:
-                        if proc.poll() is not None:
-                            break
-                        if cancel_check and cancel_check():
-                            proc.terminate()
-                            try:
-                                proc.wait(timeout=2)
-                            except subprocess.TimeoutExpired:
-                                proc.kill()
-                                proc.wait(timeout=5)
-                            raise InterruptedError("Download cancelled")
-                        time.sleep(0.1)
-
-                    result = {}
-                    if os.path.exists(result_path):
-                        try:
-                            with open(result_path, "r", encoding="utf-8") as f:
-                                result = json.load(f)
-                        except Exception:
-                            result = {}
-
-                    if result.get("ok"):
-                        return str(result.get("path") or "")
-
-                    last_error = result.get("error") or "Unknown subprocess error"
-                finally:
-                    _safe_remove(payload_path)
-                    _safe_remove(result_path)
-
-            raise RuntimeError(last_error)
-
-        download_start = time.time()
-        file_path_in_cache = run_file_download_with_cancel({
-            "repo_id": parsed_data["repo"],
-            "filename": remote_filename,
-            "revision": parsed_data.get("revision"),
-            "token": token or None,
-        })
-        if not file_path_in_cache:
-            raise RuntimeError("hf_hub_download did not return a cache path.")
+        def attempt_route(route: dict) -> Tuple[str, str]:
+            nonlocal stage_dir
+            if route["route"] == "direct":
+                return _download_hf_file_direct(
+                    parsed_data["repo"],
+                    remote_filename,
+                    parsed_data.get("revision"),
+                    None if route.get("anonymous") else token,
+                    target_dir,
+                    target_name,
+                    progress_cb=progress_cb,
+                    cancel_check=cancel_check,
+                )
+            # local_dir keeps huggingface_hub off the shared cache; the staging folder sits
+            # next to the destination so finalizing is a rename, and is stable across
+            # attempts so huggingface_hub can resume its own *.incomplete file.
+            # Runs on pooled worker processes (see hub_worker) that keep huggingface_hub imported.
+            stage_dir = os.path.join(target_dir, f".{target_name}{HF_STAGE_DIR_SUFFIX}")
+            os.makedirs(stage_dir, exist_ok=True)
+            progress = TransferProgress(expected_size, progress_cb)
+            result = run_hub_job(
+                "file",
+                {
+                    "repo_id": parsed_data["repo"],
+                    "filename": remote_filename,
+                    "revision": parsed_data.get("revision"),
+                    "token": token or None,
+                    "local_dir": stage_dir,
+                },
+                route["xet"],
+                cancel_check=cancel_check,
+                on_message=_hub_progress_handler(progress),
+                start_stage=route.get("stage") or 1,
+            )
+            if not result.get("ok"):
+                raise RuntimeError(result.get("error") or "Unknown worker error")
+            progress.maybe_emit(force=True)
+            route["stage"] = int(result.get("stage") or 1)
+            route["anonymous"] = route["stage"] in (2, 4)
+            return str(result.get("path") or ""), ""
+
+        phase_timings = {}
+        phase_start = time.time()
+        staged_path = ""
+        # SHA256 of the downloaded bytes when it could be computed on the write path;
+        # empty when huggingface_hub produced the file and it has to be re-read to verify.
+        content_sha = ""
+        source = UPSTREAM_SOURCE
+        # Peers and HF-compatible mirrors first; only an LFS file (known SHA256) can be checked.
+        mirrored = _fetch_from_mirrors(
+            hub_file_candidates(parsed_data["repo"], remote_filename, parsed_data.get("revision"), expected_sha),
+            target_dir,
+            target_name,
+            expected_size,
+            expected_sha,
+            progress_cb=progress_cb,
+            cancel_check=cancel_check,
+        )
+        if mirrored:
+            staged_path, content_sha, source = mirrored
+            plan, cached_route, attempts_avoided = [], None, 0
+        else:
+            plan, cached_route, attempts_avoided = _plan_hf_download_routes(parsed_data["repo"], token)
+        tried = set()
+        last_error = None
+        for route in plan:
+            route_key = _route_key(route)
+            if route_key in tried:
+                continue
+            if route["route"] == "direct" and route.get("anonymous") and route is not cached_route:
+                # Anonymous retry only makes sense after the token itself was refused.
+                if getattr(last_error, "code", None) not in (401, 403):
+                    continue
+            tried.add(route_key)
+            try:
+                staged_path, content_sha = attempt_route(route)
+            except InterruptedError:
+                raise
+            except Exception as e:
+                last_error = e
+                print(f"[DEBUG] Download route {route_key} failed: {e}")
+                continue
+            if route is cached_route:
+                note_attempts_avoided(attempts_avoided)
+            elif cached_route is not None:
+                # The cached route failed (a missing file fails every route, so only
+                # drop it once another route actually worked).
+                forget_access_strategy(parsed_data["repo"])
+            record_access_strategy(parsed_data["repo"], **route)
+            break
+        if not staged_path and last_error is not None:
+            raise last_error
+        if not staged_path:
+            raise RuntimeError("hf_hub_download did not return a file path.")
+        phase_timings["download"] = time.time() - phase_start
         if cancel_check and cancel_check():
             raise InterruptedError("Download cancelled")
 
-        if status_cb:
-            status_cb("copying")
-        copy_tmp_fd, copy_tmp_path = tempfile.mkstemp(
-            prefix=f".{target_name}.",
-            suffix=".tmp_copy",
-            dir=target_dir,
+        phase_start = time.time()
+        # Same-volume staging renames; a stage 3/4 fallback on another volume is
+        # cloned or copied in-kernel where the filesystem allows it.
+        copy_hasher = hashlib.sha256() if expected_sha and not content_sha else None
+        finalize_strategy = finalize_file(
+            staged_path,
+            dest_path,
+            move=True,
+            cancel_check=cancel_check,
+            before_copy=(lambda: status_cb("copying")) if status_cb else None,
+            hasher=copy_hasher,
         )
-        os.close(copy_tmp_fd)
-        with open(file_path_in_cache, "rb") as src, open(copy_tmp_path, "wb") as dst:
-            while True:
-                if cancel_check and cancel_check():
-                    raise InterruptedError("Download cancelled")
-                chunk = src.read(8 * 1024 * 1024)
-                if not chunk:
-                    break
-                dst.write(chunk)
-        os.replace(copy_tmp_path, dest_path)
-        copy_tmp_path = ""
+        if copy_hasher is not None and finalize_strategy == STRATEGY_BUFFERED:
+            content_sha = copy_hasher.hexdigest()
+        print(f"[DEBUG] Finalized {target_name} via {finalize_strategy}")
+        phase_timings["copy"] = time.time() - phase_start
         if cancel_check and cancel_check():
             raise InterruptedError("Download cancelled")
-        print("[DEBUG] File copied to:", dest_path)
+        print("[DEBUG] File finalized at:", dest_path)
 
         if not defer_verify:
             try:
@@ -650,40 +886,63 @@ def run_download(parsed_data: dict,
                     status_cb("verifying")
                 if cancel_check and cancel_check():
                     raise InterruptedError("Download cancelled")
-                _verify_file_integrity(dest_path, expected_size, expected_sha)
+                phase_start = time.time()
+                _verify_file_integrity(dest_path, expected_size, expected_sha, content_sha)
+                phase_timings["verify"] = time.time() - phase_start
             except InterruptedError:
                 raise
             except Exception as e:
                 _safe_remove(dest_path)
                 raise RuntimeError(f"Download verification failed: {e}") from e
 
-        if status_cb:
-            status_cb("cleaning_cache")
-        if cancel_check and cancel_check():
-            raise InterruptedError("Download cancelled")
-        clear_cache_for_path(file_path_in_cache)
+        phase_start = time.time()
+        if stage_dir:
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            stage_dir = ""
+        phase_timings["cleanup"] = time.time() - phase_start
+        print(
+            "[DEBUG] Phase timings for " + target_name + ": "
+            + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in phase_timings.items())
+        )
 
-        size_gb = os.path.getsize(dest_path) / (1024 ** 3)
+        final_size = os.path.getsize(dest_path)
+        note_bytes(source, final_size)
+        size_gb = final_size / (1024 ** 3)
         source_name = os.path.basename(remote_filename)
         if target_name != source_name:
             final_message = f"Downloaded {target_name} (from {source_name}) | {size_gb:.3f} GB"
         else:
             final_message = f"Downloaded {target_name} | {size_gb:.3f} GB"
+        if source != UPSTREAM_SOURCE:
+            final_message += f" via {source}"
         print("[DEBUG]", final_message)
         if return_info:
-            return (final_message, dest_path, {"expected_size": expected_size, "expected_sha": expected_sha})
+            return (
+                final_message,
+                dest_path,
+                {
+                    "expected_size": expected_size,
+                    "expected_sha": expected_sha,
+                    "actual_sha": content_sha,
+                    "phase_timings": phase_timings,
+                    "source": source,
+                },
+            )
         return (final_message, dest_path) if sync else ("", "")
     except InterruptedError:
-        if copy_tmp_path:
-            _safe_remove(copy_tmp_path)
+        if stage_dir:
+            shutil.rmtree(stage_dir, ignore_errors=True)
         if dest_path and os.path.exists(dest_path):
             _safe_remove(dest_path)
-        clear_cache_for_repo(parsed_data.get("repo", ""))
         cancel_msg = "Download cancelled"
         print("[DEBUG]", cancel_msg)
         if return_info:
             return (cancel_msg, "", {"expected_size": expected_size, "expected_sha": expected_sha})
         return (cancel_msg, "") if sync else ("", "")
+    except InsufficientDiskSpaceError as e:
+        # Raised before anything was written; the queue decides whether to hold or fail the job.
+        print("[DEBUG]", e)
+        raise
     except Exception as e:
         raw_error = str(e)
         print(f"[DEBUG] Download exception (raw): {raw_error}")
@@ -706,6 +965,11 @@ def run_download(parsed_data: dict,
         print("[DEBUG]", error_msg)
         # Raise so ComfyUI shows the standard error dialog, not just console output
         raise RuntimeError(error_msg)
+    finally:
+        if reservation is not None:
+            reservation.release()
+        if lease is not None:
+            lease.release()
 
 
 def run_download_url(url: str,
@@ -719,7 +983,11 @@ def run_download_url(url: str,
                      max_retries: int = 3) -> tuple:
     """
     Download a single file from a direct HTTP(S) URL into models/<final_folder>.
-    Uses streamed writes with retry/backoff, supports cancellation, and writes atomically.
+    Large files from servers that honour Range requests are fetched over several
+    parallel connections (see download_engine); otherwise the file is streamed over
+    one connection. Retries with backoff, supports cancellation, and writes atomically.
+    Partial bytes survive failures (with a sidecar next to the .part file) so later
+    attempts resume with `Range` + `If-Range`; only cancellation discards them.
     """
     raw_url = str(url or "").strip()
     parsed_url = urllib.parse.urlparse(raw_url)
@@ -746,33 +1014,43 @@ def run_download_url(url: str,
 
         temp_path = ""
         dest_path = ""
+        partial = None
+        reservation = None
+        lease = None
         try:
             if status_cb:
                 status_cb("downloading")
 
-            request = urllib.request.Request(raw_url, headers=request_headers, method="GET")
-            with urllib.request.urlopen(request, timeout=60) as response:
-                final_url = str(getattr(response, "geturl", lambda: raw_url)() or raw_url)
-                headers = getattr(response, "headers", {})
-                content_disposition = ""
-                content_length = None
-                if headers:
-                    try:
-                        content_disposition = headers.get("Content-Disposition", "")
-                        content_length = _parse_content_length(headers.get("Content-Length"))
-                    except Exception:
-                        content_disposition = ""
-                        content_length = None
-
-                resolved_name = (
-                    explicit_target
-                    or _filename_from_content_disposition(content_disposition)
-                    or _filename_from_url_path(final_url)
-                    or _filename_from_url_path(raw_url)
-                    or "download.bin"
-                )
-                target_name = _sanitize_download_filename(resolved_name) or "download.bin"
-                dest_path = os.path.join(target_dir, target_name)
+            response, probe = probe_url(raw_url, request_headers)
+            final_url = str(probe.get("final_url") or raw_url)
+            resolved_name = (
+                explicit_target
+                or _filename_from_content_disposition(probe.get("content_disposition") or "")
+                or _filename_from_url_path(final_url)
+                or _filename_from_url_path(raw_url)
+                or "download.bin"
+            )
+            target_name = _sanitize_download_filename(resolved_name) or "download.bin"
+            claimed_path = os.path.join(target_dir, target_name)
+            lease, finished_by = claim_download(
+                claimed_path,
+                target_name,
+                on_progress=_follower_progress(progress_cb),
+                cancel_check=cancel_check,
+                # Don't hold the connection open while another process downloads the file.
+                on_wait=response.close,
+            )
+            if finished_by is not None:
+                message = _finished_elsewhere_message(target_name, claimed_path, finished_by)
+                return (message, claimed_path) if sync else ("", "")
+            if response.closed:
+                # The other process gave up; download it here with a fresh request.
+                response, probe = probe_url(raw_url, request_headers)
+            dest_path = claimed_path
+            publish_progress = _publish_to_lease(lease, progress_cb)
+            publish_status = _publish_phase_to_lease(lease, status_cb)
+            with response:
+                content_length = probe.get("total_bytes")
 
                 if os.path.exists(dest_path):
                     if os.path.getsize(dest_path) == 0:
@@ -788,74 +1066,82 @@ def run_download_url(url: str,
                         print("[DEBUG]", message)
                         return (message, dest_path) if sync else ("", "")
 
-                temp_fd, temp_path = tempfile.mkstemp(
-                    prefix=f".{target_name}.",
-                    suffix=".part",
-                    dir=target_dir,
+                part_path = partial_path_for(target_dir, target_name)
+                mirror_part_path = partial_path_for(target_dir, f"{target_name}{MIRROR_PART_SUFFIX}")
+                reservation = reserve_disk_space(
+                    dest_path, content_length, watch=[dest_path, part_path, mirror_part_path]
                 )
-                os.close(temp_fd)
-                _safe_remove(temp_path)
-
-                downloaded_bytes = 0
-                last_bytes = 0
-                last_time = time.time()
-                last_progress_emit = 0.0
-                ema_speed = None
-                chunk_size = 8 * 1024 * 1024
-
-                with open(temp_path, "wb") as out:
-                    while True:
-                        if cancel_check and cancel_check():
-                            raise InterruptedError("Download cancelled")
-                        chunk = response.read(chunk_size)
-                        if not chunk:
-                            break
-                        out.write(chunk)
-                        downloaded_bytes += len(chunk)
-
-                        now = time.time()
-                        dt = now - last_time
-                        if dt > 0:
-                            inst_speed = (downloaded_bytes - last_bytes) / dt
-                            ema_speed = inst_speed if ema_speed is None else (0.2 * inst_speed + 0.8 * ema_speed)
-                            last_time = now
-                            last_bytes = downloaded_bytes
-
-                        should_emit = False
-                        if now - last_progress_emit >= 0.25:
-                            should_emit = True
-                        if content_length is not None and downloaded_bytes >= content_length:
-                            should_emit = True
-                        if should_emit and progress_cb:
-                            eta_seconds = None
-                            if content_length and ema_speed and ema_speed > 0:
-                                eta_seconds = max(0, (content_length - downloaded_bytes) / ema_speed)
-                            progress_cb({
-                                "downloaded_bytes": downloaded_bytes,
-                                "total_bytes": content_length,
-                                "speed_bps": ema_speed or 0,
-                                "eta_seconds": eta_seconds,
-                                "phase": "downloading",
-                            })
-                            last_progress_emit = now
+                source = UPSTREAM_SOURCE
+                # A peer's copy of this URL must match the host's size and the SHA256 this
+                # instance recorded for the URL (or, with MIRROR_TOKEN, the peer's own digest).
+                known_sha = sha_for_source(raw_url)
+                candidates = url_candidates(raw_url, known_sha) if content_length is not None else []
+                mirrored = None
+                if candidates:
+                    response.close()
+                    mirrored = _fetch_from_mirrors(
+                        candidates,
+                        target_dir,
+                        target_name,
+                        content_length,
+                        known_sha,
+                        progress_cb=publish_progress,
+                        cancel_check=cancel_check,
+                    )
+                if mirrored:
+                    temp_path, content_sha, source = mirrored
+                else:
+                    if response.closed:
+                        response, probe = probe_url(raw_url, request_headers)
+                    partial = PartialDownload.open(part_path, raw_url, probe)
+                    temp_path = partial.part_path
+
+                    progress = TransferProgress(content_length, publish_progress)
+                    downloaded_bytes = download_to_file(
+                        raw_url,
+                        partial,
+                        request_headers,
+                        response,
+                        probe,
+                        progress,
+                        cancel_check=cancel_check,
+                    )
+                    progress.maybe_emit(force=True)
 
-                if cancel_check and cancel_check():
-                    raise InterruptedError("Download cancelled")
+                    if cancel_check and cancel_check():
+                        raise InterruptedError("Download cancelled")
 
-                if content_length is not None and downloaded_bytes != content_length:
-                    raise RuntimeError(
-                        f"Incomplete download (expected {content_length} bytes, got {downloaded_bytes} bytes)"
-                    )
+                    if content_length is not None and downloaded_bytes != content_length:
+                        raise RuntimeError(
+                            f"Incomplete download (expected {content_length} bytes, got {downloaded_bytes} bytes)"
+                        )
 
-                if status_cb:
-                    status_cb("finalizing")
+                    content_sha = partial.sha256(downloaded_bytes)
+                    print(f"[DEBUG] SHA256 {target_name}: {content_sha}")
+
+                # Direct URLs publish no SHA256; the header layout is the best check available.
+                problem = structural_problem(temp_path, target_name)
+                if problem:
+                    if partial:
+                        partial.discard()
+                    else:
+                        _safe_remove(temp_path)
+                    temp_path = ""
+                    raise RuntimeError(f"Corrupt {target_name}: {problem}")
+
+                if publish_status:
+                    publish_status("finalizing")
                 os.replace(temp_path, dest_path)
+                if partial:
+                    partial.finish()
                 temp_path = ""
+                record_file(dest_path, content_sha, source=raw_url)
 
                 final_size = os.path.getsize(dest_path)
+                note_bytes(source, final_size)
                 size_gb = final_size / (1024 ** 3)
-                if progress_cb:
-                    progress_cb({
+                if publish_progress:
+                    publish_progress({
                         "downloaded_bytes": final_size,
                         "total_bytes": content_length if content_length is not None else final_size,
                         "speed_bps": 0,
@@ -864,21 +1150,27 @@ def run_download_url(url: str,
                     })
 
                 final_message = f"Downloaded {target_name} | {size_gb:.3f} GB"
+                if source != UPSTREAM_SOURCE:
+                    final_message += f" via {source}"
                 print("[DEBUG]", final_message)
                 return (final_message, dest_path) if sync else ("", "")
         except InterruptedError:
-            if temp_path:
-                _safe_remove(temp_path)
+            if partial and temp_path:
+                partial.discard()
             if status_cb:
                 status_cb("cancelling")
             cancel_msg = "Download cancelled"
             print("[DEBUG]", cancel_msg)
             return (cancel_msg, "") if sync else ("", "")
+        except InsufficientDiskSpaceError as e:
+            print("[DEBUG]", e)
+            raise
         except Exception as e:
-            if temp_path:
-                _safe_remove(temp_path)
+            # Keep validated bytes so the next attempt (or a restart) resumes instead of starting over.
+            if partial and temp_path:
+                partial.keep_or_discard()
             last_error = e
-            if attempt >= retry_count or not _is_retryable_url_error(e):
+            if attempt >= retry_count or not is_retryable_url_error(e):
                 break
             backoff_seconds = min(8.0, float(2 ** attempt))
             print(
@@ -886,19 +1178,467 @@ def run_download_url(url: str,
                 f"after {backoff_seconds:.1f}s: {e}"
             )
             time.sleep(backoff_seconds)
+        finally:
+            if reservation is not None:
+                reservation.release()
+            if lease is not None:
+                lease.release()
 
     raise RuntimeError(f"Download failed: {last_error}")
 
 
+class _FolderProgress:
+    """
+    Sums the per-file progress of a folder download into one TransferProgress, so
+    the folder reports the same fields as a single file, plus the files in flight.
+    """
+
+    def __init__(self, manifest: list,
+                 progress_cb: Optional[Callable[[dict], None]] = None,
+                 status_cb: Optional[Callable[[str], None]] = None,
+                 plan: Optional[dict] = None,
+                 report_children: bool = False):
+        sizes = [entry.get("size") for entry in manifest]
+        total = sum(sizes) if all(isinstance(size, int) for size in sizes) else None
+        self.plan = plan
+        # Every file with its state, for small sets (shards) shown as one job with child rows.
+        self._children = {entry["path"]: entry.get("size") for entry in manifest} if report_children else None
+        self._sizes = {entry["path"]: int(entry.get("size") or 0) for entry in manifest}
+        self._done = set()
+        # path -> bytes hashed so far, for local copies being compared before the transfer
+        self._checking = {}
+        self.file_count = len(manifest)
+        self.files_done = 0
+        self.done_bytes = 0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._progress_cb = progress_cb
+        self._status_cb = status_cb
+        self.aggregate = TransferProgress(total, self._emit if progress_cb else None)
+
+    def _emit(self, payload: dict):
+        with self._lock:
+            files = [dict(state, path=path) for path, state in self._active.items()]
+            files_done = self.files_done
+            children = None
+            if self._children is not None:
+                children = []
+                for path, size in self._children.items():
+                    state = self._active.get(path)
+                    if path in self._done:
+                        children.append({"path": path, "status": "done", "downloaded_bytes": size, "total_bytes": size})
+                    elif path in self._checking:
+                        children.append({"path": path, "status": "verifying",
+                                         "downloaded_bytes": self._checking[path], "total_bytes": size})
+                    elif state:
+                        children.append(dict(state, path=path, status="downloading"))
+                    else:
+                        children.append({"path": path, "status": "queued", "downloaded_bytes": 0, "total_bytes": size})
+        payload = dict(payload, files=files, files_done=files_done, file_count=self.file_count)
+        if self.plan is not None:
+            payload["plan"] = self.plan
+        if children is not None:
+            payload["children"] = children
+        self._progress_cb(payload)
+
+    def _update_locked(self) -> int:
+        return self.done_bytes + sum(state["downloaded_bytes"] for state in self._active.values())
+
+    def file_callback(self, path: str) -> Callable[[dict], None]:
+        def on_progress(payload: dict):
+            with self._lock:
+                self._active[path] = {
+                    "downloaded_bytes": int(payload.get("downloaded_bytes") or 0),
+                    "total_bytes": payload.get("total_bytes"),
+                    "speed_bps": payload.get("speed_bps") or 0,
+                    "eta_seconds": payload.get("eta_seconds"),
+                }
+                current = self._update_locked()
+            self.aggregate.update_to(current)
+            self.aggregate.maybe_emit()
+        return on_progress
+
+    def file_checking(self, path: str, checked_bytes: int):
+        """Report how far the local copy of path has been hashed."""
+        with self._lock:
+            self._checking[path] = checked_bytes
+        self.aggregate.maybe_emit()
+
+    def file_checked(self, path: str, present: bool):
+        """
+        Settle a file before the transfer: present files count as done from the
+        start, so totals and child rows cover the whole set.
+        """
+        with self._lock:
+            self._checking.pop(path, None)
+            if present:
+                self._done.add(path)
+                self.done_bytes += self._sizes.get(path, 0)
+                self.files_done += 1
+            current = self._update_locked()
+        # Not transferred bytes; move the baseline so they don't count as speed.
+        self.aggregate.reset(current)
+
+    def file_done(self, path: str, size: int):
+        with self._lock:
+            self._active.pop(path, None)
+            self._done.add(path)
+            self.done_bytes += size
+            self.files_done += 1
+            current = self._update_locked()
+            files_done = self.files_done
+        self.aggregate.update_to(current)
+        self.aggregate.maybe_emit(force=True)
+        if self._status_cb:
+            self._status_cb(f"Downloaded {files_done}/{self.file_count} files")
+
+
+def _folder_manifest(repo_id: str,
+                     revision: Optional[str],
+                     token: Optional[str],
+                     remote_subfolder_path: str = "") -> list:
+    """
+    Every file under remote_subfolder_path (the whole repo when empty) as
+    {path, relative, size, sha256, etag}.
+    """
+    repo_files = get_repo_files_metadata(repo_id, revision=revision, token=token or None)
+    prefix = remote_subfolder_path.strip("/") + "/" if remote_subfolder_path else ""
+    manifest = []
+    for path, entry in repo_files.items():
+        path = str(path)
+        if not path.startswith(prefix):
+            continue
+        entry = entry or {}
+        manifest.append({
+            "path": path,
+            "relative": path[len(prefix):],
+            "size": entry.get("size"),
+            "sha256": entry.get("sha256"),
+            "etag": entry.get("etag"),
+        })
+    manifest.sort(key=lambda item: item["path"])
+    return manifest
+
+
+def _git_blob_sha1(path: str, size: int) -> str:
+    digest = hashlib.sha1(f"blob {size}\0".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _local_sha256(path: str,
+                  cancel_check: Optional[Callable[[], bool]] = None,
+                  on_bytes: Optional[Callable[[int], None]] = None) -> Optional[str]:
+    """
+    SHA256 of a local file at full disk speed (content_index.hash_file is throttled
+    for background indexing), recorded in the content index. on_bytes gets the size
+    of each chunk read. None if the file changed while it was read.
+    """
+    before = os.stat(path)
+    sha256 = hashlib.sha256()
+    with open(path, "rb", buffering=0) as f:
+        reader = ChunkReader(f)
+        for chunk in iter(reader.read, b""):
+            if cancel_check and cancel_check():
+                raise InterruptedError("Verification cancelled")
+            sha256.update(chunk)
+            if on_bytes:
+                on_bytes(len(chunk))
+    after = os.stat(path)
+    if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+        return None
+    actual_sha = sha256.hexdigest()
+    record_file(path, actual_sha)
+    return actual_sha
+
+
+def _needs_local_hash(path: str, entry: dict) -> bool:
+    """True when _local_copy_matches would have to read the whole file."""
+    if not entry.get("sha256"):
+        return False
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if isinstance(entry.get("size"), int) and size != entry["size"]:
+        return False
+    if SHA_VERIFY_MAX_BYTES is not None and size > SHA_VERIFY_MAX_BYTES:
+        return False
+    return cached_sha256(path) is None
+
+
+def _local_copy_matches(path: str,
+                        entry: dict,
+                        cancel_check: Optional[Callable[[], bool]] = None,
+                        on_bytes: Optional[Callable[[int], None]] = None) -> Optional[bool]:
+    """
+    Whether the local file at path holds the manifest entry's content. The size
+    must match; an LFS file's SHA256 comes from the content index, or is hashed
+    (see _local_sha256) when the file isn't indexed yet; a small non-LFS file must
+    hash to its git blob id. None when the size matches but an unindexed LFS file
+    is above HF_DOWNLOADER_SHA_MAX_BYTES, so its content was not checked.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if isinstance(entry.get("size"), int) and size != entry["size"]:
+        return False
+    if entry.get("sha256"):
+        actual_sha = cached_sha256(path)
+        if actual_sha is None:
+            if SHA_VERIFY_MAX_BYTES is not None and size > SHA_VERIFY_MAX_BYTES:
+                return None
+            # A retrained checkpoint keeps its byte size, so size alone proves nothing.
+            actual_sha = _local_sha256(path, cancel_check, on_bytes)
+            if actual_sha is None:
+                return False
+        return actual_sha == str(entry["sha256"]).lower()
+    etag = str(entry.get("etag") or "").lower()
+    if etag and size <= GIT_BLOB_CHECK_MAX_BYTES:
+        try:
+            return _git_blob_sha1(path, size) == etag
+        except OSError:
+            return False
+    return True
+
+
+def _plan_folder_sync(manifest: list,
+                      dest_path: str,
+                      prune: bool = False,
+                      cancel_check: Optional[Callable[[], bool]] = None,
+                      progress_cb: Optional[Callable[[dict], None]] = None) -> Tuple[list, list, dict]:
+    """
+    Diff the manifest against an existing folder. Returns (entries to fetch, local
+    paths to prune, plan), where plan holds the file and byte counts of each part.
+    Unverified files (see _local_copy_matches) are kept, and counted apart.
+    Local LFS files not in the content index are hashed; progress_cb gets the bytes
+    hashed so far against the total to hash, with phase "verifying".
+    """
+    local_paths = [os.path.join(dest_path, *entry["relative"].split("/")) for entry in manifest]
+    hash_bytes = sum(
+        int(entry.get("size") or 0)
+        for entry, local_path in zip(manifest, local_paths)
+        if _needs_local_hash(local_path, entry)
+    )
+    on_bytes = None
+    if hash_bytes and progress_cb:
+        hashing = TransferProgress(hash_bytes, progress_cb)
+
+        def on_bytes(count: int):
+            hashing.add(count)
+            hashing.maybe_emit(phase="verifying")
+
+    fetch = []
+    plan = {
+        "files": len(manifest),
+        "missing_files": 0,
+        "changed_files": 0,
+        "fetch_bytes": 0,
+        "unchanged_files": 0,
+        "unchanged_bytes": 0,
+        "unverified_files": 0,
+        "unverified_bytes": 0,
+        "prune_files": 0,
+        "prune_bytes": 0,
+    }
+    wanted = set()
+    for entry, local_path in zip(manifest, local_paths):
+        relative = entry["relative"]
+        wanted.add(os.path.normcase(os.path.normpath(relative)))
+        matches = _local_copy_matches(local_path, entry, cancel_check, on_bytes)
+        if matches is None:
+            print(f"[DEBUG] Sync: {relative} has the right size but is too large to hash, keeping it unverified")
+            plan["unverified_files"] += 1
+            plan["unverified_bytes"] += int(entry.get("size") or 0)
+            continue
+        if matches:
+            plan["unchanged_files"] += 1
+            plan["unchanged_bytes"] += int(entry.get("size") or 0)
+            continue
+        plan["changed_files" if os.path.exists(local_path) else "missing_files"] += 1
+        plan["fetch_bytes"] += int(entry.get("size") or 0)
+        fetch.append(entry)
+
+    extra = []
+    if prune:
+        for dirpath, _, filenames in os.walk(dest_path):
+            for fname in filenames:
+                local_path = os.path.join(dirpath, fname)
+                relative = os.path.normcase(os.path.relpath(local_path, dest_path))
+                if relative in wanted:
+                    continue
+                extra.append(local_path)
+                try:
+                    plan["prune_bytes"] += os.path.getsize(local_path)
+                except OSError:
+                    pass
+        plan["prune_files"] = len(extra)
+    return fetch, extra, plan
+
+
+def _sweep_staging_leftovers(stage_dir: str):
+    """Drop the .part files and huggingface_hub staging folders earlier attempts left in a folder's staging tree."""
+    leftover_suffixes = (".part", ".part" + PARTIAL_SIDECAR_SUFFIX)
+    for dirpath, dirnames, filenames in os.walk(stage_dir):
+        for dname in list(dirnames):
+            if dname.startswith(".") and dname.endswith(HF_STAGE_DIR_SUFFIX):
+                dirnames.remove(dname)
+                shutil.rmtree(os.path.join(dirpath, dname), ignore_errors=True)
+        for fname in filenames:
+            if fname.startswith(".") and fname.endswith(leftover_suffixes):
+                _safe_remove(os.path.join(dirpath, fname))
+
+
+def _fetch_manifest(parsed_data: dict,
+                    manifest: list,
+                    stage_dir: str,
+                    progress: _FolderProgress,
+                    cancel_check: Optional[Callable[[], bool]] = None) -> list:
+    """
+    Download the manifest's files into stage_dir (at their relative paths),
+    FOLDER_WORKERS at a time and largest first, each through run_download.
+    Returns [(remote path, error)] for the files that failed; after the first
+    failure the files in flight finish (and stay staged for a retry) but no new
+    ones start. A cancelled file fails with InterruptedError.
+    """
+    # Largest last, so workers pop the big files first.
+    pending = sorted(manifest, key=lambda item: item.get("size") or 0)
+    pending_lock = threading.Lock()
+    errors = []
+
+    def fetch(entry: dict):
+        remote_dir, _, file_name = entry["path"].rpartition("/")
+        relative_dir = entry["relative"].rpartition("/")[0]
+        target_dir = os.path.join(stage_dir, *relative_dir.split("/")) if relative_dir else stage_dir
+        staged_path = os.path.join(target_dir, file_name)
+        if os.path.exists(staged_path) and _local_copy_matches(staged_path, entry, cancel_check) is False:
+            # Left by an earlier attempt at a revision that has changed since.
+            _safe_remove(staged_path)
+        message, path, _ = run_download(
+            {
+                "repo": parsed_data["repo"],
+                "file": file_name,
+                "subfolder": remote_dir,
+                "revision": parsed_data.get("revision"),
+            },
+            target_dir,
+            sync=True,
+            return_info=True,
+            cancel_check=cancel_check,
+            progress_cb=progress.file_callback(entry["path"]),
+            reserve_space=False,
+        )
+        if not path:
+            raise InterruptedError(message or "Download cancelled")
+        progress.file_done(entry["path"], os.path.getsize(path))
+
+    def worker():
+        while not errors:
+            with pending_lock:
+                if not pending:
+                    return
+                entry = pending.pop()
+            try:
+                fetch(entry)
+            except Exception as e:
+                errors.append((entry["path"], e))
+                return
+
+    workers = [
+        threading.Thread(target=worker, name=f"hf-folder-{index}", daemon=True)
+        for index in range(min(FOLDER_WORKERS, len(pending)))
+    ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return errors
+
+
+def _manifest_failure_message(errors: list) -> str:
+    failed_path, error = errors[0]
+    reason = str(error)
+    if reason.startswith("Download failed: "):
+        reason = reason[len("Download failed: "):]
+    return f"Download failed: {failed_path}: {reason}"
+
+
+def _install_staged(entries: list, stage_dir: str, dest_dir: str):
+    """Move staged files into dest_dir in the given order, then drop the staging folder."""
+    for entry in entries:
+        parts = entry["relative"].split("/")
+        target_path = os.path.join(dest_dir, *parts)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.replace(os.path.join(stage_dir, *parts), target_path)
+    shutil.rmtree(stage_dir, ignore_errors=True)
+
+
+def _install_shard_set(shard_set: list, fetch: list, entry_points: list, stage_dir: str, target_dir: str):
+    """
+    Move a shard set's fetched files from stage_dir into target_dir. Loaders open a
+    set through its index or shard 1 (entry_points, relative names). When changed
+    shards replace existing ones, the existing entry points are moved aside into
+    the staging folder first. The other shards are then replaced, and shard 1 and
+    the index go in last: the new copies, or the old ones moved back. A loader
+    looking in between finds no entry point instead of a mix of old and new shards.
+    This is best effort, not an atomic swap of the set: a crash part-way leaves the
+    set without its entry points, and the next attempt fetches them again.
+    """
+    def target(relative: str) -> str:
+        return os.path.join(target_dir, *relative.split("/"))
+
+    fetched = {entry["relative"] for entry in fetch}
+    replacing = any(rel not in entry_points and os.path.exists(target(rel)) for rel in fetched)
+    aside_dir = os.path.join(stage_dir, SHARD_ASIDE_DIR)
+    moved = set()
+    if replacing:
+        for rel in entry_points:
+            if os.path.exists(target(rel)):
+                aside_path = os.path.join(aside_dir, *rel.split("/"))
+                os.makedirs(os.path.dirname(aside_path), exist_ok=True)
+                os.replace(target(rel), aside_path)
+                moved.add(rel)
+    for entry in fetch:
+        rel = entry["relative"]
+        if rel in entry_points:
+            continue
+        os.makedirs(os.path.dirname(target(rel)), exist_ok=True)
+        os.replace(os.path.join(stage_dir, *rel.split("/")), target(rel))
+    for entry in shard_set:
+        rel = entry["relative"]
+        if rel not in entry_points:
+            continue
+        if rel in fetched:
+            os.replace(os.path.join(stage_dir, *rel.split("/")), target(rel))
+        elif rel in moved:
+            os.replace(os.path.join(aside_dir, *rel.split("/")), target(rel))
+    shutil.rmtree(stage_dir, ignore_errors=True)
+
+
 def run_download_folder(parsed_data: dict,
                         final_folder: str,
                         remote_subfolder_path: str = "",
                         last_segment: str = "",
                         sync: bool = False,
                         status_cb: Optional[Callable[[str], None]] = None,
-                        cancel_check: Optional[Callable[[], bool]] = None) -> tuple[str, str]:
+                        cancel_check: Optional[Callable[[], bool]] = None,
+                        progress_cb: Optional[Callable[[dict], None]] = None,
+                        prune: bool = False) -> tuple[str, str]:
     """
-    Downloads a folder or subfolder from Hugging Face Hub using snapshot_download.
+    Downloads a folder or subfolder from Hugging Face Hub.
+    The file list (paths, sizes, SHA256) is read up front and the files are fetched
+    FOLDER_WORKERS at a time through run_download, so each one gets the direct
+    stream, mirrors, dedup and verification of a single-file download. They land in
+    a staging folder next to the destination, which is renamed into place once
+    every file is verified; a failed attempt keeps it, so a retry resumes.
+    An existing folder is synced instead: only missing or changed files are fetched
+    (see _plan_folder_sync) and moved in, and with prune=True local files the repo
+    doesn't have are removed afterwards.
+    progress_cb receives the summed byte counts plus the files in flight, and the
+    sync plan under "plan".
     The result is placed in:
     - models/<final_folder>/<repo_name> if downloading entire repo
     - models/<final_folder>/<last_segment> if downloading specific subfolder
@@ -923,198 +1663,289 @@ def run_download_folder(parsed_data: dict,
         # If it's a root link, use the repo name
         dest_path = os.path.join(base_dir, repo_name)
 
-    if os.path.exists(dest_path) and os.listdir(dest_path):
-        fz = folder_size(dest_path)
-        fg = fz / (1024 ** 3)
-        final_message = f"{os.path.basename(dest_path)} already exists | {fg:.3f} GB"
-        print("[DEBUG]", final_message)
-        return (final_message, dest_path) if sync else ("", "")
-
-    comfy_temp = os.path.join(os.getcwd(), "temp")
-    os.makedirs(comfy_temp, exist_ok=True)
-    temp_dir = tempfile.mkdtemp(prefix="hf_dl_", dir=comfy_temp)
-    print("[DEBUG] Temp folder =>", temp_dir)
-
-    file_count = None
+    existing = os.path.isdir(dest_path) and bool(os.listdir(dest_path))
+    label = os.path.basename(dest_path)
     try:
-        repo_files = list_repo_files(
-            parsed_data["repo"],
-            revision=parsed_data.get("revision"),
-            token=token or None
+        manifest = _folder_manifest(
+            parsed_data["repo"], parsed_data.get("revision"), token, remote_subfolder_path
         )
-        if remote_subfolder_path:
-            prefix = remote_subfolder_path.strip("/") + "/"
-            file_count = sum(1 for item in repo_files if str(item).startswith(prefix))
-        else:
-            file_count = len(repo_files)
     except Exception as e:
-        print(f"[DEBUG] Could not count repository files: {e}")
-
-    if status_cb:
-        if isinstance(file_count, int) and file_count >= 0:
-            status_cb(f"Fetching {file_count} files")
-        else:
-            status_cb("Fetching files")
-
-    allow_patterns = [f"{remote_subfolder_path}/**"] if remote_subfolder_path else None
-    kwargs = {
-        "repo_id": parsed_data["repo"],
-        "local_dir": temp_dir,
-        "token": token or None
-    }
-    if parsed_data.get("revision"):
-        kwargs["revision"] = parsed_data["revision"]
-    if allow_patterns:
-        kwargs["allow_patterns"] = allow_patterns
-
-    def run_snapshot_with_cancel(download_kwargs: dict) -> str:
-        payload_fd, payload_path = tempfile.mkstemp(prefix="hf_snapshot_payload_", suffix=".json", dir=comfy_temp)
-        result_fd, result_path = tempfile.mkstemp(prefix="hf_snapshot_result_", suffix=".json", dir=comfy_temp)
-        os.close(payload_fd)
-        os.close(result_fd)
-        script = (
-            "import json, sys, os\n"
-            "os.environ['HF_HUB_DISABLE_XET'] = '1'\n"
-            "os.environ['HF_HUB_ENABLE_HF_XET'] = '0'\n"
-            "# Block hf_xet entirely - env vars are ignored by newer versions\n"
-            "for _m in list(sys.modules):\n"
-            "    if 'xet' in _m:\n"
-            "        del sys.modules[_m]\n"
-            "import importlib\n"
-            "class _XetBlocker:\n"
-            "    def find_module(self, name, path=None):\n"
-            "        return self if 'xet' in name else None\n"
-            "    def load_module(self, name):\n"
-            "        raise ImportError(name)\n"
-            "sys.meta_path.insert(0, _XetBlocker())\n"
-            "from huggingface_hub import snapshot_download\n"
-            "payload_path = sys.argv[1]\n"
-            "result_path = sys.argv[2]\n"
-            "with open(payload_path, 'r', encoding='utf-8') as f:\n"
-            "    kwargs = json.load(f)\n"
-            "result = {}\n"
-            "try:\n"
-            "    path = snapshot_download(**kwargs)\n"
-            "    result = {'ok': True, 'path': path}\n"
-            "except Exception as e:\n"
-            "    result = {'ok': False, 'error': str(e)}\n"
-            "with open(result_path, 'w', encoding='utf-8') as f:\n"
-            "    json.dump(result, f)\n"
-            "sys.exit(0 if result.get('ok') else 1)\n"
-        )
+        if existing:
+            # Offline or the repo is gone; what is on disk is all there is.
+            print(f"[DEBUG] Could not list repository files, keeping {dest_path} as is: {e}")
+            final_message = f"{label} already exists | {folder_size(dest_path) / (1024 ** 3):.3f} GB"
+            print("[DEBUG]", final_message)
+            return (final_message, dest_path) if sync else ("", "")
+        err = f"Download failed: could not list repository files: {e}"
+        print("[DEBUG]", err)
+        return (err, "") if sync else ("", "")
+    if not manifest:
+        err = f"Download failed: no files under '{remote_subfolder_path or parsed_data['repo']}'"
+        print("[DEBUG]", err)
+        return (err, "") if sync else ("", "")
 
+    extra = []
+    plan = None
+    if existing:
+        if status_cb:
+            status_cb("Comparing with local files")
         try:
-            with open(payload_path, "w", encoding="utf-8") as f:
-                json.dump(download_kwargs, f)
-
-            proc = subprocess.Popen(
-                [sys.executable, "-u", "-c", script, payload_path, result_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
+            manifest, extra, plan = _plan_folder_sync(manifest, dest_path, prune, cancel_check, progress_cb)
+        except InterruptedError:
+            cancel_msg = "Folder download cancelled"
+            print("[DEBUG]", cancel_msg)
+            return (cancel_msg, "") if sync else ("", "")
+        print(f"[DEBUG] Folder sync plan for {dest_path}: {plan}")
+        unverified = f", {plan['unverified_files']} unverified" if plan["unverified_files"] else ""
+        if not manifest and not extra:
+            kept_bytes = plan["unchanged_bytes"] + plan["unverified_bytes"]
+            final_message = (
+                f"{label} is up to date | {plan['files']} files, {kept_bytes / (1024 ** 3):.3f} GB{unverified}"
+            )
+            print("[DEBUG]", final_message)
+            return (final_message, dest_path) if sync else ("", "")
+        if status_cb:
+            status_cb(
+                f"Sync: fetching {len(manifest)} of {plan['files']} files "
+                f"({plan['fetch_bytes'] / (1024 ** 3):.3f} GB), {plan['unchanged_files']} unchanged{unverified}"
+                + (f", removing {len(extra)}" if extra else "")
             )
 
-            import threading
-            def log_output(pipe):
-                try:
-                    for line in iter(pipe.readline, ""):
-                        val = line.strip()
-                        if val:
-                            print(f"[DEBUG] Subprocess: {val}")
-                except Exception:
-                    pass
-
-            log_thread = threading.Thread(target=log_output, args=(proc.stdout,), daemon=True)
-            log_thread.start()
-
-            while True:
-                if proc.poll() is not None:
-                    break
-                if cancel_check and cancel_check():
-                    proc.terminate()
-                    try:
-                        proc.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        proc.kill()
-                        proc.wait(timeout=5)
-                    raise InterruptedError("Folder download cancelled")
-                time.sleep(0.1)
-
-            result = {}
-            if os.path.exists(result_path):
-                try:
-                    with open(result_path, "r", encoding="utf-8") as f:
-                        result = json.load(f)
-                except Exception:
-                    result = {}
-
-            if result.get("ok"):
-                return str(result.get("path") or temp_dir)
+    # Same volume as the destination, so finalizing is one rename; stable across
+    # attempts so finished files and .part files are picked up again.
+    stage_dir = os.path.join(base_dir, f".{label}{HF_STAGE_DIR_SUFFIX}")
+    os.makedirs(stage_dir, exist_ok=True)
+    progress = _FolderProgress(manifest, progress_cb, status_cb, plan)
+    reservation = reserve_disk_space(dest_path, progress.aggregate.total_bytes, watch=[stage_dir], label=label)
+    print(f"[DEBUG] Folder manifest: {len(manifest)} files, {progress.aggregate.total_bytes} bytes, staging in {stage_dir}")
 
-            error = result.get("error") or "snapshot_download failed."
-            raise RuntimeError(error)
-        finally:
-            _safe_remove(payload_path)
-            _safe_remove(result_path)
+    if status_cb and not existing:
+        status_cb(f"Fetching {len(manifest)} files")
 
     start_time = time.time()
-    stage_dir = tempfile.mkdtemp(prefix="hf_stage_", dir=base_dir)
-    downloaded_folder = ""
     try:
-        if status_cb:
-            status_cb("Downloading files")
-        downloaded_folder = run_snapshot_with_cancel(kwargs)
-        print("[DEBUG] snapshot_download =>", downloaded_folder)
-
-        source_folder = traverse_subfolders(downloaded_folder, remote_subfolder_path.split("/")) \
-            if remote_subfolder_path else downloaded_folder
-        if not os.path.isdir(source_folder):
-            raise RuntimeError("Downloaded folder path not found.")
+        errors = _fetch_manifest(parsed_data, manifest, stage_dir, progress, cancel_check)
+        if (cancel_check and cancel_check()) or any(isinstance(e, InterruptedError) for _, e in errors):
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            cancel_msg = "Folder download cancelled"
+            print("[DEBUG]", cancel_msg)
+            return (cancel_msg, "") if sync else ("", "")
+        if errors:
+            err = _manifest_failure_message(errors)
+            print("[DEBUG]", err)
+            return (err, "") if sync else ("", "")
 
         if status_cb:
-            status_cb("Copying files")
-        for item in os.listdir(source_folder):
-            if item == ".cache":
-                continue
-            if cancel_check and cancel_check():
-                raise InterruptedError("Folder download cancelled")
-            src_item = os.path.join(source_folder, item)
-            dst_item = os.path.join(stage_dir, item)
-            shutil.move(src_item, dst_item)
-
-        if cancel_check and cancel_check():
-            raise InterruptedError("Folder download cancelled")
-
-        if os.path.exists(dest_path):
-            shutil.rmtree(dest_path, ignore_errors=True)
-        os.replace(stage_dir, dest_path)
-        stage_dir = ""
-    except InterruptedError:
-        clear_cache_for_repo(parsed_data.get("repo", ""))
-        cancel_msg = "Folder download cancelled"
-        print("[DEBUG]", cancel_msg)
-        return (cancel_msg, "") if sync else ("", "")
+            status_cb("Finalizing")
+        _sweep_staging_leftovers(stage_dir)
+        if existing:
+            _install_staged(manifest, stage_dir, dest_path)
+            for path in extra:
+                _safe_remove(path)
+                print(f"[DEBUG] Folder sync: removed {path}, which is not in the repo")
+        else:
+            if os.path.exists(dest_path):
+                shutil.rmtree(dest_path, ignore_errors=True)
+            os.replace(stage_dir, dest_path)
     except Exception as e:
         err = f"Download failed: {e}"
         print("[DEBUG]", err)
         return (err, "") if sync else ("", "")
     finally:
-        if stage_dir and os.path.isdir(stage_dir):
-            shutil.rmtree(stage_dir, ignore_errors=True)
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        print("[DEBUG] Removed temp folder:", temp_dir)
+        reservation.release()
 
     elapsed = time.time() - start_time
-    fsz = folder_size(dest_path)
-    fgb = fsz / (1024 ** 3)
-    final_message = f"Folder downloaded: {os.path.basename(dest_path)} | {fgb:.3f} GB in {elapsed:.1f}s"
+    fgb = progress.done_bytes / (1024 ** 3)
+    if existing:
+        final_message = (
+            f"Folder synced: {label} | fetched {len(manifest)} of {plan['files']} files, "
+            f"{fgb:.3f} GB in {elapsed:.1f}s"
+        )
+        if extra:
+            final_message += f", removed {len(extra)}"
+    else:
+        final_message = f"Folder downloaded: {label} | {len(manifest)} files, {fgb:.3f} GB in {elapsed:.1f}s"
     print("[DEBUG]", final_message)
+    return (final_message, dest_path) if sync else ("", "")
+
+
+def _shard_set_parts(remote_filename: str) -> Optional[Tuple[str, str, str]]:
+    """(directory, stem, extension) of the shard set a shard or shard index belongs to, or None."""
+    directory, _, name = str(remote_filename or "").replace("\\", "/").strip("/").rpartition("/")
+    match = SHARD_FILE_RE.match(name)
+    if match:
+        return directory, match.group("stem"), match.group("ext")
+    if name.lower().endswith(SHARD_INDEX_SUFFIX):
+        stem, ext = os.path.splitext(name[: -len(SHARD_INDEX_SUFFIX)])
+        if stem and ext:
+            return directory, stem, ext
+    return None
 
+
+def shard_set_key(remote_filename: str) -> str:
+    """
+    "<dir>/<stem><ext>" for a shard (model-00001-of-00006.safetensors) or shard
+    index (model.safetensors.index.json), the same for every file of one set;
+    "" for any other file. Goes by the name only, without asking the Hub.
+    """
+    parts = _shard_set_parts(remote_filename)
+    if not parts:
+        return ""
+    directory, stem, ext = parts
+    return f"{directory}/{stem}{ext}" if directory else f"{stem}{ext}"
+
+
+def find_shard_set(parsed_data: dict) -> Optional[list]:
+    """
+    Manifest entries (see _folder_manifest) for the complete set the parsed file
+    belongs to: every shard plus the index when the repo has one, in install
+    order (shards 2..N, shard 1, index), so a loader that finds the index or the
+    first shard finds the rest too. None when the file isn't a shard or index,
+    or the repo doesn't hold all N shards.
+    """
+    remote_filename = parsed_data.get("file", "").strip("/")
+    if parsed_data.get("subfolder"):
+        remote_filename = f"{parsed_data['subfolder'].strip('/')}/{remote_filename}"
+    parts = _shard_set_parts(remote_filename)
+    if not parts:
+        return None
+    directory, stem, ext = parts
+    repo_files = get_repo_files_metadata(
+        parsed_data["repo"], revision=parsed_data.get("revision"), token=get_token() or None
+    )
+    shards = {}
+    counts = set()
+    index_file = None
+    for path in repo_files:
+        path = str(path)
+        path_dir, _, name = path.rpartition("/")
+        if path_dir != directory:
+            continue
+        match = SHARD_FILE_RE.match(name)
+        if match and match.group("stem") == stem and match.group("ext") == ext:
+            shards[int(match.group("index"))] = path
+            counts.add(int(match.group("count")))
+        elif name == f"{stem}{ext}{SHARD_INDEX_SUFFIX}":
+            index_file = path
+    if len(counts) != 1 or set(shards) != set(range(1, counts.pop() + 1)):
+        print(f"[DEBUG] {remote_filename} is not part of a complete shard set in {parsed_data['repo']}")
+        return None
+    ordered = [shards[number] for number in sorted(shards) if number != 1] + [shards[1]]
+    if index_file:
+        ordered.append(index_file)
+    manifest = []
+    for path in ordered:
+        entry = repo_files.get(path) or {}
+        manifest.append({
+            "path": path,
+            "relative": path.rpartition("/")[2],
+            "size": entry.get("size"),
+            "sha256": entry.get("sha256"),
+            "etag": entry.get("etag"),
+        })
+    return manifest
+
+
+def run_download_shard_set(parsed_data: dict,
+                           final_folder: str,
+                           shard_set: Optional[list] = None,
+                           sync: bool = False,
+                           overwrite: bool = False,
+                           status_cb: Optional[Callable[[str], None]] = None,
+                           cancel_check: Optional[Callable[[], bool]] = None,
+                           progress_cb: Optional[Callable[[dict], None]] = None) -> tuple:
+    """
+    Downloads every shard of a sharded checkpoint (and its index) into
+    models/<final_folder> as one job. Shards that are missing or differ from the
+    repo are fetched in parallel like a folder's files, into a staging folder next
+    to the destination; only when all of them are verified are they moved into
+    place, so ComfyUI never lists a partial set (see _install_shard_set for an
+    existing set). progress_cb gets the summed byte counts and a "children" row
+    per file of the set. Returns (message, path of shard 1).
+    """
+    shard_set = shard_set or find_shard_set(parsed_data)
+    if not shard_set:
+        raise RuntimeError("Download failed: not a complete shard set")
+    _, stem, ext = _shard_set_parts(shard_set[0]["path"])
+    set_name = f"{stem}{ext}"
+    target_dir = resolve_target_dir(final_folder)
+    os.makedirs(target_dir, exist_ok=True)
+    shard_count = sum(1 for entry in shard_set if SHARD_FILE_RE.match(entry["relative"]))
+    first_shard = next(entry for entry in reversed(shard_set) if SHARD_FILE_RE.match(entry["relative"]))
+    first_path = os.path.join(target_dir, first_shard["relative"])
+
+    # Covers the whole set, so the job's totals and child rows stay put while only some shards are fetched.
+    progress = _FolderProgress(shard_set, progress_cb, status_cb, report_children=True)
+    fetch = []
+    unverified = 0
+    if not overwrite and status_cb:
+        status_cb("Comparing with local files")
+    for entry in shard_set:
+        if overwrite:
+            fetch.append(entry)
+            continue
+        local_path = os.path.join(target_dir, entry["relative"])
+        on_bytes = None
+        if progress_cb and _needs_local_hash(local_path, entry):
+            checked = [0]
+
+            def on_bytes(count: int, path: str = entry["path"], checked: list = checked):
+                checked[0] += count
+                progress.file_checking(path, checked[0])
+        try:
+            matches = _local_copy_matches(local_path, entry, cancel_check, on_bytes)
+        except InterruptedError:
+            cancel_msg = "Download cancelled"
+            print("[DEBUG]", cancel_msg)
+            return (cancel_msg, "") if sync else ("", "")
+        if matches is None:
+            unverified += 1
+        elif not matches:
+            fetch.append(entry)
+        progress.file_checked(entry["path"], matches is not False)
+    if not fetch:
+        total = sum(int(entry.get("size") or 0) for entry in shard_set)
+        message = f"{set_name} ({shard_count} shards) already exists | {total / (1024 ** 3):.3f} GB"
+        if unverified:
+            message += f", {unverified} unverified"
+        print("[DEBUG]", message)
+        return (message, first_path) if sync else ("", "")
+
+    # Stable across attempts, so shards that finished before a failure are kept.
+    stage_dir = os.path.join(target_dir, f".{set_name}{HF_STAGE_DIR_SUFFIX}")
+    os.makedirs(stage_dir, exist_ok=True)
+    fetch_bytes = sum(int(entry.get("size") or 0) for entry in fetch)
+    reservation = reserve_disk_space(first_path, fetch_bytes, watch=[stage_dir], label=set_name)
+    print(f"[DEBUG] Shard set {set_name}: fetching {len(fetch)} of {len(shard_set)} files into {stage_dir}")
     if status_cb:
-        status_cb("Finalizing")
-    clear_cache_for_path(downloaded_folder)
+        status_cb(f"Fetching {len(fetch)} of {len(shard_set)} files")
+    start_time = time.time()
+    try:
+        errors = _fetch_manifest(parsed_data, fetch, stage_dir, progress, cancel_check)
+        if (cancel_check and cancel_check()) or any(isinstance(e, InterruptedError) for _, e in errors):
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            cancel_msg = "Download cancelled"
+            print("[DEBUG]", cancel_msg)
+            return (cancel_msg, "") if sync else ("", "")
+        if errors:
+            raise RuntimeError(_manifest_failure_message(errors))
+        if status_cb:
+            status_cb("Finalizing")
+        _sweep_staging_leftovers(stage_dir)
+        entry_points = [first_shard["relative"]] + [
+            entry["relative"] for entry in shard_set if not SHARD_FILE_RE.match(entry["relative"])
+        ]
+        _install_shard_set(shard_set, fetch, entry_points, stage_dir, target_dir)
+    finally:
+        reservation.release()
 
-    return (final_message, dest_path) if sync else ("", "")
+    elapsed = time.time() - start_time
+    final_message = (
+        f"Downloaded {set_name} ({shard_count} shards) | {len(fetch)} files, "
+        f"{fetch_bytes / (1024 ** 3):.3f} GB in {elapsed:.1f}s"
+    )
+    print("[DEBUG]", final_message)
+    return (final_message, first_path) if sync else ("", "")
 
 
 def scan_repo_root(repo_id: str, token: str = None) -> tuple[list[str], list[str]]:
@@ -0,0 +1,259 @@
+"""Finalize staged files into place without pushing bytes through Python.
+
+`finalize_file` tries the cheapest strategy first and only falls back to a
+buffered copy when the filesystem offers nothing better:
+
+1. rename (move mode) or hardlink (link mode) on the same filesystem
+2. reflink clone (FICLONE on btrfs/XFS/bcachefs)
+3. in-kernel copy via `os.copy_file_range`, then `os.sendfile`
+4. buffered `readinto` copy
+
+Copies always land in a temp file next to the destination and are renamed
+over it, so a cancelled or failed finalize never leaves a truncated target.
+"""
+
+import errno
+import os
+import shutil
+import sys
+import tempfile
+from typing import Callable, Optional
+
+FINALIZE_EXTENT_BYTES = 64 * 1024 * 1024
+BUFFERED_CHUNK_BYTES = 8 * 1024 * 1024
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+
+STRATEGY_RENAME = "rename"
+STRATEGY_HARDLINK = "hardlink"
+STRATEGY_REFLINK = "reflink"
+STRATEGY_COPY_FILE_RANGE = "copy_file_range"
+STRATEGY_SENDFILE = "sendfile"
+STRATEGY_BUFFERED = "buffered"
+
+COPY_STRATEGIES = (
+    STRATEGY_REFLINK,
+    STRATEGY_COPY_FILE_RANGE,
+    STRATEGY_SENDFILE,
+    STRATEGY_BUFFERED,
+)
+
+# errnos meaning "this kernel/filesystem can't do that", as opposed to real I/O errors.
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EPERM,
+    errno.EBADF,
+}
+
+
+class _StrategyUnavailable(Exception):
+    """Raised internally when a copy strategy can't be used for this pair of files."""
+
+
+def _check_cancel(cancel_check: Optional[Callable[[], bool]]):
+    if cancel_check and cancel_check():
+        raise InterruptedError("Download cancelled")
+
+
+def _try_reflink(src_fd: int, dst_fd: int, size: int, cancel_check) -> None:
+    if not sys.platform.startswith("linux"):
+        raise _StrategyUnavailable()
+    try:
+        import fcntl
+    except ImportError:
+        raise _StrategyUnavailable()
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED_ERRNOS:
+            raise _StrategyUnavailable()
+        raise
+
+
+def _try_copy_file_range(src_fd: int, dst_fd: int, size: int, cancel_check) -> None:
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is None:
+        raise _StrategyUnavailable()
+    offset = 0
+    while offset < size:
+        _check_cancel(cancel_check)
+        count = min(FINALIZE_EXTENT_BYTES, size - offset)
+        try:
+            copied = copy_file_range(src_fd, dst_fd, count, offset, offset)
+        except OSError as e:
+            # Only bail out to the next strategy if nothing was written yet.
+            if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                raise _StrategyUnavailable()
+            raise
+        if copied == 0:
+            raise OSError(errno.EIO, "copy_file_range stopped before end of file")
+        offset += copied
+
+
+def _try_sendfile(src_fd: int, dst_fd: int, size: int, cancel_check) -> None:
+    sendfile = getattr(os, "sendfile", None)
+    if sendfile is None or not sys.platform.startswith("linux"):
+        # Non-Linux sendfile only targets sockets.
+        raise _StrategyUnavailable()
+    offset = 0
+    while offset < size:
+        _check_cancel(cancel_check)
+        count = min(FINALIZE_EXTENT_BYTES, size - offset)
+        try:
+            sent = sendfile(dst_fd, src_fd, offset, count)
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                raise _StrategyUnavailable()
+            raise
+        if sent == 0:
+            raise OSError(errno.EIO, "sendfile stopped before end of file")
+        offset += sent
+
+
+def _buffered_copy(src_fd: int, dst_fd: int, size: int, cancel_check, hasher=None) -> None:
+    buffer = bytearray(BUFFERED_CHUNK_BYTES)
+    view = memoryview(buffer)
+    since_check = 0
+    with open(src_fd, "rb", buffering=0, closefd=False) as src:
+        while True:
+            if since_check >= FINALIZE_EXTENT_BYTES:
+                _check_cancel(cancel_check)
+                since_check = 0
+            read = src.readinto(buffer)
+            if not read:
+                break
+            if hasher is not None:
+                hasher.update(view[:read])
+            written = 0
+            while written < read:
+                written += os.write(dst_fd, view[written:read])
+            since_check += read
+
+
+_COPY_FUNCS = {
+    STRATEGY_REFLINK: _try_reflink,
+    STRATEGY_COPY_FILE_RANGE: _try_copy_file_range,
+    STRATEGY_SENDFILE: _try_sendfile,
+    STRATEGY_BUFFERED: _buffered_copy,
+}
+
+
+def _copy_into(src_path: str, tmp_path: str, strategies, cancel_check, hasher=None) -> str:
+    """Copy src into an already created tmp_path with the first strategy that works."""
+    with open(src_path, "rb") as src, open(tmp_path, "r+b") as dst:
+        src_fd = src.fileno()
+        dst_fd = dst.fileno()
+        size = os.fstat(src_fd).st_size
+        for strategy in strategies:
+            _check_cancel(cancel_check)
+            try:
+                if strategy == STRATEGY_BUFFERED:
+                    _buffered_copy(src_fd, dst_fd, size, cancel_check, hasher)
+                else:
+                    _COPY_FUNCS[strategy](src_fd, dst_fd, size, cancel_check)
+            except _StrategyUnavailable:
+                continue
+            return strategy
+    raise OSError(errno.ENOTSUP, f"No copy strategy available for {src_path}")
+
+
+def copy_file_fast(
+    src_path: str,
+    tmp_path: str,
+    cancel_check: Optional[Callable[[], bool]] = None,
+    strategies=COPY_STRATEGIES,
+    hasher=None,
+) -> str:
+    """Copy src_path into tmp_path (truncating it) and return the strategy that worked."""
+    with open(tmp_path, "wb"):
+        pass
+    return _copy_into(src_path, tmp_path, strategies, cancel_check, hasher)
+
+
+def finalize_file(
+    src_path: str,
+    dst_path: str,
+    move: bool = False,
+    allow_hardlink: bool = False,
+    cancel_check: Optional[Callable[[], bool]] = None,
+    preserve_metadata: bool = False,
+    before_copy: Optional[Callable[[], None]] = None,
+    hasher=None,
+    copy_strategies=COPY_STRATEGIES,
+) -> str:
+    """
+    Put the contents of src_path at dst_path and return the strategy used.
+
+    move=True lets the source be consumed (renamed, or removed after a copy).
+    allow_hardlink=True lets dst share the source inode when both sit on the
+    same filesystem; only use it when neither side is edited in place later.
+    before_copy is called once if the data actually has to be copied.
+    hasher (a hashlib object) asks for the bytes to be hashed on the way through:
+    a reflink still wins, but in-kernel copies are skipped in favour of the
+    buffered copy, which feeds hasher. It is only complete if "buffered" is returned.
+    copy_strategies limits how the data may be copied; OSError(ENOTSUP) if none applies.
+    """
+    if move and os.path.islink(src_path):
+        # Consuming a link would move the link (or someone else's blob); copy its target instead.
+        move = False
+    src_path = os.path.realpath(src_path)
+    dst_dir = os.path.dirname(os.path.abspath(dst_path)) or "."
+    os.makedirs(dst_dir, exist_ok=True)
+    _check_cancel(cancel_check)
+
+    if move:
+        try:
+            os.replace(src_path, dst_path)
+            return STRATEGY_RENAME
+        except OSError:
+            # Cross-device (or otherwise unrenamable); copy and drop the source.
+            pass
+
+    tmp_fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(dst_path)}.",
+        suffix=".tmp_copy",
+        dir=dst_dir,
+    )
+    os.close(tmp_fd)
+    try:
+        strategy = ""
+        if allow_hardlink and not move:
+            try:
+                os.remove(tmp_path)
+                os.link(src_path, tmp_path)
+                strategy = STRATEGY_HARDLINK
+            except OSError:
+                if not os.path.exists(tmp_path):
+                    with open(tmp_path, "wb"):
+                        pass
+        if not strategy:
+            if before_copy:
+                before_copy()
+            strategies = copy_strategies
+            if hasher is not None:
+                # Reading the bytes is unavoidable; do it once, as part of the copy.
+                strategies = (STRATEGY_REFLINK, STRATEGY_BUFFERED)
+            strategy = copy_file_fast(src_path, tmp_path, cancel_check, strategies, hasher)
+            if preserve_metadata:
+                shutil.copystat(src_path, tmp_path)
+        _check_cancel(cancel_check)
+        os.replace(tmp_path, dst_path)
+        tmp_path = ""
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    if move:
+        try:
+            os.remove(src_path)
+        except OSError:
+            pass
+    return strategy
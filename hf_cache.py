@@ -0,0 +1,213 @@
+"""
+Targeted eviction from the Hugging Face hub cache.
+
+huggingface_hub's scan_cache_dir() stats every repo, revision and blob in the
+whole cache, which costs seconds to minutes on machines where other tools share
+it. Everything the downloader puts into the cache has a known location
+(<cache>/models--org--name/{blobs/<etag>, snapshots/<commit>/<path>}), so the
+helpers here remove exactly those entries and touch nothing else.
+
+Stdlib only, so scripts/bench_transfer.py can import it without ComfyUI.
+"""
+
+import os
+import shutil
+from typing import Optional, Tuple
+
+INCOMPLETE_SUFFIX = ".incomplete"
+_REPO_FOLDER_PREFIXES = {"model": "models", "dataset": "datasets", "space": "spaces"}
+
+
+def hf_cache_dir() -> str:
+    try:
+        from huggingface_hub.constants import HF_HUB_CACHE
+        return HF_HUB_CACHE
+    except Exception:
+        return os.path.join(os.path.expanduser("~"), ".cache", "huggingface", "hub")
+
+
+def repo_cache_folder(repo_id: str, repo_type: str = "model", cache_dir: Optional[str] = None) -> str:
+    prefix = _REPO_FOLDER_PREFIXES.get(repo_type or "model", "models")
+    repo_folder = f"{prefix}--{str(repo_id or '').strip().replace('/', '--')}"
+    return os.path.join(cache_dir or hf_cache_dir(), repo_folder)
+
+
+def blob_paths(repo_id: str, etag: Optional[str], cache_dir: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """(blob, blob.incomplete) for one file, or (None, None) without an etag."""
+    if not etag:
+        return None, None
+    blob_path = os.path.join(repo_cache_folder(repo_id, cache_dir=cache_dir), "blobs", etag)
+    return blob_path, blob_path + INCOMPLETE_SUFFIX
+
+
+def locate_cache_path(path: str, cache_dir: Optional[str] = None) -> Optional[Tuple[str, str, str]]:
+    """
+    Split a path inside the hub cache into (repo_dir, commit, path in snapshot).
+    The last part is "" for the snapshot folder itself. None if path is not a
+    snapshot path (e.g. a local_dir download), which needs no eviction at all.
+    """
+    if not path:
+        return None
+    cache_root = os.path.abspath(cache_dir or hf_cache_dir())
+    # Don't resolve the last component: it is the snapshot link, not the blob.
+    full = os.path.join(os.path.realpath(os.path.dirname(os.path.abspath(path))), os.path.basename(path))
+    for root in {cache_root, os.path.realpath(cache_root)}:
+        try:
+            rel = os.path.relpath(full, root)
+        except ValueError:
+            continue
+        parts = rel.split(os.sep)
+        if parts[0] == os.pardir or len(parts) < 3 or parts[1] != "snapshots":
+            continue
+        if "--" not in parts[0]:
+            continue
+        return os.path.join(root, parts[0]), parts[2], "/".join(parts[3:])
+    return None
+
+
+def _resolve_commit(repo_dir: str, revision: Optional[str]) -> Optional[str]:
+    revision = str(revision or "main").strip()
+    if os.path.isdir(os.path.join(repo_dir, "snapshots", revision)):
+        return revision
+    try:
+        with open(os.path.join(repo_dir, "refs", revision), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _remove(path: str) -> int:
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        print(f"[DEBUG] Failed to remove {path}: {e}")
+        return 0
+
+
+def _blob_of(link_path: str) -> Optional[str]:
+    try:
+        target = os.readlink(link_path)
+    except OSError:
+        return None
+    return os.path.normpath(os.path.join(os.path.dirname(link_path), target))
+
+
+def _blob_used_elsewhere(repo_dir: str, commit: str, rel_path: str, blob_path: str) -> bool:
+    """True if another revision links the same path to the same blob (the common way blobs are shared)."""
+    snapshots_dir = os.path.join(repo_dir, "snapshots")
+    try:
+        others = [name for name in os.listdir(snapshots_dir) if name != commit]
+    except OSError:
+        return False
+    for other in others:
+        other_link = os.path.join(snapshots_dir, other, *rel_path.split("/"))
+        if os.path.islink(other_link) and _blob_of(other_link) == blob_path:
+            return True
+    return False
+
+
+def _prune_empty(repo_dir: str, commit: str, rel_path: str) -> None:
+    """rmdir the now-empty folders above an evicted link, up to the repo folder."""
+    snapshot_dir = os.path.join(repo_dir, "snapshots", commit)
+    current = os.path.dirname(os.path.join(snapshot_dir, *rel_path.split("/"))) if rel_path else snapshot_dir
+    stop = os.path.join(repo_dir, "snapshots")
+    while current.startswith(snapshot_dir) and current != stop:
+        try:
+            os.rmdir(current)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return
+        current = os.path.dirname(current)
+    # The snapshot is gone: drop refs pointing at it, and the repo folder if nothing is left.
+    refs_dir = os.path.join(repo_dir, "refs")
+    if os.path.isdir(refs_dir):
+        for name in os.listdir(refs_dir):
+            ref_path = os.path.join(refs_dir, name)
+            try:
+                with open(ref_path, "r", encoding="utf-8") as f:
+                    if f.read().strip() == commit:
+                        os.remove(ref_path)
+            except OSError:
+                pass
+    try:
+        if os.listdir(stop) or os.listdir(os.path.join(repo_dir, "blobs")):
+            return
+    except OSError:
+        pass
+    shutil.rmtree(repo_dir, ignore_errors=True)
+
+
+def _evict_link(repo_dir: str, commit: str, rel_path: str) -> int:
+    link_path = os.path.join(repo_dir, "snapshots", commit, *rel_path.split("/"))
+    blob_path = _blob_of(link_path) if os.path.islink(link_path) else None
+    removed = _remove(link_path)
+    if blob_path and not _blob_used_elsewhere(repo_dir, commit, rel_path, blob_path):
+        removed += _remove(blob_path)
+        removed += _remove(blob_path + INCOMPLETE_SUFFIX)
+    return removed
+
+
+def evict_cached_file(repo_id: str,
+                      etag: Optional[str],
+                      filename: Optional[str] = None,
+                      revision: Optional[str] = None,
+                      cache_dir: Optional[str] = None) -> int:
+    """
+    Remove one downloaded file from the cache: its blob, a leftover *.incomplete
+    and, when filename is given, the snapshot link for that revision. Returns
+    the number of filesystem entries removed.
+    """
+    blob_path, incomplete_path = blob_paths(repo_id, etag, cache_dir)
+    if not blob_path:
+        return 0
+    repo_dir = os.path.dirname(os.path.dirname(blob_path))
+    removed = 0
+    commit = _resolve_commit(repo_dir, revision) if filename else None
+    if commit:
+        rel_path = str(filename).strip("/")
+        link_path = os.path.join(repo_dir, "snapshots", commit, *rel_path.split("/"))
+        if _blob_of(link_path) == os.path.normpath(blob_path):
+            removed += _remove(link_path)
+    removed += _remove(blob_path)
+    removed += _remove(incomplete_path)
+    if commit:
+        _prune_empty(repo_dir, commit, str(filename).strip("/"))
+    return removed
+
+
+def evict_cache_path(path: str, cache_dir: Optional[str] = None) -> int:
+    """
+    Evict a path returned by hf_hub_download/snapshot_download: a single snapshot
+    file, or a whole snapshot folder (only the links in it and their blobs).
+    Paths outside the hub cache return 0 immediately.
+    """
+    located = locate_cache_path(path, cache_dir)
+    if not located:
+        return 0
+    repo_dir, commit, rel_path = located
+    removed = 0
+    if rel_path and not os.path.isdir(path):
+        removed += _evict_link(repo_dir, commit, rel_path)
+    else:
+        base = os.path.join(repo_dir, "snapshots", commit)
+        root = os.path.join(base, *rel_path.split("/")) if rel_path else base
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                link_rel = os.path.relpath(os.path.join(dirpath, name), base).replace(os.sep, "/")
+                removed += _evict_link(repo_dir, commit, link_rel)
+        shutil.rmtree(root, ignore_errors=True)
+    _prune_empty(repo_dir, commit, rel_path)
+    return removed
+
+
+def evict_cached_repo(repo_id: str, cache_dir: Optional[str] = None) -> bool:
+    """Remove everything cached for one model repo. True if its folder existed."""
+    repo_dir = repo_cache_folder(repo_id, cache_dir=cache_dir)
+    if not os.path.isdir(repo_dir):
+        return False
+    shutil.rmtree(repo_dir, ignore_errors=True)
+    return True
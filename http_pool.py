@@ -0,0 +1,406 @@
+"""
+Keep-alive HTTP connections shared by downloads, mirror lookups and URL checks.
+
+urllib.request sends "Connection: close" and opens a new TCP (and TLS)
+connection for every request. The segmented engine fetches many ranges per file
+and model discovery checks dozens of URLs per workflow, so each of those paid a
+full handshake. open_url() here keeps idle http.client connections per
+(scheme, host, port) and hands them out again, caches DNS answers for
+DNS_CACHE_SECONDS, offers the last TLS session of a host when it does have to
+open a new connection, and follows redirects itself, dropping Authorization and
+Cookie once a redirect leaves the original host.
+
+Responses behave like urllib's (status, headers, geturl(), read(), readinto(),
+close(), with-block) and 4xx/5xx raise urllib.error.HTTPError, so callers keep
+their error handling. A connection only goes back to the pool when its response
+was read to the end (small leftovers are drained on close); a reused connection
+the server dropped in the meantime is retried once on a fresh one. Requests that
+the environment routes through a proxy go through urllib as before.
+
+HTTP/2 is not used: http.client only speaks HTTP/1.1, and the segmented engine
+already spreads large files over several connections.
+
+Stdlib only, so scripts and the hub_worker process can use it too.
+"""
+
+import http.client
+import io
+import os
+import select
+import socket
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Optional
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return str(value).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+HTTP_POOL = _env_flag("HF_DOWNLOADER_HTTP_POOL", default=True)
+HTTP_POOL_MAX_IDLE_PER_HOST = _env_int("HF_DOWNLOADER_HTTP_POOL_PER_HOST", 16, 1)
+# Well below the idle timeout of common servers and CDNs, so pooled connections are rarely dead.
+HTTP_POOL_IDLE_SECONDS = 30.0
+DNS_CACHE_SECONDS = _env_int("HF_DOWNLOADER_DNS_CACHE_SECONDS", 300, 0)
+DEFAULT_TIMEOUT_SECONDS = 60
+MAX_REDIRECTS = 10
+# Unread response bodies up to this size are drained on close so the connection can be reused.
+DRAIN_MAX_BYTES = 64 * 1024
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+CREDENTIAL_HEADERS = ("authorization", "cookie")
+
+_pool_lock = threading.Lock()
+# (scheme, host, port) -> [(connection, monotonic time it went idle)]
+_idle = {}
+# (host, port) -> (monotonic expiry, getaddrinfo result)
+_dns = {}
+# (host, port) -> ssl.SSLSession of the last TLS connection
+_tls_sessions = {}
+_ssl_context = None
+_stats = {
+    "requests": 0,
+    "connections_opened": 0,
+    "connections_reused": 0,
+    "tls_handshakes": 0,
+    "tls_resumed": 0,
+    "tls_handshakes_saved": 0,
+    "dns_lookups": 0,
+    "dns_cache_hits": 0,
+    "stale_retries": 0,
+    "redirects": 0,
+    "via_urllib": 0,
+}
+
+
+def _count(key: str, amount: int = 1) -> None:
+    with _pool_lock:
+        _stats[key] += amount
+
+
+def _context() -> ssl.SSLContext:
+    global _ssl_context
+    with _pool_lock:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context()
+        return _ssl_context
+
+
+def _resolve(host: str, port: int) -> list:
+    key = (host, port)
+    now = time.monotonic()
+    if DNS_CACHE_SECONDS > 0:
+        with _pool_lock:
+            entry = _dns.get(key)
+            if entry is not None and entry[0] > now:
+                _stats["dns_cache_hits"] += 1
+                return entry[1]
+    infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    with _pool_lock:
+        _stats["dns_lookups"] += 1
+        if DNS_CACHE_SECONDS > 0:
+            _dns[key] = (now + DNS_CACHE_SECONDS, infos)
+    return infos
+
+
+def _connect_socket(host: str, port: int, timeout) -> socket.socket:
+    error = None
+    for family, socktype, proto, _, address in _resolve(host, port):
+        sock = None
+        try:
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(timeout)
+            sock.connect(address)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock
+        except OSError as e:
+            error = e
+            if sock is not None:
+                sock.close()
+    # The cached answer may be what's wrong; look the host up again next time.
+    with _pool_lock:
+        _dns.pop((host, port), None)
+    raise error or OSError(f"Could not resolve {host}")
+
+
+class _HTTPConnection(http.client.HTTPConnection):
+    def connect(self):
+        self.sock = _connect_socket(self.host, self.port, self.timeout)
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    def connect(self):
+        sock = _connect_socket(self.host, self.port, self.timeout)
+        with _pool_lock:
+            session = _tls_sessions.get((self.host, self.port))
+        try:
+            self.sock = self._context.wrap_socket(sock, server_hostname=self.host, session=session)
+        except Exception:
+            sock.close()
+            raise
+        with _pool_lock:
+            _stats["tls_handshakes"] += 1
+            if self.sock.session_reused:
+                _stats["tls_resumed"] += 1
+
+
+def _dropped(sock) -> bool:
+    """An idle keep-alive socket that is readable was closed (or messed with) by the server."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def _checkout(key: tuple, timeout) -> tuple:
+    scheme, host, port = key
+    now = time.monotonic()
+    discard = []
+    found = None
+    with _pool_lock:
+        idle = _idle.get(key) or []
+        while idle:
+            conn, since = idle.pop()
+            if now - since < HTTP_POOL_IDLE_SECONDS and conn.sock is not None and not _dropped(conn.sock):
+                found = conn
+                _stats["connections_reused"] += 1
+                if scheme == "https":
+                    _stats["tls_handshakes_saved"] += 1
+                break
+            discard.append(conn)
+    for conn in discard:
+        conn.close()
+    if found is not None:
+        found.timeout = timeout
+        found.sock.settimeout(timeout)
+        return found, True
+    if scheme == "https":
+        conn = _HTTPSConnection(host, port, timeout=timeout, context=_context())
+    else:
+        conn = _HTTPConnection(host, port, timeout=timeout)
+    _count("connections_opened")
+    return conn, False
+
+
+def _checkin(key: tuple, conn) -> None:
+    sock = conn.sock
+    if sock is None:
+        return
+    with _pool_lock:
+        session = getattr(sock, "session", None)
+        if session is not None:
+            _tls_sessions[(key[1], key[2])] = session
+        idle = _idle.setdefault(key, [])
+        if len(idle) < HTTP_POOL_MAX_IDLE_PER_HOST:
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+class PooledResponse:
+    """A response on a pooled connection; the connection is returned once the body is read."""
+
+    def __init__(self, key: tuple, conn, response: http.client.HTTPResponse, url: str):
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.msg = response.headers
+
+    def geturl(self) -> str:
+        return self.url
+
+    def getcode(self) -> int:
+        return self.status
+
+    def getheader(self, name: str, default=None):
+        return self._response.getheader(name, default)
+
+    def info(self):
+        return self.headers
+
+    @property
+    def closed(self) -> bool:
+        return self._conn is None
+
+    def _done(self, reusable: bool) -> None:
+        conn = self._conn
+        self._conn = None
+        if conn is None:
+            return
+        if reusable and not self._response.will_close:
+            _checkin(self._key, conn)
+        else:
+            conn.close()
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        if self._conn is None:
+            return b""
+        try:
+            data = self._response.read() if amt is None else self._response.read(amt)
+        except Exception:
+            self._done(False)
+            raise
+        if self._response.isclosed():
+            self._done(True)
+        return data
+
+    def readinto(self, buffer) -> int:
+        if self._conn is None:
+            return 0
+        try:
+            count = self._response.readinto(buffer)
+        except Exception:
+            self._done(False)
+            raise
+        if self._response.isclosed():
+            self._done(True)
+        return count
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        length = self._response.length
+        if not self._response.isclosed() and length is not None and length <= DRAIN_MAX_BYTES:
+            try:
+                self._response.read()
+            except Exception:
+                pass
+        if self._response.isclosed():
+            self._done(True)
+            return
+        self._response.close()
+        self._done(False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _send(parts: urllib.parse.SplitResult, method: str, headers: dict, timeout) -> PooledResponse:
+    scheme = parts.scheme.lower()
+    port = parts.port or (443 if scheme == "https" else 80)
+    key = (scheme, parts.hostname, port)
+    target = parts.path or "/"
+    if parts.query:
+        target = f"{target}?{parts.query}"
+    for attempt in range(2):
+        conn, reused = _checkout(key, timeout)
+        try:
+            conn.request(method, target, headers=headers)
+            response = conn.getresponse()
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError) as e:
+            conn.close()
+            if reused and attempt == 0:
+                # The server closed the idle connection just as we reused it.
+                _count("stale_retries")
+                continue
+            raise urllib.error.URLError(e)
+        except Exception:
+            conn.close()
+            raise
+        return PooledResponse(key, conn, response, parts.geturl())
+    raise urllib.error.URLError("Connection dropped")
+
+
+def _proxied(parts: urllib.parse.SplitResult) -> bool:
+    proxy = urllib.request.getproxies().get(parts.scheme.lower())
+    return bool(proxy) and not urllib.request.proxy_bypass(parts.netloc)
+
+
+class _CredentialStrippingRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # Signed CDN URLs (e.g. Hugging Face LFS/Xet bridges) reject requests that also carry
+    # a bearer token, and the token must not leak to third-party hosts anyway.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new_req = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new_req is None:
+            return None
+        origin_host = urllib.parse.urlparse(req.full_url).netloc.lower()
+        if urllib.parse.urlparse(newurl).netloc.lower() != origin_host:
+            for name in ("Authorization", "Cookie"):
+                new_req.remove_header(name)
+        return new_req
+
+
+_url_opener = urllib.request.build_opener(_CredentialStrippingRedirectHandler)
+
+
+def open_url(url: str, headers: Optional[dict] = None, method: str = "GET", timeout: Optional[float] = None):
+    """
+    GET (or HEAD) url on a pooled connection, following redirects. Authorization
+    and Cookie are only sent to the original host. Raises urllib.error.HTTPError
+    for 4xx/5xx like urllib.request.urlopen.
+    """
+    timeout = DEFAULT_TIMEOUT_SECONDS if timeout is None else timeout
+    request_headers = dict(headers or {})
+    origin_host = urllib.parse.urlsplit(url).netloc.lower()
+    current = url
+    _count("requests")
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(current)
+        if not HTTP_POOL or parts.scheme.lower() not in ("http", "https") or not parts.hostname or _proxied(parts):
+            _count("via_urllib")
+            request = urllib.request.Request(current, headers=request_headers, method=method)
+            return _url_opener.open(request, timeout=timeout)
+        response = _send(parts, method, request_headers, timeout)
+        location = response.headers.get("Location")
+        if response.status in REDIRECT_CODES and location:
+            response.close()
+            current = urllib.parse.urljoin(current, location)
+            if urllib.parse.urlsplit(current).netloc.lower() != origin_host:
+                request_headers = {
+                    name: value for name, value in request_headers.items()
+                    if name.lower() not in CREDENTIAL_HEADERS
+                }
+            _count("redirects")
+            continue
+        if response.status >= 400:
+            body = response
+            if response._response.length is not None and response._response.length <= DRAIN_MAX_BYTES:
+                # Keep the (small) error body readable on the exception and free the connection.
+                body = io.BytesIO(response.read())
+                response.close()
+            raise urllib.error.HTTPError(current, response.status, response.reason, response.headers, body)
+        return response
+    raise urllib.error.URLError(f"Too many redirects for {url}")
+
+
+def close_idle_connections() -> None:
+    with _pool_lock:
+        connections = [conn for idle in _idle.values() for conn, _ in idle]
+        _idle.clear()
+    for conn in connections:
+        conn.close()
+
+
+def get_http_pool_stats() -> dict:
+    now = time.monotonic()
+    with _pool_lock:
+        stats = dict(_stats)
+        stats["idle_connections"] = sum(
+            1 for idle in _idle.values() for _, since in idle if now - since < HTTP_POOL_IDLE_SECONDS
+        )
+        stats["hosts"] = len(_idle)
+    stats["enabled"] = HTTP_POOL
+    return stats
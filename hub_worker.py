@@ -0,0 +1,541 @@
+"""
+Long-lived helper processes that run huggingface_hub downloads.
+
+huggingface_hub (and hf_xet) can't be cancelled from another thread, so downloads
+still run out of process, but each process imports huggingface_hub once and then
+serves jobs over its stdin/stdout as JSON lines instead of being spawned per file.
+Xet has to be switched on or off before huggingface_hub is imported, so there is
+a separate pool per Xet setting. Cancelling a job kills its process; the pool
+spawns a fresh one for the next job.
+
+Protocol (one JSON object per line):
+  parent -> worker: {"id": "...", "op": "file" | "snapshot" | "ping", "kwargs": {...},
+                     "start_stage": 1..4 (file jobs only)}
+  worker -> parent: {"type": "ready", "pid": ..., "import_seconds": ...}
+                    {"id": "...", "type": "accepted"}
+                    {"id": "...", "type": "stage", "stage": 1..4}
+                    {"id": "...", "type": "progress", "downloaded_bytes": n, "total_bytes": n | null}
+                    {"id": "...", "type": "result", "ok": bool, "path": "...", "stage": n, "error": "..."}
+
+Progress comes from the bytes huggingface_hub reports to its tqdm bars (HTTP
+and Xet alike) and from the copy loop of the stage 3/4 fallback, so the parent
+gets exact counts without looking at the files being written.
+
+Run directly as `python hub_worker.py <xet_flag>`; it only imports the standard
+library at module level so the parent can import it cheaply.
+"""
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+# Idle processes kept per Xet setting; extra ones exit after their job.
+HUB_WORKER_MAX_IDLE = _env_int("HF_DOWNLOADER_HUB_WORKERS", 2, 0)
+HUB_WORKER_READY_TIMEOUT_SECONDS = 120
+HUB_WORKER_POLL_SECONDS = 0.1
+# Worker side: minimum gap between two progress messages of a job.
+HUB_PROGRESS_INTERVAL_SECONDS = 0.25
+
+_WORKER_SCRIPT = os.path.abspath(__file__)
+_BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+class _HubWorker:
+    """Parent-side handle for one worker process."""
+
+    def __init__(self, use_xet: bool):
+        self.use_xet = use_xet
+        self.messages = queue.Queue()
+        started = time.time()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", _WORKER_SCRIPT, "1" if use_xet else "0"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            cwd=os.getcwd(),
+        )
+        threading.Thread(target=self._read_messages, daemon=True).start()
+        threading.Thread(target=self._log_stderr, daemon=True).start()
+        ready = self._next_message(HUB_WORKER_READY_TIMEOUT_SECONDS)
+        if not ready or ready.get("type") != "ready":
+            self.close()
+            raise RuntimeError("huggingface_hub worker process failed to start")
+        self.startup_seconds = time.time() - started
+        print(
+            f"[DEBUG] Hub worker {self.proc.pid} ready (xet={'on' if use_xet else 'off'}) "
+            f"in {self.startup_seconds:.2f}s"
+        )
+
+    def _read_messages(self):
+        try:
+            for line in iter(self.proc.stdout.readline, ""):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    message = json.loads(line)
+                except Exception:
+                    continue
+                if isinstance(message, dict):
+                    self.messages.put(message)
+        except Exception:
+            pass
+        self.messages.put({"type": "exit"})
+
+    def _log_stderr(self):
+        try:
+            for line in iter(self.proc.stderr.readline, ""):
+                # Only surface real errors; tqdm bars and library chatter also land here.
+                val = line.strip()
+                if val and ("Traceback" in val or "Error:" in val or "Exception" in val):
+                    print(f"[DEBUG] Subprocess Error: {val}")
+        except Exception:
+            pass
+
+    def _next_message(self, timeout: float) -> Optional[dict]:
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self,
+            op: str,
+            kwargs: dict,
+            cancel_check: Optional[Callable[[], bool]] = None,
+            on_message: Optional[Callable[[dict], None]] = None,
+            start_stage: int = 1) -> dict:
+        job_id = uuid.uuid4().hex
+        sent_at = time.time()
+        job = {"id": job_id, "op": op, "kwargs": kwargs, "start_stage": start_stage}
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+        while True:
+            if cancel_check and cancel_check():
+                self.close()
+                raise InterruptedError("Download cancelled")
+            message = self._next_message(HUB_WORKER_POLL_SECONDS)
+            if message is None:
+                continue
+            if message.get("type") == "exit":
+                return {"ok": False, "error": "huggingface_hub worker process exited unexpectedly"}
+            if message.get("id") != job_id:
+                continue
+            kind = message.get("type")
+            if kind == "accepted":
+                _record_dispatch_latency(time.time() - sent_at)
+            elif kind == "result":
+                return message
+            if on_message:
+                on_message(message)
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait(timeout=5)
+
+
+_pool_lock = threading.Lock()
+_idle_workers = {True: [], False: []}
+_stats = {
+    "spawned": 0,
+    "jobs": 0,
+    "startup_seconds_total": 0.0,
+    "dispatch_ms_total": 0.0,
+    "dispatch_ms_last": None,
+}
+
+
+def _record_dispatch_latency(seconds: float):
+    with _pool_lock:
+        _stats["dispatch_ms_last"] = seconds * 1000.0
+        _stats["dispatch_ms_total"] += seconds * 1000.0
+
+
+def _acquire_worker(use_xet: bool) -> _HubWorker:
+    with _pool_lock:
+        idle = _idle_workers[use_xet]
+        while idle:
+            worker = idle.pop()
+            if worker.alive():
+                return worker
+    worker = _HubWorker(use_xet)
+    with _pool_lock:
+        _stats["spawned"] += 1
+        _stats["startup_seconds_total"] += worker.startup_seconds
+    return worker
+
+
+def _release_worker(worker: _HubWorker):
+    if not worker.alive():
+        return
+    with _pool_lock:
+        idle = _idle_workers[worker.use_xet]
+        if len(idle) < HUB_WORKER_MAX_IDLE:
+            idle.append(worker)
+            return
+    worker.close()
+
+
+def run_hub_job(op: str,
+                kwargs: dict,
+                use_xet: bool,
+                cancel_check: Optional[Callable[[], bool]] = None,
+                on_message: Optional[Callable[[dict], None]] = None,
+                start_stage: int = 1) -> dict:
+    """
+    Run one job ("file" -> hf_hub_download with the stage 2-4 fallbacks, starting
+    at start_stage; "snapshot" -> snapshot_download) on a pooled worker process.
+    Returns the worker's result message; raises InterruptedError on cancel.
+    """
+    try:
+        worker = _acquire_worker(use_xet)
+    except Exception as e:
+        return {"ok": False, "error": f"Could not start huggingface_hub worker: {e}"}
+    with _pool_lock:
+        _stats["jobs"] += 1
+    try:
+        result = worker.run(op, kwargs, cancel_check=cancel_check, on_message=on_message, start_stage=start_stage)
+    except BaseException:
+        worker.close()
+        raise
+    _release_worker(worker)
+    return result
+
+
+def get_hub_worker_stats() -> dict:
+    with _pool_lock:
+        stats = dict(_stats)
+        stats["idle"] = {("xet" if key else "no_xet"): len(value) for key, value in _idle_workers.items()}
+    jobs = stats["jobs"]
+    spawned = stats["spawned"]
+    stats["dispatch_ms_avg"] = stats.pop("dispatch_ms_total") / jobs if jobs else None
+    stats["startup_seconds_avg"] = stats.pop("startup_seconds_total") / spawned if spawned else None
+    return stats
+
+
+def shutdown_hub_workers():
+    with _pool_lock:
+        workers = _idle_workers[True] + _idle_workers[False]
+        _idle_workers[True] = []
+        _idle_workers[False] = []
+    for worker in workers:
+        worker.close()
+
+
+# ---------------------------------------------------------------------------
+# Worker process side
+# ---------------------------------------------------------------------------
+
+def _configure_xet(use_xet: bool):
+    if use_xet:
+        os.environ['HF_HUB_DISABLE_XET'] = '0'
+        os.environ['HF_HUB_ENABLE_HF_XET'] = '1'
+        return
+    os.environ['HF_HUB_DISABLE_XET'] = '1'
+    os.environ['HF_HUB_ENABLE_HF_XET'] = '0'
+    # Block hf_xet entirely - env vars are ignored by wild imports. Only the hf_xet
+    # package itself: huggingface_hub.utils._xet is needed by hf_hub_download.
+    def _is_xet_module(name: str) -> bool:
+        return name == 'hf_xet' or name.startswith('hf_xet.')
+
+    for _m in list(sys.modules):
+        if _is_xet_module(_m):
+            del sys.modules[_m]
+
+    class _XetBlocker:
+        def find_module(self, name, path=None):
+            return self if _is_xet_module(name) else None
+
+        def load_module(self, name):
+            raise ImportError(name)
+
+    sys.meta_path.insert(0, _XetBlocker())
+
+
+class _JobProgress:
+    """Sums the byte counters of the running job and sends them as throttled progress messages."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._send = None
+        self._counters = []
+        self._last_sent = 0.0
+
+    def start(self, send: Optional[Callable[[dict], None]]):
+        """Begin a job (or a new file stage): counters restart from zero."""
+        with self._lock:
+            self._send = send
+            self._counters = []
+            self._last_sent = 0.0
+
+    def counter(self, total: Optional[int], initial: int = 0, bar=None) -> list:
+        """A byte counter for one file; with a bar, its (possibly growing) total is read from bar.total."""
+        counter = [int(initial or 0), total, bar]
+        with self._lock:
+            self._counters.append(counter)
+        self.report()
+        return counter
+
+    def add(self, counter: list, count: int):
+        with self._lock:
+            counter[0] += count
+        self.report()
+
+    def report(self, force: bool = False):
+        now = time.time()
+        with self._lock:
+            send = self._send
+            if not send or not self._counters:
+                return
+            if not force and now - self._last_sent < HUB_PROGRESS_INTERVAL_SECONDS:
+                return
+            self._last_sent = now
+            downloaded = sum(max(0, counter[0]) for counter in self._counters)
+            totals = [counter[1] if counter[2] is None else getattr(counter[2], "total", None)
+                      for counter in self._counters]
+        total = sum(totals) if totals and all(isinstance(value, int) for value in totals) else None
+        send({"type": "progress", "downloaded_bytes": downloaded, "total_bytes": total})
+
+
+_job_progress = _JobProgress()
+
+
+def _install_progress_hook():
+    """
+    Swap huggingface_hub's tqdm class for a subclass that also feeds _job_progress.
+    Every byte bar (regular and Xet downloads, snapshot_download's total) is built
+    from the module-level class, so replacing the references is enough. Count bars
+    like "Fetching N files" are ignored, and so is snapshot_download's network
+    "transfer" bar, which would count the same files twice.
+    """
+    try:
+        import importlib
+        base = importlib.import_module("huggingface_hub.utils.tqdm").tqdm
+    except Exception as e:
+        print(f"[DEBUG] Hub worker progress hook unavailable: {e}", file=sys.stderr)
+        return
+
+    class _CountingTqdm(base):
+        def __init__(self, *args, **kwargs):
+            self._job_counter = None
+            if kwargs.get("unit") == "B" and not str(kwargs.get("name") or "").endswith(".transfer"):
+                self._job_counter = _job_progress.counter(None, kwargs.get("initial") or 0, bar=self)
+            super().__init__(*args, **kwargs)
+
+        def update(self, n=1):
+            if self._job_counter is not None and n:
+                _job_progress.add(self._job_counter, n)
+            return super().update(n)
+
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("huggingface_hub") or module is None:
+            continue
+        for attr in ("tqdm", "hf_tqdm"):
+            if getattr(module, attr, None) is base:
+                setattr(module, attr, _CountingTqdm)
+
+
+def _sibling_module(name: str):
+    """Import a module from this package folder, which _worker_main drops from sys.path."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    import importlib.util
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name + '.py')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Registered before exec so download_engine's own `import http_pool` finds it.
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        sys.modules.pop(name, None)
+        raise
+    return module
+
+
+def _manual_download(kwargs: dict, with_token: bool) -> str:
+    http_pool = _sibling_module('http_pool')
+    download_engine = _sibling_module('download_engine')
+
+    repo_id = kwargs.get('repo_id')
+    filename = kwargs.get('filename')
+    revision = kwargs.get('revision') or 'main'
+    token = kwargs.get('token')
+    try:
+        from huggingface_hub.constants import ENDPOINT
+    except Exception:
+        ENDPOINT = 'https://huggingface.co'
+    url = f'{ENDPOINT.rstrip("/")}/{repo_id}/resolve/{revision}/{filename}'
+
+    comfy_temp = os.path.join(os.getcwd(), 'temp')
+    os.makedirs(comfy_temp, exist_ok=True)
+    dest_file = os.path.join(kwargs.get('local_dir') or comfy_temp, os.path.basename(filename))
+    headers = {'User-Agent': _BROWSER_USER_AGENT}
+    if with_token and token:
+        headers['Authorization'] = f'Bearer {token}'
+    # http_pool drops the token once a redirect leaves huggingface.co (signed CDN URLs reject it).
+    with http_pool.open_url(url, headers) as response:
+        try:
+            total = int(response.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            total = None
+        counter = _job_progress.counter(total)
+        reader = download_engine.ChunkReader(response)
+        with open(dest_file, 'wb') as f:
+            while True:
+                chunk = reader.read()
+                if not chunk:
+                    break
+                f.write(chunk)
+                _job_progress.add(counter, len(chunk))
+    return dest_file
+
+
+def _hub_download(kwargs: dict, with_token: bool) -> str:
+    from huggingface_hub import hf_hub_download
+
+    if with_token:
+        return hf_hub_download(**kwargs)
+    no_tok_kwargs = kwargs.copy()
+    no_tok_kwargs['token'] = False
+    orig_hf_token = os.environ.pop('HF_TOKEN', None)
+    try:
+        return hf_hub_download(**no_tok_kwargs)
+    finally:
+        if orig_hf_token is not None:
+            os.environ['HF_TOKEN'] = orig_hf_token
+
+
+# Stage 1: huggingface_hub download with token
+# Stage 2: huggingface_hub download without token (handles restricted fine-grained tokens on public repos)
+# Stage 3: manual redirect download with token
+# Stage 4: manual redirect download without token
+FILE_STAGES = (
+    (1, _hub_download, True),
+    (2, _hub_download, False),
+    (3, _manual_download, True),
+    (4, _manual_download, False),
+)
+
+
+def _file_job(kwargs: dict, emit_stage: Callable[[int], None], start_stage: int = 1) -> dict:
+    errors = []
+    for stage, download, with_token in FILE_STAGES:
+        if stage < start_stage:
+            continue
+        emit_stage(stage)
+        try:
+            return {'ok': True, 'path': download(kwargs, with_token), 'stage': stage}
+        except Exception as e:
+            errors.append(f'Stage {stage}: {e}')
+    return {'ok': False, 'error': 'All download stages failed. ' + '. '.join(errors)}
+
+
+def _snapshot_job(kwargs: dict) -> dict:
+    from huggingface_hub import snapshot_download
+
+    try:
+        return {'ok': True, 'path': snapshot_download(**kwargs)}
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+
+
+def _worker_main(argv: list) -> int:
+    # Running as a script puts this package folder first on sys.path; don't let its
+    # modules shadow anything huggingface_hub imports.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or ".") != here]
+
+    use_xet = len(argv) > 1 and argv[1] == '1'
+    _configure_xet(use_xet)
+    # Nobody reads the bars; byte counts still reach _job_progress through update().
+    os.environ.setdefault('HF_HUB_DISABLE_PROGRESS_BARS', '1')
+
+    # Protocol messages own the real stdout; library prints go to stderr.
+    channel = sys.stdout
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+
+    def send(message: dict):
+        with write_lock:
+            channel.write(json.dumps(message) + "\n")
+            channel.flush()
+
+    started = time.time()
+    # The whole point: pay for these imports once per process, not once per file.
+    from huggingface_hub import hf_hub_download, snapshot_download  # noqa: F401
+    _install_progress_hook()
+    send({"type": "ready", "pid": os.getpid(), "import_seconds": time.time() - started})
+
+    for line in iter(sys.stdin.readline, ""):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except Exception:
+            continue
+        job_id = job.get("id")
+        send({"id": job_id, "type": "accepted"})
+        op = job.get("op")
+        kwargs = job.get("kwargs") or {}
+
+        def send_progress(message: dict, job_id=job_id):
+            message["id"] = job_id
+            send(message)
+
+        def begin_stage(stage: int, job_id=job_id):
+            _job_progress.start(send_progress)
+            send({"id": job_id, "type": "stage", "stage": stage})
+
+        _job_progress.start(send_progress)
+        if op == "file":
+            result = _file_job(kwargs, begin_stage, start_stage=int(job.get("start_stage") or 1))
+        elif op == "snapshot":
+            result = _snapshot_job(kwargs)
+        elif op == "ping":
+            result = {'ok': True}
+        else:
+            result = {'ok': False, 'error': f'Unknown job type: {op}'}
+        _job_progress.report(force=True)
+        _job_progress.start(None)
+        result.update({"id": job_id, "type": "result"})
+        send(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_worker_main(sys.argv))
@@ -3095,11 +3095,16 @@ app.registerExtension({
         /* ──────────────── UI Components ──────────────── */
         const showResultsDialog = (data, options = {}) => {
             let pollTimer = null;
+            let unsubscribeStatus = null;
             const stopPolling = () => {
                 if (pollTimer) {
                     clearInterval(pollTimer);
                     pollTimer = null;
                 }
+                if (unsubscribeStatus) {
+                    unsubscribeStatus();
+                    unsubscribeStatus = null;
+                }
             };
 
             const existing = document.getElementById("auto-download-dialog");
@@ -3849,13 +3854,16 @@ app.registerExtension({
                     const statusMap = {};
                     const pending = new Set(downloadIds);
 
-                    const poll = async () => {
+                    const poll = async (pushedDownloads = null) => {
                         if (!downloadIds.length) return;
                         try {
-                            const statusResp = await fetch(`/download_status?ids=${encodeURIComponent(downloadIds.join(","))}`);
-                            if (statusResp.status !== 200) return;
-                            const statusData = await statusResp.json();
-                            const downloads = statusData.downloads || {};
+                            let downloads = pushedDownloads;
+                            if (!downloads) {
+                                const statusResp = await fetch(`/download_status?ids=${encodeURIComponent(downloadIds.join(","))}`);
+                                if (statusResp.status !== 200) return;
+                                const statusData = await statusResp.json();
+                                downloads = statusData.downloads || {};
+                            }
 
                             for (const id of downloadIds) {
                                 const info = downloads[id];
@@ -3902,8 +3910,14 @@ app.registerExtension({
                         }
                     };
 
-                    pollTimer = setInterval(poll, 1000);
-                    poll();
+                    // Follow the status panel's pushed feed; poll only if it isn't loaded.
+                    const subscribeStatus = window.hfDownloader?.subscribeDownloadStatus;
+                    if (typeof subscribeStatus === "function") {
+                        unsubscribeStatus = subscribeStatus((downloads) => poll(downloads));
+                    } else {
+                        pollTimer = setInterval(poll, 1000);
+                        poll();
+                    }
                 } catch (e) {
                     setStatus(`Queue error: ${e}`, "#ff6b6b");
                     downloadBtn.disabled = false;
@@ -3935,11 +3949,16 @@ app.registerExtension({
         const showManualDownloadDialog = () => {
 
             let pollTimer = null;
+            let unsubscribeStatus = null;
             const stopPolling = () => {
                 if (pollTimer) {
                     clearInterval(pollTimer);
                     pollTimer = null;
                 }
+                if (unsubscribeStatus) {
+                    unsubscribeStatus();
+                    unsubscribeStatus = null;
+                }
             };
 
             const existing = document.getElementById("manual-download-dialog");
@@ -4288,12 +4307,15 @@ app.registerExtension({
                     const pending = new Set(downloadIds);
                     let statusErrorToastShown = false;
 
-                    const poll = async () => {
+                    const poll = async (pushedDownloads = null) => {
                         try {
-                            const statusResp = await fetch(`/download_status?ids=${encodeURIComponent(downloadIds.join(","))}`);
-                            if (statusResp.status !== 200) return;
-                            const statusData = await statusResp.json();
-                            const downloads = statusData.downloads || {};
+                            let downloads = pushedDownloads;
+                            if (!downloads) {
+                                const statusResp = await fetch(`/download_status?ids=${encodeURIComponent(downloadIds.join(","))}`);
+                                if (statusResp.status !== 200) return;
+                                const statusData = await statusResp.json();
+                                downloads = statusData.downloads || {};
+                            }
                             statusErrorToastShown = false;
 
                             for (const id of downloadIds) {
@@ -4332,8 +4354,14 @@ app.registerExtension({
                         }
                     };
 
-                    pollTimer = setInterval(poll, 1000);
-                    poll();
+                    // Follow the status panel's pushed feed; poll only if it isn't loaded.
+                    const subscribeStatus = window.hfDownloader?.subscribeDownloadStatus;
+                    if (typeof subscribeStatus === "function") {
+                        unsubscribeStatus = subscribeStatus((downloads) => poll(downloads));
+                    } else {
+                        pollTimer = setInterval(poll, 1000);
+                        poll();
+                    }
                 } catch (e) {
                     showToast({ severity: "error", summary: "Queue error", detail: String(e) });
                     downloadBtn.disabled = false;
@@ -1,4 +1,5 @@
 import { app } from "../../../scripts/app.js";
+import { api } from "../../../scripts/api.js";
 
 app.registerExtension({
     name: "hfDownloaderStatusPanel",
@@ -6,6 +7,10 @@ app.registerExtension({
         const PANEL_ID = "hf-downloader-panel";
         const STYLE_ID = "hf-downloader-panel-styles";
         const POLL_INTERVAL_MS = 1000;
+        // While websocket pushes keep arriving, the ?since= poll only runs as a safety net.
+        const PUSH_FRESH_MS = 5000;
+        const SAFETY_POLL_MS = 10000;
+        const STATUS_EVENT = "hf_downloader_status";
         const FAILED_TTL_MS = 120000;
         const CANCELLED_TTL_MS = 1500;
 
@@ -1346,13 +1351,62 @@ app.registerExtension({
             publishPanelState();
         };
 
-        const pollStatus = async () => {
+        const knownDownloads = {};
+        const statusSubscribers = new Set();
+        let statusVersion = null;
+        let lastPushAt = 0;
+        let lastPollAt = 0;
+        let statusUpdateTimer = null;
+
+        const applyStatusDelta = (data, full) => {
+            if (full) {
+                for (const id of Object.keys(knownDownloads)) {
+                    delete knownDownloads[id];
+                }
+            }
+            Object.assign(knownDownloads, data?.downloads || {});
+            for (const id of data?.removed || []) {
+                delete knownDownloads[id];
+            }
+        };
+
+        const notifyStatusSubscribers = () => {
+            for (const callback of statusSubscribers) {
+                try {
+                    callback(knownDownloads);
+                } catch (e) {
+                    console.warn("[HF Downloader] Download status subscriber failed:", e);
+                }
+            }
+        };
+
+        registerGlobalAction("subscribeDownloadStatus", (callback) => {
+            if (typeof callback !== "function") return () => {};
+            statusSubscribers.add(callback);
+            if (statusVersion !== null) {
+                // Deliver the current snapshot after the caller has stored its unsubscribe handle.
+                setTimeout(() => {
+                    if (statusSubscribers.has(callback)) callback(knownDownloads);
+                }, 0);
+            }
+            return () => statusSubscribers.delete(callback);
+        });
+
+        const fetchStatusDelta = async () => {
+            const since = statusVersion === null ? -1 : statusVersion;
+            const resp = await fetch(`/download_status?since=${since}`);
+            if (resp.status === 304) return true;
+            if (resp.status !== 200) return false;
+            const data = await resp.json();
+            applyStatusDelta(data, Boolean(data.full));
+            statusVersion = data.version;
+            return true;
+        };
+
+        const handleStatusUpdate = async () => {
             try {
-                const resp = await fetch("/download_status");
-                if (resp.status !== 200) return;
-                const data = await resp.json();
-                
-                const downloads = data.downloads || {};
+                const downloads = knownDownloads;
+                notifyStatusSubscribers();
                 const completedPaths = [];
                 for (const [id, info] of Object.entries(downloads)) {
                     if (info && SUCCESS_STATUSES.has(info.status) && !processedDownloadIds.has(id)) {
@@ -1434,10 +1488,42 @@ app.registerExtension({
 
                 renderList(downloads);
             } catch (err) {
-                console.warn("[HF Downloader] Failed to fetch download status:", err);
+                console.warn("[HF Downloader] Failed to update download status:", err);
+            }
+        };
+
+        const scheduleStatusUpdate = () => {
+            if (statusUpdateTimer) return;
+            statusUpdateTimer = setTimeout(() => {
+                statusUpdateTimer = null;
+                handleStatusUpdate();
+            }, 100);
+        };
+
+        const pollStatus = async () => {
+            const nowMs = Date.now();
+            const pushFresh = nowMs - lastPushAt < PUSH_FRESH_MS;
+            if (!pushFresh || nowMs - lastPollAt >= SAFETY_POLL_MS) {
+                lastPollAt = nowMs;
+                try {
+                    if (!(await fetchStatusDelta())) return;
+                } catch (err) {
+                    console.warn("[HF Downloader] Failed to fetch download status:", err);
+                    return;
+                }
             }
+            // Re-render even without changes so expired failed/cancelled rows drop out.
+            await handleStatusUpdate();
         };
 
+        if (api && typeof api.addEventListener === "function") {
+            api.addEventListener(STATUS_EVENT, (event) => {
+                lastPushAt = Date.now();
+                applyStatusDelta(event?.detail, false);
+                scheduleStatusUpdate();
+            });
+        }
+
         publishPanelState();
         pollStatus();
         setInterval(pollStatus, POLL_INTERVAL_MS);
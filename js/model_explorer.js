@@ -1058,6 +1058,10 @@ class ModelExplorerDialog {
                 text-transform: none;
                 font-weight: 600;
             }
+            #hf-model-explorer-dialog .hf-me-tag--corrupt {
+                background: var(--destructive-background, #d24a4a);
+                color: #fff;
+            }
             #hf-model-explorer-dialog .hf-me-actions {
                 display: flex;
                 align-items: center;
@@ -1379,8 +1383,10 @@ class ModelExplorerDialog {
             const resp = await fetch("/hf_downloader_model_explorer_v2/disk_space");
             if (resp.ok) {
                 const spaceData = await resp.json();
-                if (Number.isFinite(spaceData.free)) {
-                    freeSpace = spaceData.free;
+                // "available" leaves out space already promised to running downloads.
+                const availableSpace = Number.isFinite(spaceData.available) ? spaceData.available : spaceData.free;
+                if (Number.isFinite(availableSpace)) {
+                    freeSpace = availableSpace;
                     freeSpaceText = this.formatSizeGb(freeSpace);
                 }
             }
@@ -2414,6 +2420,11 @@ class ModelExplorerDialog {
         if (sizeLabel) {
             tags.push(`<span class="hf-me-tag hf-me-tag--size">${escapeHtml(sizeLabel)}</span>`);
         }
+        if (installed && variant.integrity_problem) {
+            tags.push(
+                `<span class="hf-me-tag hf-me-tag--corrupt" title="${escapeHtml(variant.integrity_problem)}">Corrupt?</span>`
+            );
+        }
 
         const actions = installed
             ? `
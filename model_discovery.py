@@ -4,12 +4,12 @@ import json
 import time
 import ast
 import concurrent.futures
-import urllib.request
 import urllib.error
 from typing import List, Dict, Any, Tuple
 from types import SimpleNamespace
 from huggingface_hub import HfApi
 from .downloader import get_token
+from .http_pool import open_url
 from .parse_link import parse_link
 import folder_paths
 
@@ -358,8 +358,7 @@ def _hf_url_exists(url: str) -> bool:
         req_headers = dict(headers)
         if extra_headers:
             req_headers.update(extra_headers)
-        req = urllib.request.Request(url, method=method, headers=req_headers)
-        with urllib.request.urlopen(req, timeout=HF_URL_CHECK_TIMEOUT) as resp:
+        with open_url(url, req_headers, method=method, timeout=HF_URL_CHECK_TIMEOUT) as resp:
             code = getattr(resp, "status", None) or resp.getcode()
             return 200 <= int(code) < 400
 
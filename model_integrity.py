@@ -0,0 +1,353 @@
+"""
+Header-level integrity checks for .safetensors and .gguf model files.
+
+A SHA256 pass reads every byte, so it is skipped for files without a published
+digest (direct URLs) and for files above HF_DOWNLOADER_SHA_MAX_BYTES. Both
+formats describe their own layout up front, which allows a much cheaper check:
+parse the safetensors JSON header or the GGUF header and tensor table, confirm
+the declared tensor regions cover the file exactly (no truncation, no trailing
+garbage, no overlaps), and spot-check a few pages inside large tensors for the
+zero fill left behind by a preallocated file that was never fully written. The
+zero-page check is sampled, so it catches gross damage rather than proving the
+file intact.
+
+Results are cached per path for as long as the file keeps the same size, mtime,
+device and inode, so the model explorer can ask about every installed file.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return str(value).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+STRUCTURAL_CHECK = _env_flag("HF_DOWNLOADER_STRUCTURAL_CHECK", True)
+# Pages spot-checked for zero fill per file; 0 = header and layout checks only.
+ZERO_SAMPLE_PAGES = _env_int("HF_DOWNLOADER_STRUCTURAL_SAMPLE_PAGES", 16, 0)
+ZERO_PAGE_BYTES = 4096
+# Tensors smaller than this are often legitimately all zero (biases, norms).
+ZERO_MIN_TENSOR_BYTES = 64 * 1024
+SAFETENSORS_MAX_HEADER_BYTES = 100 * 1024 * 1024
+GGUF_MAX_TENSORS = 1 << 20
+GGUF_DEFAULT_ALIGNMENT = 32
+
+CHECKED_EXTENSIONS = (".safetensors", ".gguf")
+
+SAFETENSORS_DTYPE_BYTES = {
+    "F64": 8, "F32": 4, "F16": 2, "BF16": 2,
+    "I64": 8, "I32": 4, "I16": 2, "I8": 1,
+    "U64": 8, "U32": 4, "U16": 2, "U8": 1,
+    "BOOL": 1, "F8_E4M3": 1, "F8_E5M2": 1, "F8_E8M0": 1,
+}
+
+# ggml type id -> (bytes per block, values per block)
+GGML_TYPE_SIZES = {
+    0: (4, 1), 1: (2, 1), 2: (18, 32), 3: (20, 32), 6: (22, 32), 7: (24, 32),
+    8: (34, 32), 9: (36, 32), 10: (84, 256), 11: (110, 256), 12: (144, 256),
+    13: (176, 256), 14: (210, 256), 15: (292, 256), 16: (66, 256), 17: (74, 256),
+    18: (98, 256), 19: (50, 256), 20: (18, 32), 21: (110, 256), 22: (82, 256),
+    23: (136, 256), 24: (1, 1), 25: (2, 1), 26: (4, 1), 27: (8, 1), 28: (8, 1),
+    29: (56, 256), 30: (2, 1), 34: (54, 256), 35: (66, 256),
+}
+
+# GGUF metadata value type -> struct format for fixed-size scalars
+_GGUF_SCALARS = {
+    0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i",
+    6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d",
+}
+_GGUF_STRING = 8
+_GGUF_ARRAY = 9
+
+_results_lock = threading.Lock()
+# normalized path -> (signature, problem or None)
+_results: Dict[str, Tuple[tuple, Optional[str]]] = {}
+_stats = {
+    "checked": 0,
+    "cached": 0,
+    "corrupt": 0,
+    "bytes_sampled": 0,
+}
+
+
+def is_checkable(path: str) -> bool:
+    return path.lower().endswith(CHECKED_EXTENSIONS)
+
+
+def _product(values) -> int:
+    result = 1
+    for value in values:
+        result *= int(value)
+    return result
+
+
+def _align(value: int, alignment: int) -> int:
+    return value + (-value % alignment)
+
+
+def _safetensors_layout(data: mmap.mmap, size: int) -> List[Tuple[int, int]]:
+    """Return absolute (start, end) of every tensor, or raise ValueError."""
+    if size < 8:
+        raise ValueError("file is shorter than the safetensors header length")
+    (header_len,) = struct.unpack_from("<Q", data, 0)
+    if header_len > SAFETENSORS_MAX_HEADER_BYTES or 8 + header_len > size:
+        raise ValueError(f"header length {header_len} does not fit in {size} bytes")
+    try:
+        header = json.loads(bytes(data[8:8 + header_len]).decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"header is not valid JSON ({e})")
+    if not isinstance(header, dict):
+        raise ValueError("header is not a JSON object")
+
+    data_start = 8 + header_len
+    spans = []
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        try:
+            begin, end = (int(v) for v in info["data_offsets"])
+            shape = info["shape"]
+            dtype = info["dtype"]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"tensor {name!r} has a malformed entry")
+        if begin < 0 or end < begin:
+            raise ValueError(f"tensor {name!r} has invalid offsets [{begin}, {end})")
+        item_bytes = SAFETENSORS_DTYPE_BYTES.get(str(dtype))
+        if item_bytes is not None and end - begin != _product(shape) * item_bytes:
+            raise ValueError(f"tensor {name!r} size does not match its shape and dtype")
+        spans.append((data_start + begin, data_start + end))
+
+    spans.sort()
+    position = data_start
+    for start, end in spans:
+        if start != position:
+            kind = "overlap" if start < position else "gap"
+            raise ValueError(f"tensor data has a {kind} at byte {min(start, position)}")
+        position = end
+    if position != size:
+        if position > size:
+            raise ValueError(f"truncated: tensors need {position} bytes, file has {size}")
+        raise ValueError(f"{size - position} unexpected trailing bytes after tensor data")
+    return spans
+
+
+class _GGUFReader:
+    def __init__(self, data: mmap.mmap, size: int, version: int):
+        self.data = data
+        self.size = size
+        self.offset = 8
+        # GGUF v1 used 32-bit counts and lengths.
+        self.count_format = "<I" if version == 1 else "<Q"
+
+    def unpack(self, fmt: str):
+        width = struct.calcsize(fmt)
+        if self.offset + width > self.size:
+            raise ValueError("truncated inside the GGUF header")
+        (value,) = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += width
+        return value
+
+    def count(self) -> int:
+        return self.unpack(self.count_format)
+
+    def string(self) -> str:
+        length = self.count()
+        if self.offset + length > self.size:
+            raise ValueError("truncated inside the GGUF header")
+        value = bytes(self.data[self.offset:self.offset + length])
+        self.offset += length
+        return value.decode("utf-8", errors="replace")
+
+    def value(self, value_type: int):
+        if value_type in _GGUF_SCALARS:
+            return self.unpack(_GGUF_SCALARS[value_type])
+        if value_type == _GGUF_STRING:
+            return self.string()
+        if value_type == _GGUF_ARRAY:
+            item_type = self.unpack("<I")
+            length = self.count()
+            if item_type in _GGUF_SCALARS:
+                width = struct.calcsize(_GGUF_SCALARS[item_type])
+                if self.offset + width * length > self.size:
+                    raise ValueError("truncated inside the GGUF header")
+                self.offset += width * length
+                return None
+            for _ in range(length):
+                self.value(item_type)
+            return None
+        raise ValueError(f"unknown GGUF metadata type {value_type}")
+
+
+def _gguf_layout(data: mmap.mmap, size: int) -> List[Tuple[int, int]]:
+    """Return absolute (start, end) of every tensor, or raise ValueError."""
+    if size < 24 or bytes(data[0:4]) != b"GGUF":
+        raise ValueError("missing GGUF magic")
+    (version,) = struct.unpack_from("<I", data, 4)
+    if version not in (1, 2, 3):
+        raise ValueError(f"unsupported GGUF version {version}")
+    reader = _GGUFReader(data, size, version)
+    tensor_count = reader.count()
+    kv_count = reader.count()
+    if tensor_count > GGUF_MAX_TENSORS:
+        raise ValueError(f"implausible tensor count {tensor_count}")
+
+    alignment = GGUF_DEFAULT_ALIGNMENT
+    for _ in range(kv_count):
+        key = reader.string()
+        value = reader.value(reader.unpack("<I"))
+        if key == "general.alignment" and isinstance(value, int) and value > 0:
+            alignment = value
+
+    tensors = []
+    for _ in range(tensor_count):
+        name = reader.string()
+        n_dims = reader.unpack("<I")
+        if n_dims > 8:
+            raise ValueError(f"tensor {name!r} has {n_dims} dimensions")
+        dims = [reader.count() for _ in range(n_dims)]
+        ggml_type = reader.unpack("<I")
+        offset = reader.unpack("<Q")
+        tensors.append((offset, name, dims, ggml_type))
+
+    data_start = _align(reader.offset, alignment)
+    spans = []
+    exact = True
+    position = 0
+    for offset, name, dims, ggml_type in sorted(tensors):
+        if offset % alignment:
+            raise ValueError(f"tensor {name!r} is not aligned to {alignment} bytes")
+        if offset < position:
+            raise ValueError(f"tensor {name!r} overlaps the previous tensor")
+        if exact and offset - position >= alignment:
+            raise ValueError(f"tensor data has a gap before {name!r}")
+        block = GGML_TYPE_SIZES.get(ggml_type)
+        if block is None:
+            # Unknown quantization: offsets are still checked, exact coverage isn't.
+            exact = False
+            position = offset
+            continue
+        type_bytes, block_values = block
+        values = _product(dims)
+        if values % block_values:
+            raise ValueError(f"tensor {name!r} shape does not fit its block size")
+        end = offset + values // block_values * type_bytes
+        spans.append((data_start + offset, data_start + end))
+        position = end
+
+    data_end = data_start + position
+    if data_end > size:
+        raise ValueError(f"truncated: tensors need {data_end} bytes, file has {size}")
+    if exact and size > _align(data_end, alignment):
+        raise ValueError(f"{size - data_end} unexpected trailing bytes after tensor data")
+    return spans
+
+
+def _zero_page_problem(data: mmap.mmap, spans: List[Tuple[int, int]]) -> Optional[str]:
+    large = [(start, end) for start, end in spans if end - start >= ZERO_MIN_TENSOR_BYTES]
+    if not large or ZERO_SAMPLE_PAGES <= 0:
+        return None
+    total = sum(end - start for start, end in large)
+    step = max(1, total // ZERO_SAMPLE_PAGES)
+    targets = list(range(0, total, step))[:ZERO_SAMPLE_PAGES]
+    # The tail is where an unfinished preallocated file is zero.
+    targets.append(total - 1)
+
+    zero_page = bytes(ZERO_PAGE_BYTES)
+    zero = 0
+    span_index = 0
+    base = 0
+    for target in targets:
+        while target >= base + (large[span_index][1] - large[span_index][0]):
+            base += large[span_index][1] - large[span_index][0]
+            span_index += 1
+        start, end = large[span_index]
+        page_start = min(start + (target - base), end - ZERO_PAGE_BYTES)
+        if data[page_start:page_start + ZERO_PAGE_BYTES] == zero_page:
+            zero += 1
+    with _results_lock:
+        _stats["bytes_sampled"] += len(targets) * ZERO_PAGE_BYTES
+    if zero >= max(2, len(targets) // 2):
+        return f"{zero} of {len(targets)} sampled tensor pages are all zero"
+    return None
+
+
+def _signature(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns, stat.st_dev, stat.st_ino)
+
+
+def _check(path: str, name: str, size: int) -> Optional[str]:
+    if size == 0:
+        return "file is empty"
+    layout = _gguf_layout if name.lower().endswith(".gguf") else _safetensors_layout
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                spans = layout(data, size)
+            except (ValueError, struct.error, OverflowError) as e:
+                return str(e)
+            return _zero_page_problem(data, spans)
+
+
+def structural_problem(path: str, name: Optional[str] = None) -> Optional[str]:
+    """
+    Describe what is wrong with a .safetensors or .gguf file, or return None when
+    its layout is consistent, the format isn't checked, or it can't be read.
+    name picks the format when path is a staging file such as a .part.
+    """
+    name = name or path
+    if not STRUCTURAL_CHECK or not is_checkable(name):
+        return None
+    signature = _signature(path)
+    if signature is None:
+        return None
+    key = os.path.normcase(os.path.abspath(path))
+    with _results_lock:
+        cached = _results.get(key)
+        if cached and cached[0] == signature:
+            _stats["cached"] += 1
+            return cached[1]
+    try:
+        problem = _check(path, name, signature[0])
+    except (OSError, ValueError) as e:
+        print(f"[DEBUG] Structural check could not read {path}: {e}")
+        return None
+    with _results_lock:
+        # Staging files are renamed right after the check; only cache final paths.
+        if name == path:
+            _results[key] = (signature, problem)
+        _stats["checked"] += 1
+        if problem:
+            _stats["corrupt"] += 1
+    if problem:
+        print(f"[DEBUG] Structural check failed for {path}: {problem}")
+    return problem
+
+
+def get_integrity_stats() -> dict:
+    with _results_lock:
+        stats = dict(_stats)
+        stats["enabled"] = STRUCTURAL_CHECK
+        stats["tracked_files"] = len(_results)
+        corrupt = [path for path, (_, problem) in _results.items() if problem]
+    stats["corrupt_files"] = sorted(path for path in corrupt if os.path.exists(path))
+    return stats
@@ -0,0 +1,182 @@
+"""
+Other machines to fetch model files from before going to the internet.
+
+Two kinds of source are tried, in this order, before huggingface.co or a
+direct URL's own host:
+
+- peers (HF_DOWNLOADER_PEERS): other ComfyUI instances running this extension
+  with HF_DOWNLOADER_SERVE_MIRROR=1. They serve the files in their content index
+  by SHA256, and direct-URL downloads by the URL they came from, under
+  MIRROR_ROUTE on the ComfyUI server.
+- HF-compatible mirrors (HF_DOWNLOADER_HF_MIRRORS): endpoints that answer
+  <endpoint>/<repo>/resolve/<revision>/<path> like the Hub does, e.g. a caching
+  proxy in front of huggingface.co. Hub files only; the Hub token is never sent.
+
+A mirrored file is only accepted when its SHA256 matches a digest obtained
+independently of the peer: the Hub's LFS digest for Hub files, or, for direct
+URLs, the digest this instance's content index recorded the last time it
+downloaded that URL. A direct URL with no recorded digest is only fetched from
+peers when HF_DOWNLOADER_MIRROR_TOKEN is set; the peers are then trusted, and
+the digest a peer advertises is accepted for a file whose size matches what
+the original host reports. Bytes of finished files are
+counted per source, so /download_stats shows how much upstream traffic the
+mirrors saved. A source that can't be reached is skipped for
+MIRROR_RETRY_SECONDS instead of costing every download a connect timeout.
+
+Stdlib only, so scripts/bench_transfer.py can import it without ComfyUI.
+"""
+
+import hmac
+import os
+import threading
+import time
+import urllib.parse
+from typing import List, Optional
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return str(value).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_list(name: str) -> List[str]:
+    return [item.strip().rstrip("/") for item in str(os.getenv(name, "")).split(",") if item.strip()]
+
+
+MIRROR_ROUTE = "/hf_downloader/mirror"
+MIRROR_SHA_HEADER = "X-Content-SHA256"
+MIRROR_TOKEN_HEADER = "X-HF-Downloader-Mirror-Token"
+# Serve this instance's indexed models to peers.
+SERVE_MIRROR = _env_flag("HF_DOWNLOADER_SERVE_MIRROR", default=False)
+# Shared secret between peers; required on both sides when set.
+MIRROR_TOKEN = str(os.getenv("HF_DOWNLOADER_MIRROR_TOKEN", "")).strip()
+# ComfyUI base URLs of other instances, e.g. http://10.0.0.5:8188
+MIRROR_PEERS = _env_list("HF_DOWNLOADER_PEERS")
+HF_MIRROR_ENDPOINTS = _env_list("HF_DOWNLOADER_HF_MIRRORS")
+MIRROR_RETRY_SECONDS = 60
+UPSTREAM_SOURCE = "upstream"
+
+_mirror_lock = threading.Lock()
+# source -> bytes of finished files received from it
+_bytes_by_source = {}
+# source -> time.monotonic() until which it is skipped
+_unreachable_until = {}
+_stats = {"hits": 0, "misses": 0, "rejected": 0, "unreachable": 0, "served": 0, "served_bytes": 0}
+
+
+def _request_headers(extra: Optional[dict] = None) -> dict:
+    headers = {
+        "User-Agent": "ComfyUI-HuggingFace-Downloader/1.0",
+        "Accept": "*/*",
+    }
+    headers.update(extra or {})
+    return headers
+
+
+def _peer_headers() -> dict:
+    return _request_headers({MIRROR_TOKEN_HEADER: MIRROR_TOKEN} if MIRROR_TOKEN else None)
+
+
+def _reachable(source: str) -> bool:
+    with _mirror_lock:
+        until = _unreachable_until.get(source)
+        if until is None:
+            return True
+        if time.monotonic() >= until:
+            _unreachable_until.pop(source, None)
+            return True
+        return False
+
+
+def hub_file_candidates(repo_id: str, remote_filename: str, revision: Optional[str], sha256: str) -> List[dict]:
+    """Where a Hub file with this LFS SHA256 might be fetched from, best first."""
+    if not sha256:
+        return []
+    candidates = []
+    for peer in MIRROR_PEERS:
+        candidates.append({
+            "source": f"peer {peer}",
+            "url": f"{peer}{MIRROR_ROUTE}/sha256/{sha256.lower()}",
+            "headers": _peer_headers(),
+        })
+    quoted_revision = urllib.parse.quote(str(revision or "main"), safe="")
+    quoted_path = urllib.parse.quote(remote_filename, safe="/")
+    for endpoint in HF_MIRROR_ENDPOINTS:
+        candidates.append({
+            "source": f"mirror {endpoint}",
+            "url": f"{endpoint}/{repo_id}/resolve/{quoted_revision}/{quoted_path}",
+            "headers": _request_headers(),
+        })
+    return [c for c in candidates if _reachable(c["source"])]
+
+
+def url_candidates(url: str, known_sha: Optional[str] = None) -> List[dict]:
+    """
+    Peers that may hold the file a direct URL produced. Without a known_sha to
+    check against, only peers that share MIRROR_TOKEN are asked.
+    """
+    if not known_sha and not MIRROR_TOKEN:
+        return []
+    query = urllib.parse.urlencode({"url": url})
+    candidates = [
+        {
+            "source": f"peer {peer}",
+            "url": f"{peer}{MIRROR_ROUTE}/url?{query}",
+            "headers": _peer_headers(),
+        }
+        for peer in MIRROR_PEERS
+    ]
+    return [c for c in candidates if _reachable(c["source"])]
+
+
+def note_unreachable(source: str, error) -> None:
+    print(f"[DEBUG] Mirror {source} unreachable, skipping it for {MIRROR_RETRY_SECONDS}s: {error}")
+    with _mirror_lock:
+        _unreachable_until[source] = time.monotonic() + MIRROR_RETRY_SECONDS
+        _stats["unreachable"] += 1
+
+
+def note_result(kind: str) -> None:
+    """Count a mirror lookup: "hits", "misses" or "rejected" (wrong size or SHA256)."""
+    with _mirror_lock:
+        _stats[kind] = _stats.get(kind, 0) + 1
+
+
+def note_bytes(source: str, size: Optional[int]) -> None:
+    """Credit a finished file's bytes to the source it came from (UPSTREAM_SOURCE for the internet)."""
+    if not size:
+        return
+    with _mirror_lock:
+        _bytes_by_source[source] = _bytes_by_source.get(source, 0) + int(size)
+
+
+def note_served(size: int) -> None:
+    """Count a file (or range of one) this instance served to a peer."""
+    with _mirror_lock:
+        _stats["served"] += 1
+        _stats["served_bytes"] += int(size or 0)
+
+
+def is_authorized(headers) -> bool:
+    """Serving side: the request carries the shared mirror token (or none is configured)."""
+    if not MIRROR_TOKEN:
+        return True
+    return hmac.compare_digest(str(headers.get(MIRROR_TOKEN_HEADER, "")), MIRROR_TOKEN)
+
+
+def get_mirror_stats() -> dict:
+    with _mirror_lock:
+        stats = dict(_stats)
+        stats["bytes_by_source"] = dict(_bytes_by_source)
+        stats["unreachable_now"] = sorted(
+            source for source, until in _unreachable_until.items() if until > time.monotonic()
+        )
+    stats["upstream_bytes_avoided"] = sum(
+        size for source, size in stats["bytes_by_source"].items() if source != UPSTREAM_SOURCE
+    )
+    stats["serving"] = SERVE_MIRROR
+    stats["peers"] = list(MIRROR_PEERS)
+    stats["hf_mirrors"] = list(HF_MIRROR_ENDPOINTS)
+    return stats
@@ -0,0 +1,257 @@
+"""
+Process-wide cache for Hugging Face repo metadata.
+
+Several code paths ask the Hub about the same repo within seconds of each other
+(queueing, the download worker, run_download's verification, the model library
+and the backup browser). Results are cached per (repo type, repo, revision) for
+HF_DOWNLOADER_METADATA_TTL seconds, and concurrent requests for the same key
+share one in-flight Hub call instead of each issuing their own.
+
+Single files are looked up with HfApi.get_paths_info, which returns just the
+requested paths; the full sibling listing (repo_info with files_metadata) is
+only fetched for callers that need the whole tree, and once cached it also
+answers single-file lookups.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(str(os.getenv(name, "")).strip())
+    except Exception:
+        return default
+    return value if value >= minimum else default
+
+
+REPO_METADATA_TTL_SECONDS = _env_int("HF_DOWNLOADER_METADATA_TTL", 300, 0)
+REPO_METADATA_MAX_ENTRIES = 512
+# Missing paths are remembered too, but not for as long.
+REPO_METADATA_NEGATIVE_TTL_SECONDS = min(60, REPO_METADATA_TTL_SECONDS)
+
+_cache_lock = threading.Lock()
+_cache = {}
+_inflight = {}
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "errors": 0,
+    "repo_info_calls": 0,
+    "paths_info_calls": 0,
+}
+
+
+class _InflightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _lfs_value(lfs, key: str):
+    if not lfs:
+        return None
+    if isinstance(lfs, dict):
+        return lfs.get(key)
+    return getattr(lfs, key, None)
+
+
+def _file_entry(item) -> Optional[dict]:
+    """Normalize a RepoSibling / RepoFile (object or dict) to {size, sha256, etag}."""
+    def field(name):
+        return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+    size = field("size")
+    blob_id = field("blob_id")
+    lfs = field("lfs")
+    if lfs:
+        sha = _lfs_value(lfs, "sha256") or _lfs_value(lfs, "oid")
+        size = _lfs_value(lfs, "size") or size
+        etag = sha or blob_id
+    else:
+        sha = None
+        etag = blob_id
+    return {"size": size, "sha256": sha, "etag": etag}
+
+
+def _repo_key(repo_id: str, revision: Optional[str], repo_type: str) -> tuple:
+    return (repo_type or "model", str(repo_id or "").strip(), revision or "main")
+
+
+def _get_or_load(key: tuple, loader: Callable[[], object], ttl: float):
+    now = time.time()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > now:
+            _stats["hits"] += 1
+            return cached[1]
+        call = _inflight.get(key)
+        owner = call is None
+        if owner:
+            call = _InflightCall()
+            _inflight[key] = call
+            _stats["misses"] += 1
+        else:
+            _stats["coalesced"] += 1
+
+    if not owner:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    try:
+        call.value = loader()
+        _store(key, call.value, ttl)
+        return call.value
+    except Exception as e:
+        call.error = e
+        with _cache_lock:
+            _stats["errors"] += 1
+        raise
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+
+def _store(key: tuple, value, ttl: float):
+    if ttl <= 0:
+        return
+    with _cache_lock:
+        _cache[key] = (time.time() + ttl, value)
+        if len(_cache) > REPO_METADATA_MAX_ENTRIES:
+            oldest = sorted(_cache, key=lambda k: _cache[k][0])
+            for stale_key in oldest[:len(_cache) - REPO_METADATA_MAX_ENTRIES]:
+                _cache.pop(stale_key, None)
+
+
+def _peek(key: tuple):
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+    return None
+
+
+def get_repo_files_metadata(repo_id: str,
+                            revision: Optional[str] = None,
+                            token: Optional[str] = None,
+                            repo_type: str = "model") -> Dict[str, dict]:
+    """Every file in the repo as {path: {size, sha256, etag}} (one repo_info call per TTL)."""
+    key = ("tree",) + _repo_key(repo_id, revision, repo_type)
+
+    def load():
+        from huggingface_hub import HfApi
+
+        with _cache_lock:
+            _stats["repo_info_calls"] += 1
+        api = HfApi(token=token)
+        try:
+            info = api.repo_info(repo_id, revision=revision, repo_type=repo_type, token=token, files_metadata=True)
+        except TypeError:
+            info = api.repo_info(repo_id, revision=revision, repo_type=repo_type, token=token)
+        files = {}
+        for sibling in getattr(info, "siblings", None) or []:
+            path = sibling.get("rfilename") if isinstance(sibling, dict) else getattr(sibling, "rfilename", None)
+            if path:
+                files[path] = _file_entry(sibling)
+        return files
+
+    return _get_or_load(key, load, REPO_METADATA_TTL_SECONDS)
+
+
+def get_paths_metadata(repo_id: str,
+                       paths: Iterable[str],
+                       revision: Optional[str] = None,
+                       token: Optional[str] = None,
+                       repo_type: str = "model") -> Dict[str, Optional[dict]]:
+    """
+    Metadata for specific paths as {path: {size, sha256, etag} or None if missing}.
+    Served from a cached full listing when there is one; otherwise the uncached
+    paths are fetched together in one get_paths_info call.
+    """
+    paths = [p for p in dict.fromkeys(str(p).strip("/") for p in paths or []) if p]
+    repo_key = _repo_key(repo_id, revision, repo_type)
+    tree = _peek(("tree",) + repo_key)
+    if tree is not None:
+        with _cache_lock:
+            _stats["hits"] += len(paths)
+        return {path: tree.get(path) for path in paths}
+
+    result = {}
+    missing = []
+    for path in paths:
+        cached = _peek(("path",) + repo_key + (path,))
+        if cached is not None:
+            with _cache_lock:
+                _stats["hits"] += 1
+            result[path] = cached.get("entry")
+        else:
+            missing.append(path)
+    if not missing:
+        return result
+
+    # One Hub call for the whole batch, shared with anyone asking for the same batch.
+    batch_key = ("paths",) + repo_key + tuple(sorted(missing))
+
+    def load():
+        from huggingface_hub import HfApi
+
+        with _cache_lock:
+            _stats["paths_info_calls"] += 1
+        api = HfApi(token=token)
+        found = {}
+        for item in api.get_paths_info(repo_id, missing, revision=revision, repo_type=repo_type, token=token):
+            if isinstance(item, dict):
+                path, is_file = item.get("path"), item.get("type") == "file"
+            else:
+                path, is_file = getattr(item, "path", None), hasattr(item, "blob_id")
+            if path and is_file:
+                found[path] = _file_entry(item)
+        for path in missing:
+            entry = found.get(path)
+            ttl = REPO_METADATA_TTL_SECONDS if entry else REPO_METADATA_NEGATIVE_TTL_SECONDS
+            _store(("path",) + repo_key + (path,), {"entry": entry}, ttl)
+        return found
+
+    found = _get_or_load(batch_key, load, 0)
+    for path in missing:
+        result[path] = found.get(path)
+    return result
+
+
+def get_file_metadata(repo_id: str,
+                      path: str,
+                      revision: Optional[str] = None,
+                      token: Optional[str] = None,
+                      repo_type: str = "model") -> Tuple[Optional[int], Optional[str], Optional[str]]:
+    """(size, sha256, etag) for one file; falls back to the full listing if get_paths_info is unavailable."""
+    try:
+        entry = get_paths_metadata(repo_id, [path], revision=revision, token=token, repo_type=repo_type).get(path.strip("/"))
+    except AttributeError:
+        # huggingface_hub without get_paths_info
+        entry = get_repo_files_metadata(repo_id, revision=revision, token=token, repo_type=repo_type).get(path)
+    if not entry:
+        return None, None, None
+    return entry.get("size"), entry.get("sha256"), entry.get("etag")
+
+
+def invalidate_repo_metadata(repo_id: str, repo_type: str = "model") -> None:
+    """Forget everything cached for repo_id (all revisions), e.g. after uploading to it."""
+    repo_id = str(repo_id or "").strip()
+    with _cache_lock:
+        for key in list(_cache):
+            if key[1] == (repo_type or "model") and key[2] == repo_id:
+                _cache.pop(key, None)
+
+
+def get_repo_metadata_stats() -> dict:
+    with _cache_lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_cache)
+    return stats
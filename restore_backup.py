@@ -10,6 +10,11 @@ import argparse
 from pathlib import Path
 from huggingface_hub import HfApi, snapshot_download
 
+try:
+    from file_transfer import finalize_file
+except Exception:
+    finalize_file = None
+
 _GIT_HASH_RE = re.compile(r"^[0-9a-fA-F]{40}$")
 
 def find_comfy_root(start_dir: str = None) -> str:
@@ -337,7 +342,10 @@ def main():
                     if os.path.exists(d_path) and not os.path.islink(d_path):
                         try: os.remove(d_path)
                         except: pass
-                    shutil.copy2(s, d_path)
+                    if finalize_file:
+                        finalize_file(s, d_path, preserve_metadata=True)
+                    else:
+                        shutil.copy2(s, d_path)
             print(f"[restore] Restored directory: {d}")
 
     # Now handle nodes (skip if --only-models)
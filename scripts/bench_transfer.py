@@ -0,0 +1,753 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the download pipeline.
+
+Development utility (not loaded by ComfyUI). Subcommands:
+
+- finalize: time every finalize strategy from file_transfer.py on the host
+  filesystem and print GB/s for each one.
+- worker: per-job startup latency of a fresh `python -c` huggingface_hub
+  subprocess versus a job dispatched to the pooled hub_worker process, then a
+  pooled file job started at stage 3 and 4 (the manual redirect fallback)
+  against a local server.
+- cache-evict: evicting one downloaded file from a synthetic HF cache with
+  scan_cache_dir() + delete_revisions() versus the targeted hf_cache helpers.
+- state: download_status lock hold time and per-update latency for 50
+  concurrent jobs sending progress ticks, comparing the old "rewrite the state
+  JSON on every downloading tick" path with the download_state journal.
+- queue: wall time for a mixed download queue served by a local HTTP stand-in
+  (per-connection bandwidth cap and first-byte latency, several loopback
+  "hosts"), one queue worker versus the download_scheduler pool.
+- leases: several processes ask for the same file in one folder (point --dir
+  at a shared mount to test NFS/CephFS); exactly one downloads it while the
+  others mirror its progress through download_lease. --kill-owner makes the
+  first owner die halfway so a follower has to take over.
+- http: latency of small sequential GETs (the size of URL checks and range
+  pieces' headers) with a new urllib connection per request versus the
+  keep-alive http_pool; pass --url with an https URL to include TLS handshakes.
+- stream: CPU seconds per GB, minor page faults, peak RSS and page-cache growth
+  of one streamed download: the old read() loop versus ChunkReader's readinto,
+  with and without HF_DOWNLOADER_DROP_PAGE_CACHE.
+
+Example:
+    python scripts/bench_transfer.py finalize --size-mb 2048 --src-dir /models --dst-dir /models
+"""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import download_engine  # noqa: E402
+import download_lease  # noqa: E402
+import download_scheduler  # noqa: E402
+import download_state  # noqa: E402
+import file_transfer  # noqa: E402
+import hf_cache  # noqa: E402
+import http_pool  # noqa: E402
+import hub_worker  # noqa: E402
+
+
+def _write_sample(path: str, size_bytes: int) -> None:
+    block = os.urandom(4 * 1024 * 1024)
+    remaining = size_bytes
+    with open(path, "wb") as handle:
+        while remaining > 0:
+            chunk = block[:min(len(block), remaining)]
+            handle.write(chunk)
+            remaining -= len(chunk)
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _time_strategy(strategy: str, src: str, dst: str, sync: bool):
+    if os.path.exists(dst):
+        os.remove(dst)
+    start = time.perf_counter()
+    if strategy == file_transfer.STRATEGY_HARDLINK:
+        os.link(src, dst)
+    elif strategy == "shutil.copyfile":
+        shutil.copyfile(src, dst)
+    else:
+        try:
+            used = file_transfer.copy_file_fast(src, dst, strategies=(strategy,))
+        except OSError as e:
+            if e.errno == errno.ENOTSUP:
+                return None
+            raise
+        if used != strategy:
+            return None
+    if sync:
+        _fsync_path(dst)
+    return time.perf_counter() - start
+
+
+def cmd_finalize(args) -> int:
+    size_bytes = int(args.size_mb) * 1024 * 1024
+    src_dir = tempfile.mkdtemp(prefix="bench_finalize_src_", dir=args.src_dir)
+    dst_dir = src_dir if not args.dst_dir else tempfile.mkdtemp(prefix="bench_finalize_dst_", dir=args.dst_dir)
+    try:
+        src = os.path.join(src_dir, "sample.bin")
+        print(f"[bench] writing {args.size_mb} MiB sample to {src}")
+        _write_sample(src, size_bytes)
+        strategies = [file_transfer.STRATEGY_HARDLINK, *file_transfer.COPY_STRATEGIES, "shutil.copyfile"]
+        print(f"[bench] destination: {dst_dir} (fsync={'on' if args.sync else 'off'}, page cache warm)")
+        print(f"{'strategy':<18}{'best s':>10}{'GB/s':>10}")
+        for strategy in strategies:
+            timings = []
+            for run in range(max(1, args.repeat)):
+                dst = os.path.join(dst_dir, f"copy_{strategy}_{run}.bin")
+                try:
+                    elapsed = _time_strategy(strategy, src, dst, args.sync)
+                except OSError as e:
+                    print(f"{strategy:<18}{'error':>10}  {e}")
+                    timings = []
+                    break
+                finally:
+                    if os.path.exists(dst):
+                        os.remove(dst)
+                if elapsed is None:
+                    break
+                timings.append(elapsed)
+            if not timings:
+                print(f"{strategy:<18}{'n/a':>10}{'':>10}")
+                continue
+            best = min(timings)
+            rate = (size_bytes / best) / 1e9 if best > 0 else float("inf")
+            print(f"{strategy:<18}{best:>10.3f}{rate:>10.2f}")
+    finally:
+        shutil.rmtree(src_dir, ignore_errors=True)
+        if dst_dir != src_dir:
+            shutil.rmtree(dst_dir, ignore_errors=True)
+    return 0
+
+
+def cmd_worker(args) -> int:
+    import subprocess
+
+    spawn_ms = []
+    for _ in range(max(1, args.jobs_cold)):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", "from huggingface_hub import hf_hub_download, snapshot_download"],
+            check=True,
+        )
+        spawn_ms.append((time.perf_counter() - start) * 1000.0)
+
+    # The manual fallback (stages 3-4) builds its URL from huggingface_hub's endpoint,
+    # which the worker reads at startup; point it at a local server before the first job.
+    server = _start_throttled_server("127.0.0.1", 1024 * 1024 * 1024, 0)
+    host, port = server.server_address[:2]
+    os.environ["HF_ENDPOINT"] = f"http://{host}:{port}"
+
+    start = time.perf_counter()
+    hub_worker.run_hub_job("ping", {}, use_xet=False)
+    first_ms = (time.perf_counter() - start) * 1000.0
+    pooled_ms = []
+    for _ in range(max(1, args.jobs)):
+        start = time.perf_counter()
+        result = hub_worker.run_hub_job("ping", {}, use_xet=False)
+        if not result.get("ok"):
+            print(f"[bench] worker job failed: {result.get('error')}")
+            return 1
+        pooled_ms.append((time.perf_counter() - start) * 1000.0)
+
+    # Repo id "<size>/bench" makes the local server answer with <size> bytes.
+    manual_size = 1024 * 1024
+    target_dir = tempfile.mkdtemp(prefix="bench_worker_")
+    try:
+        for stage in (3, 4):
+            result = hub_worker.run_hub_job(
+                "file",
+                {"repo_id": f"{manual_size}/bench", "filename": "manual.bin", "local_dir": target_dir, "token": "bench"},
+                use_xet=False,
+                start_stage=stage,
+            )
+            size = os.path.getsize(result["path"]) if result.get("ok") else None
+            if result.get("stage") != stage or size != manual_size:
+                print(f"[bench] manual fallback stage {stage} failed: {result.get('error') or result}")
+                return 1
+            print(f"[bench] manual fallback stage {stage}: ok ({size} bytes)")
+    finally:
+        hub_worker.shutdown_hub_workers()
+        server.shutdown()
+        shutil.rmtree(target_dir, ignore_errors=True)
+
+    pooled_ms.sort()
+    print(f"{'mode':<28}{'median ms':>12}{'max ms':>10}")
+    print(f"{'subprocess per job':<28}{sorted(spawn_ms)[len(spawn_ms) // 2]:>12.1f}{max(spawn_ms):>10.1f}")
+    print(f"{'pooled worker (first job)':<28}{first_ms:>12.1f}{first_ms:>10.1f}")
+    print(f"{'pooled worker':<28}{pooled_ms[len(pooled_ms) // 2]:>12.2f}{pooled_ms[-1]:>10.2f}")
+    print(f"[bench] {hub_worker.get_hub_worker_stats()}")
+    return 0
+
+
+def _build_fake_cache(cache_dir: str, repos: int, files_per_repo: int) -> list:
+    """Lay out repos the way huggingface_hub does; returns one snapshot file path per repo."""
+    targets = []
+    for r in range(repos):
+        repo_dir = os.path.join(cache_dir, f"models--bench--repo{r}")
+        commit = f"{r:040x}"
+        snapshot_dir = os.path.join(repo_dir, "snapshots", commit)
+        os.makedirs(os.path.join(repo_dir, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(repo_dir, "refs"), exist_ok=True)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with open(os.path.join(repo_dir, "refs", "main"), "w", encoding="utf-8") as f:
+            f.write(commit)
+        for i in range(files_per_repo):
+            etag = f"{r:08x}{i:056x}"
+            with open(os.path.join(repo_dir, "blobs", etag), "wb") as f:
+                f.write(b"x" * 64)
+            link = os.path.join(snapshot_dir, f"file{i}.bin")
+            os.symlink(os.path.join("..", "..", "blobs", etag), link)
+        targets.append(os.path.join(snapshot_dir, "file0.bin"))
+    return targets
+
+
+def _evict_by_scan(cache_dir: str, path: str) -> None:
+    """The old clear_cache_for_path: scan the whole cache, delete the matching revision."""
+    from huggingface_hub import scan_cache_dir
+
+    cache_info = scan_cache_dir(cache_dir)
+    for repo in cache_info.repos:
+        for revision in repo.revisions:
+            if str(revision.snapshot_path) == path or any(str(f.file_path) == path for f in revision.files):
+                cache_info.delete_revisions(revision.commit_hash).execute()
+                return
+
+
+def cmd_cache_evict(args) -> int:
+    cache_dir = tempfile.mkdtemp(prefix="bench_hf_cache_", dir=args.dir)
+    try:
+        print(f"[bench] building {args.repos} repos x {args.files} files in {cache_dir}")
+        targets = _build_fake_cache(cache_dir, args.repos, args.files)
+        evictions = max(1, min(args.evictions, len(targets) // 2))
+        modes = [("targeted", lambda p: hf_cache.evict_cache_path(p, cache_dir))]
+        try:
+            import huggingface_hub  # noqa: F401
+            modes.insert(0, ("scan_cache_dir", lambda p: _evict_by_scan(cache_dir, p)))
+        except ImportError:
+            print("[bench] huggingface_hub not installed, skipping scan_cache_dir")
+        print(f"{'mode':<18}{'median ms':>12}{'max ms':>10}")
+        for index, (name, evict) in enumerate(modes):
+            timings = []
+            for path in targets[index * evictions:(index + 1) * evictions]:
+                start = time.perf_counter()
+                evict(path)
+                timings.append((time.perf_counter() - start) * 1000.0)
+                if os.path.lexists(path):
+                    print(f"[bench] {name} left {path} behind")
+                    return 1
+            timings.sort()
+            print(f"{name:<18}{timings[len(timings) // 2]:>12.3f}{timings[-1]:>10.3f}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return 0
+
+
+def _start_throttled_server(host: str, bytes_per_second: int, latency_ms: int):
+    """HTTP server answering /<size>/<name> with <size> bytes at a capped per-connection rate."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    block = b"\0" * (256 * 1024)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; with Nagle on, a keep-alive client waits for delayed ACKs.
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            try:
+                size = int(self.path.strip("/").split("/")[0])
+            except ValueError:
+                self.send_error(404)
+                return
+            time.sleep(latency_ms / 1000.0)
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            self.send_header("ETag", f'"{size}"')
+            self.end_headers()
+            start = time.perf_counter()
+            sent = 0
+            while sent < size:
+                chunk = block[:min(len(block), size - sent)]
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                ahead = sent / bytes_per_second - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    server = ThreadingHTTPServer((host, 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _fetch_to_dir(url: str, target_dir: str, name: str) -> int:
+    response, probe = download_engine.probe_url(url, {})
+    with response:
+        partial = download_engine.PartialDownload.open(download_engine.partial_path_for(target_dir, name), url, probe)
+        progress = download_engine.TransferProgress(probe.get("total_bytes"))
+        written = download_engine.download_to_file(url, partial, {}, response, probe, progress)
+    partial.discard()
+    return written
+
+
+def _run_queue(items: list, workers: int, limits: dict, target_dir: str) -> float:
+    import threading
+
+    queue = [dict(item) for item in items]
+    queue_lock = threading.Lock()
+    done = threading.Semaphore(0)
+    running = [True]
+    scheduler = download_scheduler.DownloadScheduler(
+        queue, queue_lock, lambda item: [("host", item["host"])], limits,
+    )
+
+    def handle(item):
+        try:
+            _fetch_to_dir(item["url"], target_dir, item["name"])
+        finally:
+            done.release()
+
+    start = time.perf_counter()
+    download_scheduler.run_workers(scheduler, handle, workers, lambda: running[0], idle_sleep=0.01)
+    for _ in items:
+        done.acquire()
+    elapsed = time.perf_counter() - start
+    running[0] = False
+    return elapsed
+
+
+def cmd_queue(args) -> int:
+    rate = int(args.mbps * 1024 * 1024)
+    servers = [_start_throttled_server(f"127.0.0.{index + 1}", rate, args.latency_ms) for index in range(args.hosts)]
+    # A few large files plus many small ones, spread round-robin over the hosts.
+    sizes = [args.large_mb * 1024 * 1024] * args.large + [
+        (1 + index % 4) * 1024 * 1024 for index in range(args.small)
+    ]
+    items = []
+    for index, size in enumerate(sizes):
+        host, port = servers[index % len(servers)].server_address[:2]
+        items.append({"url": f"http://{host}:{port}/{size}/file{index}.bin", "host": host, "name": f"file{index}.bin"})
+    total_mb = sum(sizes) / (1024 * 1024)
+    print(
+        f"[bench] {len(items)} files ({total_mb:.0f} MiB) over {len(servers)} hosts, "
+        f"{args.mbps:g} MiB/s per connection, {args.latency_ms} ms first-byte latency"
+    )
+    target_dir = tempfile.mkdtemp(prefix="bench_queue_", dir=args.dir)
+    try:
+        print(f"{'mode':<34}{'wall s':>10}{'MiB/s':>10}")
+        limits = {"host": args.per_host}
+        for label, workers, mode_limits in (
+            ("sequential (1 worker)", 1, {}),
+            (f"pool ({args.workers} workers, {args.per_host}/host)", args.workers, limits),
+        ):
+            elapsed = _run_queue(items, workers, mode_limits, target_dir)
+            print(f"{label:<34}{elapsed:>10.2f}{total_mb / elapsed:>10.1f}")
+    finally:
+        shutil.rmtree(target_dir, ignore_errors=True)
+        for server in servers:
+            server.shutdown()
+    return 0
+
+
+_ACTIVE_STATES = ("queued", "downloading", "copying", "cleaning_cache", "finalizing")
+
+
+def _simulate_status_updates(mode: str, jobs: int, ticks: int, tick_hz: float, state_dir: str) -> dict:
+    """Drive jobs threads through queued -> downloading (ticks) -> completed against one status dict."""
+    import threading
+
+    status = {}
+    status_lock = threading.Lock()
+    holds = []
+    calls = []
+    holds_lock = threading.Lock()
+    failed_writes = [0]
+    legacy_path = os.path.join(state_dir, "hf_download_queue.json")
+    store = download_state.DownloadStateStore(os.path.join(state_dir, "hf_download_journal.jsonl"))
+
+    def persist_legacy():
+        # Pre-journal _persist_download_state: snapshot every active job under the lock, rewrite the file.
+        start = time.perf_counter()
+        with status_lock:
+            items = [dict(info, download_id=did) for did, info in status.items() if info.get("status") in _ACTIVE_STATES]
+            held = time.perf_counter() - start
+        tmp_path = legacy_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"version": 1, "saved_at": time.time(), "items": items}, f)
+            os.replace(tmp_path, legacy_path)
+        except OSError:
+            # Concurrent writers share one tmp path; the original logged and dropped these.
+            with holds_lock:
+                failed_writes[0] += 1
+        return held
+
+    def set_status(did, fields):
+        start = time.perf_counter()
+        with status_lock:
+            entry = status.setdefault(did, {})
+            previous = entry.get("status")
+            entry.update(fields)
+            record = {k: entry.get(k) for k in ("status", "retry_payload", "folder", "filename")}
+            held = time.perf_counter() - start
+        if mode == "legacy":
+            if fields.get("status") in ("queued", "downloading", "completed"):
+                held += persist_legacy()
+        elif fields.get("status") != previous:
+            if fields["status"] in _ACTIVE_STATES:
+                store.put(did, record)
+            else:
+                store.delete(did)
+        elapsed = time.perf_counter() - start
+        with holds_lock:
+            holds.append(held)
+            calls.append(elapsed)
+
+    def job(index):
+        did = f"dl_{index}"
+        payload = {"url": f"https://huggingface.co/org/repo{index}/resolve/main/model.safetensors", "folder": "checkpoints"}
+        set_status(did, {"status": "queued", "retry_payload": payload, "folder": "checkpoints", "filename": f"m{index}"})
+        set_status(did, {"status": "downloading", "started_at": time.time()})
+        for tick in range(ticks):
+            set_status(did, {"status": "downloading", "downloaded_bytes": tick * 1024 * 1024, "speed_bps": 1e8})
+            time.sleep(1.0 / tick_hz)
+        set_status(did, {"status": "completed", "finished_at": time.time()})
+
+    threads = [threading.Thread(target=job, args=(i,)) for i in range(jobs)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    store.close()
+    holds.sort()
+    calls.sort()
+    return {
+        "wall": wall,
+        "updates": len(calls),
+        "hold_p50": holds[len(holds) // 2] * 1e6,
+        "hold_p99": holds[int(len(holds) * 0.99)] * 1e6,
+        "call_p99": calls[int(len(calls) * 0.99)] * 1e6,
+        "call_max": calls[-1] * 1e6,
+        "writes": store.stats()["appends"] if mode != "legacy" else None,
+        "failed_writes": failed_writes[0],
+    }
+
+
+def cmd_state(args) -> int:
+    print(f"[bench] {args.jobs} jobs x {args.ticks} progress ticks at {args.hz:g} Hz")
+    print(
+        f"{'mode':<10}{'updates':>9}{'hold p50 us':>13}{'hold p99 us':>13}"
+        f"{'call p99 us':>13}{'call max us':>13}{'writes':>9}{'failed':>8}"
+    )
+    for mode in ("legacy", "journal"):
+        state_dir = tempfile.mkdtemp(prefix="bench_state_", dir=args.dir)
+        try:
+            r = _simulate_status_updates(mode, args.jobs, args.ticks, args.hz, state_dir)
+        finally:
+            shutil.rmtree(state_dir, ignore_errors=True)
+        # Every legacy update (queued, downloading ticks, completed) rewrote the state file.
+        writes = r["updates"] if mode == "legacy" else r["writes"]
+        print(
+            f"{mode:<10}{r['updates']:>9}{r['hold_p50']:>13.1f}{r['hold_p99']:>13.1f}"
+            f"{r['call_p99']:>13.1f}{r['call_max']:>13.1f}{writes:>9}{r['failed_writes']:>8}"
+        )
+    return 0
+
+
+def _lease_process(index: int, target_dir: str, size_bytes: int, bytes_per_second: float,
+                   kill_owner: bool, results) -> None:
+    """One 'ComfyUI instance': claim the file, then download it (simulated) or follow the owner."""
+    dest_path = os.path.join(target_dir, "model.safetensors")
+    mirrored = []
+    started = time.perf_counter()
+    lease, finished_by = download_lease.claim_download(
+        dest_path, on_progress=lambda record: mirrored.append(record.get("downloaded_bytes") or 0)
+    )
+    downloaded = False
+    if finished_by is None:
+        part_path = download_engine.partial_path_for(target_dir, "model.safetensors")
+        chunk = b"\0" * (1024 * 1024)
+        written = 0
+        with open(part_path, "wb") as handle:
+            while written < size_bytes:
+                if kill_owner and written >= size_bytes // 2 and not os.path.exists(dest_path + ".killed"):
+                    open(dest_path + ".killed", "w").close()
+                    os._exit(1)
+                handle.write(chunk)
+                written += len(chunk)
+                lease.update({"downloaded_bytes": written, "total_bytes": size_bytes, "phase": "downloading"})
+                time.sleep(len(chunk) / bytes_per_second)
+        os.replace(part_path, dest_path)
+        lease.release()
+        downloaded = True
+    results.put({
+        "index": index,
+        "downloaded": downloaded,
+        "mirrored": len(mirrored),
+        "mirrored_max": max(mirrored or [0]),
+        "wall": time.perf_counter() - started,
+        "stats": download_lease.get_download_lease_stats(),
+    })
+
+
+def cmd_leases(args) -> int:
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    target_dir = tempfile.mkdtemp(prefix="bench_leases_", dir=args.dir)
+    size_bytes = args.size_mb * 1024 * 1024
+    results = context.Queue()
+    print(
+        f"[bench] {args.processes} processes want one {args.size_mb} MiB file at {args.mbps:g} MiB/s "
+        f"in {target_dir}{' (first owner dies halfway)' if args.kill_owner else ''}"
+    )
+    try:
+        processes = [
+            context.Process(
+                target=_lease_process,
+                args=(i, target_dir, size_bytes, args.mbps * 1024 * 1024, args.kill_owner, results),
+            )
+            for i in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        reports = []
+        for process in processes:
+            process.join()
+        while not results.empty():
+            reports.append(results.get())
+        final_size = os.path.getsize(os.path.join(target_dir, "model.safetensors"))
+    finally:
+        shutil.rmtree(target_dir, ignore_errors=True)
+    reports.sort(key=lambda r: r["index"])
+    print(f"{'proc':<6}{'role':<10}{'mirrored':>10}{'last MiB':>10}{'wall s':>9}{'took over':>11}")
+    for r in reports:
+        role = "owner" if r["downloaded"] else "follower"
+        print(
+            f"{r['index']:<6}{role:<10}{r['mirrored']:>10}{r['mirrored_max'] / 2 ** 20:>10.0f}"
+            f"{r['wall']:>9.1f}{r['stats']['taken_over']:>11}"
+        )
+    owners = sum(1 for r in reports if r["downloaded"])
+    print(
+        f"[bench] {owners} download(s), {len(reports) - owners} follower(s), "
+        f"{args.processes - len(reports)} killed, final size {final_size / 2 ** 20:.0f} MiB"
+    )
+    return 0 if owners == 1 and final_size == size_bytes else 1
+
+
+def _time_requests(open_once, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        with open_once() as response:
+            response.read()
+    return (time.perf_counter() - start) / count
+
+
+def cmd_http(args) -> int:
+    import urllib.request
+
+    server = None
+    url = args.url
+    if not url:
+        server = _start_throttled_server("127.0.0.1", 1024 * 1024 * 1024, args.latency_ms)
+        host, port = server.server_address[:2]
+        url = f"http://{host}:{port}/{args.size_bytes}/check.bin"
+    headers = {"User-Agent": "ComfyUI-HuggingFace-Downloader/1.0", "Range": f"bytes=0-{args.size_bytes - 1}"}
+    print(f"[bench] {args.requests} sequential small GETs to {url}")
+    try:
+        fresh = _time_requests(
+            lambda: urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30), args.requests,
+        )
+        http_pool.close_idle_connections()
+        pooled = _time_requests(lambda: http_pool.open_url(url, headers, timeout=30), args.requests)
+    finally:
+        if server is not None:
+            server.shutdown()
+    print(f"{'mode':<28}{'ms/request':>12}")
+    print(f"{'urllib (new connection)':<28}{fresh * 1000:>12.2f}")
+    print(f"{'http_pool (keep-alive)':<28}{pooled * 1000:>12.2f}")
+    print(f"[bench] pool stats: {json.dumps(http_pool.get_http_pool_stats())}")
+    return 0
+
+
+def _stream_process(mode: str, url: str, target_dir: str, results) -> None:
+    import resource
+
+    if mode == "readinto + fadvise":
+        download_engine.DROP_PAGE_CACHE = hasattr(os, "posix_fadvise")
+    path = os.path.join(target_dir, f"stream_{mode.split()[0]}.bin")
+    cached_before = _meminfo_mib("Cached")
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    response, probe = download_engine.probe_url(url, {})
+    with response:
+        partial = download_engine.PartialDownload(path, url, probe.get("total_bytes"), "")
+        progress = download_engine.TransferProgress(probe.get("total_bytes"))
+        if mode == "read() loop":
+            # The loop before ChunkReader: one new bytes object per chunk.
+            position = 0
+            with open(path, "wb") as out:
+                while True:
+                    chunk = response.read(download_engine.READ_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    partial.mark(position, position + len(chunk) - 1, chunk)
+                    position += len(chunk)
+                    progress.add(len(chunk))
+                    progress.maybe_emit()
+            written = position
+        else:
+            written = download_engine.stream_response(response, partial, progress)
+    partial.sha256(written)
+    elapsed = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cached_after = _meminfo_mib("Cached")
+    os.remove(path)
+    cpu = (usage.ru_utime - usage_before.ru_utime) + (usage.ru_stime - usage_before.ru_stime)
+    results.put({
+        "mode": mode,
+        "gb": written / 1024 ** 3,
+        "wall": elapsed,
+        "cpu": cpu,
+        "minflt": usage.ru_minflt - usage_before.ru_minflt,
+        # ru_maxrss is KiB on Linux, bytes on macOS.
+        "maxrss_mib": usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+        "cache_mib": None if cached_before is None else cached_after - cached_before,
+    })
+
+
+def _meminfo_mib(field: str):
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def cmd_stream(args) -> int:
+    import multiprocessing
+
+    server = _start_throttled_server("127.0.0.1", 64 * 1024 * 1024 * 1024, 0)
+    host, port = server.server_address[:2]
+    url = f"http://{host}:{port}/{args.size_mb * 1024 * 1024}/stream.bin"
+    target_dir = tempfile.mkdtemp(prefix="bench_stream_", dir=args.dir)
+    context = multiprocessing.get_context("spawn")
+    print(f"[bench] single-stream download of {args.size_mb} MiB from a local server into {target_dir}")
+    print(f"{'mode':<22}{'wall s':>8}{'CPU s/GB':>10}{'minor faults':>14}{'max RSS MiB':>13}{'+cache MiB':>12}")
+    try:
+        for mode in ("read() loop", "readinto", "readinto + fadvise"):
+            results = context.Queue()
+            process = context.Process(target=_stream_process, args=(mode, url, target_dir, results))
+            process.start()
+            report = results.get()
+            process.join()
+            cache = "n/a" if report["cache_mib"] is None else f"{report['cache_mib']:.0f}"
+            print(
+                f"{mode:<22}{report['wall']:>8.2f}{report['cpu'] / max(report['gb'], 1e-9):>10.2f}"
+                f"{report['minflt']:>14}{report['maxrss_mib']:>13.0f}{cache:>12}"
+            )
+    finally:
+        server.shutdown()
+        shutil.rmtree(target_dir, ignore_errors=True)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    finalize = sub.add_parser("finalize", help="GB/s per finalize strategy")
+    finalize.add_argument("--size-mb", type=int, default=1024)
+    finalize.add_argument("--repeat", type=int, default=3)
+    finalize.add_argument("--src-dir", default=None, help="Directory for the sample file (default: system temp)")
+    finalize.add_argument("--dst-dir", default=None, help="Copy target directory (default: same as --src-dir)")
+    finalize.add_argument("--sync", action="store_true", help="fsync each copy before stopping the clock")
+    finalize.set_defaults(func=cmd_finalize)
+
+    worker = sub.add_parser("worker", help="Per-job startup latency of hub download workers")
+    worker.add_argument("--jobs", type=int, default=200, help="Jobs sent to the pooled worker")
+    worker.add_argument("--jobs-cold", type=int, default=5, help="Fresh subprocesses to time")
+    worker.set_defaults(func=cmd_worker)
+
+    cache_evict = sub.add_parser("cache-evict", help="HF cache eviction: full scan vs targeted")
+    cache_evict.add_argument("--repos", type=int, default=2000, help="Repos in the synthetic cache")
+    cache_evict.add_argument("--files", type=int, default=5, help="Files per repo")
+    cache_evict.add_argument("--evictions", type=int, default=5, help="Evictions timed per mode")
+    cache_evict.add_argument("--dir", default=None, help="Where to build the cache (default: system temp)")
+    cache_evict.set_defaults(func=cmd_cache_evict)
+
+    state = sub.add_parser("state", help="Status lock hold time: JSON rewrite per tick vs journal")
+    state.add_argument("--jobs", type=int, default=50)
+    state.add_argument("--ticks", type=int, default=40, help="Progress updates per job")
+    state.add_argument("--hz", type=float, default=4.0, help="Progress updates per second per job")
+    state.add_argument("--dir", default=None, help="State directory (default: system temp)")
+    state.set_defaults(func=cmd_state)
+
+    queue = sub.add_parser("queue", help="Mixed download queue: sequential vs scheduler pool")
+    queue.add_argument("--workers", type=int, default=download_scheduler.DOWNLOAD_WORKERS)
+    queue.add_argument("--per-host", type=int, default=download_scheduler.DOWNLOAD_PER_HOST_LIMIT)
+    queue.add_argument("--hosts", type=int, default=3, help="Loopback hosts (127.0.0.N)")
+    queue.add_argument("--large", type=int, default=2, help="Number of large files")
+    queue.add_argument("--large-mb", type=int, default=32)
+    queue.add_argument("--small", type=int, default=13, help="Number of 1-4 MiB files")
+    queue.add_argument("--mbps", type=float, default=16.0, help="Per-connection server bandwidth in MiB/s")
+    queue.add_argument("--latency-ms", type=int, default=200, help="Server first-byte latency")
+    queue.add_argument("--dir", default=None, help="Download directory (default: system temp)")
+    queue.set_defaults(func=cmd_queue)
+
+    leases = sub.add_parser("leases", help="Several processes, one file: download once, follow elsewhere")
+    leases.add_argument("--processes", type=int, default=4)
+    leases.add_argument("--size-mb", type=int, default=64)
+    leases.add_argument("--mbps", type=float, default=16.0, help="Simulated download speed in MiB/s")
+    leases.add_argument("--kill-owner", action="store_true", help="First owner exits halfway without releasing")
+    leases.add_argument("--dir", default=None, help="Shared folder to coordinate in (default: system temp)")
+    leases.set_defaults(func=cmd_leases)
+
+    http = sub.add_parser("http", help="Small request latency: new connection per request vs http_pool")
+    http.add_argument("--requests", type=int, default=200)
+    http.add_argument("--size-bytes", type=int, default=1024, help="Bytes per response")
+    http.add_argument("--latency-ms", type=int, default=0, help="First-byte latency of the local server")
+    http.add_argument("--url", default=None, help="Time a real URL instead (e.g. an https Hub file) to include TLS")
+    http.set_defaults(func=cmd_http)
+
+    stream = sub.add_parser("stream", help="CPU, page faults, RSS and page cache per GB of a streamed download")
+    stream.add_argument("--size-mb", type=int, default=2048)
+    stream.add_argument("--dir", default=None, help="Download directory (default: system temp)")
+    stream.set_defaults(func=cmd_stream)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
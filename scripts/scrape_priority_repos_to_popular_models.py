@@ -21,7 +21,6 @@ import sys
 import time
 import urllib.error
 import urllib.parse
-import urllib.request
 from pathlib import Path
 from typing import Dict, Iterable, Tuple
 
@@ -42,6 +41,10 @@ except Exception:
         lightx2v_should_use_subfolder,
     )
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import http_pool  # noqa: E402
+
 PRIORITY_AUTHORS = [
     "Kijai",
     "comfyanonymous",
@@ -147,9 +150,8 @@ def request_json(
 
     backoff = 1.0
     for attempt in range(1, retries + 1):
-        req = urllib.request.Request(url, headers=headers)
         try:
-            with urllib.request.urlopen(req, timeout=timeout) as resp:
+            with http_pool.open_url(url, headers, timeout=timeout) as resp:
                 payload = resp.read()
                 data = json.loads(payload.decode("utf-8"))
                 response_headers = {k.lower(): v for k, v in resp.headers.items()}
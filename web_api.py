@@ -26,10 +26,42 @@ from .model_discovery import process_workflow_for_missing_models, SearchCancelle
 from .downloader import (
     run_download,
     run_download_folder,
+    run_download_shard_set,
     run_download_url,
+    find_shard_set,
+    shard_set_key,
     get_remote_file_metadata,
-    get_blob_paths,
     get_token,
+    HF_STAGE_DIR_SUFFIX,
+    _env_flag,
+    _env_int,
+)
+from .download_engine import PARTIAL_MAX_AGE_SECONDS, PARTIAL_SIDECAR_SUFFIX, is_resumable_partial, rate_limiter
+from .access_cache import get_access_cache_stats
+from .repo_metadata import get_paths_metadata, get_repo_metadata_stats
+from .hub_worker import get_hub_worker_stats
+from .download_state import DownloadStateStore
+from .disk_space import InsufficientDiskSpaceError, get_disk_space_stats, reserved_bytes
+from .content_index import find_file, get_content_index_stats, index_files, sha_for_source
+from .model_integrity import get_integrity_stats, is_checkable, structural_problem
+from .http_pool import get_http_pool_stats
+from .peer_mirror import (
+    MIRROR_ROUTE,
+    MIRROR_SHA_HEADER,
+    SERVE_MIRROR,
+    get_mirror_stats,
+    is_authorized,
+    note_served,
+)
+from .download_lease import active_lease_names, get_download_lease_stats
+from .download_scheduler import (
+    DOWNLOAD_PER_HOST_LIMIT,
+    DOWNLOAD_PER_REPO_LIMIT,
+    DOWNLOAD_WORKERS,
+    VERIFY_PER_DEVICE_LIMIT,
+    VERIFY_WORKERS,
+    DownloadScheduler,
+    run_workers,
 )
 from .parse_link import parse_link
 try:
@@ -41,6 +73,18 @@ download_queue = []
 download_queue_lock = threading.Lock()
 download_status = {}
 download_status_lock = threading.Lock()
+# Every change to download_status bumps the version; clients pass it back as ?since= to get only deltas.
+download_status_version = 0
+download_status_versions = {}
+download_status_removed = {}
+download_status_removed_floor = 0
+DOWNLOAD_STATUS_REMOVED_KEEP = 1000
+# Progress for one job is pushed over the websocket at most this often; status changes always go out.
+DOWNLOAD_STATUS_PUSH_INTERVAL_SECONDS = 0.5
+DOWNLOAD_STATUS_EVENT = "hf_downloader_status"
+download_status_push_times = {}
+# A job that only fits once running downloads finish waits in the queue and is retried this often.
+DISK_SPACE_RECHECK_SECONDS = 15
 download_worker_running = False
 search_status = {}
 search_status_lock = threading.Lock()
@@ -484,20 +528,10 @@ settings_cache_lock = threading.Lock()
 MODEL_LIBRARY_LOCAL_CACHE_TTL_SECONDS = 3.0
 MODEL_EXPLORER_LOCAL_CACHE_TTL_SECONDS = 30.0
 
-# Defer verification until the download queue is empty (default on).
+# Hand finished downloads to the verification workers instead of hashing them on the download worker (default on).
 VERIFY_AFTER_QUEUE = True
-# Minimum idle time before running deferred verification.
-VERIFY_IDLE_SECONDS = 5
-last_queue_activity = 0.0
-last_queue_activity_lock = threading.Lock()
 HF_REPO_URL_PATTERN = re.compile(r"https?://huggingface\.co/([A-Za-z0-9][A-Za-z0-9._-]*/[A-Za-z0-9][A-Za-z0-9._-]*)")
 
-def _touch_queue_activity():
-    global last_queue_activity
-    with last_queue_activity_lock:
-        last_queue_activity = time.time()
-
-
 def _extract_repo_id_from_error(message: str) -> str:
     text = str(message or "")
     match = HF_REPO_URL_PATTERN.search(text)
@@ -541,6 +575,8 @@ def _build_retry_payload(item: dict) -> dict:
         url = str(item.get("url") or "").strip()
         if url:
             payload["url"] = url
+        if item.get("prune"):
+            payload["prune"] = True
         return payload
 
     url = str(item.get("url") or "").strip()
@@ -582,6 +618,18 @@ def _download_destination_folder(item: dict) -> str:
     return _normalize_rel_path(folder or "checkpoints")
 
 
+def _shard_set_key_for_item(item: dict) -> str:
+    """repo|set for a Hub file that is a checkpoint shard or shard index, else ""."""
+    if str(item.get("download_mode") or "file").strip().lower() == "folder":
+        return ""
+    try:
+        parsed = _build_parsed_download_info(item)
+    except Exception:
+        return ""
+    key = shard_set_key(_parsed_remote_filename(parsed))
+    return f"{parsed['repo']}|{key}" if key else ""
+
+
 def _download_destination_key(item: dict) -> str:
     mode = str(item.get("download_mode") or "file").strip().lower() or "file"
     folder = _download_destination_folder(item).lower()
@@ -589,6 +637,10 @@ def _download_destination_key(item: dict) -> str:
         repo_id = _repo_id_from_item(item).lower()
         url = str(item.get("url") or "").strip().lower()
         return f"folder|{folder}|{repo_id}|{url}"
+    # Every shard (and the index) of one set is the same job.
+    shard_key = _shard_set_key_for_item(item).lower()
+    if shard_key:
+        return f"shards|{folder}|{shard_key}"
 
     filename = _download_destination_filename(item).lower()
     if not filename:
@@ -675,6 +727,16 @@ def _classify_download_failure(item: dict, error_message: str) -> dict:
         )
         return result
 
+    if "not enough disk space" in lowered or "no space left on device" in lowered:
+        result.update(
+            {
+                "error_code": "disk_space",
+                "action_hint": "free_disk_space",
+                "action_message": "Free up disk space on the target drive, then retry download.",
+            }
+        )
+        return result
+
     if "403" in lowered and is_hf_related:
         result.update(
             {
@@ -827,6 +889,41 @@ def _build_parsed_download_info(model: dict) -> dict:
         )
     return parsed
 
+
+def _parsed_remote_filename(parsed: dict) -> str:
+    remote_filename = parsed["file"]
+    if parsed.get("subfolder"):
+        remote_filename = f"{parsed['subfolder'].strip('/')}/{parsed['file']}"
+    return remote_filename
+
+
+def _prefetch_queued_repo_metadata(parsed: dict, token):
+    """
+    Look up this file and every other queued file from the same repo/revision in
+    one get_paths_info call, so the rest of the batch starts from a warm cache.
+    """
+    repo_id = parsed.get("repo")
+    revision = parsed.get("revision")
+    paths = [_parsed_remote_filename(parsed)]
+    with download_queue_lock:
+        queued = list(download_queue)
+    for other in queued:
+        if str(other.get("download_mode") or "").strip().lower() == "folder":
+            continue
+        try:
+            other_parsed = _build_parsed_download_info(other)
+        except Exception:
+            continue
+        if other_parsed.get("repo") == repo_id and other_parsed.get("revision") == revision:
+            paths.append(_parsed_remote_filename(other_parsed))
+    if len(paths) < 2:
+        return
+    try:
+        get_paths_metadata(repo_id, paths, revision=revision, token=token or None)
+    except Exception as e:
+        print(f"[DEBUG] Metadata prefetch for {repo_id} failed: {e}")
+
+
 def _build_parsed_folder_download_info(model: dict) -> dict:
     """Build parsed info for folder/repo download queue items."""
     url = model.get("url")
@@ -858,6 +955,7 @@ def _build_parsed_folder_download_info(model: dict) -> dict:
     }
 
 def _set_download_status(download_id: str, fields: dict):
+    now = time.time()
     with download_status_lock:
         existing = download_status.get(download_id, {})
         existing_status = str(existing.get("status") or "").strip().lower()
@@ -874,16 +972,141 @@ def _set_download_status(download_id: str, fields: dict):
             elif existing_status == "cancelled" and incoming_status and incoming_status != "cancelled":
                 fields = dict(fields)
                 fields.pop("status", None)
+        is_new = download_id not in download_status
         existing.update(fields)
         download_status[download_id] = existing
+        _bump_download_status_version_locked(download_id)
+        # Journal writes happen after the lock; the version lets the store drop a late, older op.
+        journal_version = download_status_version
+
+        new_status = str(existing.get("status") or "").strip().lower()
+        transition = is_new or new_status != existing_status
+        push_entry = None
+        if transition or now - download_status_push_times.get(download_id, 0.0) >= DOWNLOAD_STATUS_PUSH_INTERVAL_SECONDS:
+            download_status_push_times[download_id] = now
+            push_entry = dict(existing)
+        removed = []
+        record = None
+        if transition:
+            if new_status in DOWNLOAD_PERSISTED_STATUSES:
+                record = _persisted_download_record(existing)
+            elif new_status in DOWNLOAD_FINISHED_STATUSES:
+                if new_status == "completed":
+                    existing.pop("retry_payload", None)
+                removed = _evict_finished_downloads_locked(now)
+
+    if push_entry is not None:
+        _push_download_status({download_id: push_entry}, removed)
+    elif removed:
+        _push_download_status({}, removed)
+    # Progress ticks stop here; only status transitions reach the journal.
+    if not transition:
+        return
+    if record is not None:
+        download_state_store.put(download_id, record, version=journal_version)
+    else:
+        download_state_store.delete(download_id, version=journal_version)
+
 
-    # Persist state to disk on meaningful transitions for crash recovery
-    _incoming = str(fields.get("status") or "").strip().lower()
-    if _incoming in ("queued", "downloading", "completed", "failed", "cancelled", "downloaded", "interrupted"):
+def _bump_download_status_version_locked(download_id: str):
+    global download_status_version
+    download_status_version += 1
+    download_status_versions[download_id] = download_status_version
+
+
+def _remove_download_status_locked(download_id: str):
+    """Drop an entry and remember the removal so ?since= clients can drop it too."""
+    global download_status_version, download_status_removed_floor
+    if download_status.pop(download_id, None) is None:
+        return
+    download_status_versions.pop(download_id, None)
+    download_status_push_times.pop(download_id, None)
+    download_status_version += 1
+    download_status_removed[download_id] = download_status_version
+    if len(download_status_removed) > DOWNLOAD_STATUS_REMOVED_KEEP:
+        # Cursors older than the forgotten removals get a full snapshot instead.
+        oldest = min(download_status_removed, key=download_status_removed.get)
+        download_status_removed_floor = download_status_removed.pop(oldest)
+
+
+def _download_status_delta(since: int, ids: list) -> dict:
+    """Entries changed after version `since` (or everything, with full=True, for an unknown cursor)."""
+    with download_status_lock:
+        version = download_status_version
+        full = since < 0 or since > version or since < download_status_removed_floor
+        if full:
+            changed = [i for i in download_status]
+            removed = []
+        else:
+            changed = [i for i, v in download_status_versions.items() if v > since]
+            removed = [i for i, v in download_status_removed.items() if v > since]
+        if ids:
+            wanted = set(ids)
+            changed = [i for i in changed if i in wanted]
+            removed = [i for i in removed if i in wanted]
+        downloads = {i: dict(download_status[i]) for i in changed if i in download_status}
+    return {"downloads": downloads, "removed": removed, "version": version, "full": full}
+
+
+_prompt_server_instance = None
+
+
+def _push_download_status(downloads: dict, removed: list = None):
+    """Send changed entries to connected browsers; the /download_status?since= poll covers anything missed."""
+    global _prompt_server_instance
+    if _prompt_server_instance is None:
         try:
-            _persist_download_state()
+            import server
+            _prompt_server_instance = getattr(server.PromptServer, "instance", None)
         except Exception:
-            pass
+            _prompt_server_instance = None
+        if _prompt_server_instance is None:
+            return
+    try:
+        _prompt_server_instance.send_sync(DOWNLOAD_STATUS_EVENT, {
+            "downloads": downloads,
+            "removed": list(removed or []),
+            "version": download_status_version,
+        })
+    except Exception as e:
+        print(f"[DEBUG] Failed to push download status: {e}")
+
+
+def _persisted_download_record(info: dict) -> dict:
+    """The subset of a status entry needed to resume or list it after a restart."""
+    return {
+        "retry_payload": info.get("retry_payload"),
+        "folder": info.get("folder"),
+        "download_mode": info.get("download_mode"),
+        "filename": info.get("filename"),
+        "display_name": info.get("display_name"),
+        "destination_key": info.get("destination_key"),
+        "total_bytes": info.get("total_bytes"),
+        "status": str(info.get("status") or "").strip().lower(),
+        "started_at": info.get("started_at"),
+        "original_download_id": info.get("original_download_id"),
+    }
+
+
+def _evict_finished_downloads_locked(now: float):
+    """Drop finished entries past DOWNLOAD_STATUS_RETENTION_SECONDS, then the oldest beyond DOWNLOAD_STATUS_MAX_FINISHED."""
+    finished = []
+    for did, info in download_status.items():
+        if str(info.get("status") or "").strip().lower() in DOWNLOAD_FINISHED_STATUSES:
+            finished.append((float(info.get("finished_at") or info.get("updated_at") or now), did))
+    if len(finished) <= DOWNLOAD_STATUS_MAX_FINISHED and (
+        not finished or now - min(finished)[0] < DOWNLOAD_STATUS_RETENTION_SECONDS
+    ):
+        return []
+    finished.sort()
+    excess = len(finished) - DOWNLOAD_STATUS_MAX_FINISHED
+    removed = []
+    for index, (finished_at, did) in enumerate(finished):
+        if index < excess or now - finished_at >= DOWNLOAD_STATUS_RETENTION_SECONDS:
+            _remove_download_status_locked(did)
+            removed.append(did)
+    return removed
+
 
 def _set_search_status(request_id: str, fields: dict):
     if not request_id:
@@ -1913,454 +2136,500 @@ def _find_model_library_asset_for_downloaded_file(path: str) -> dict | None:
             return asset
     return None
 
-def _download_worker():
-    global download_worker_running
-    while download_worker_running:
-        item = None
-        with download_queue_lock:
-            if download_queue:
-                item = download_queue.pop(0)
-        if item:
-            _touch_queue_activity()
-
-        if not item:
-            if VERIFY_AFTER_QUEUE:
-                with last_queue_activity_lock:
-                    idle_for = time.time() - last_queue_activity
-                if idle_for >= VERIFY_IDLE_SECONDS:
-                    with pending_verifications_lock:
-                        to_verify = pending_verifications[:]
-                        pending_verifications.clear()
-                    for entry in to_verify:
-                        download_id = entry.get("download_id")
-                        dest_path = entry.get("dest_path")
-                        expected_size = entry.get("expected_size")
-                        expected_sha = entry.get("expected_sha")
-                        if not download_id or not dest_path:
-                            continue
-                        if _is_cancel_requested(download_id):
-                            _set_download_status(download_id, {
-                                "status": "cancelled",
-                                "message": "Cancelled",
-                                "finished_at": time.time()
-                            })
-                            _clear_cancel_request(download_id)
-                            continue
-                        _set_download_status(download_id, {
-                            "status": "verifying",
-                            "updated_at": time.time()
-                        })
-                        try:
-                            from .downloader import _verify_file_integrity
-                            _verify_file_integrity(dest_path, expected_size, expected_sha)
-                            _set_download_status(download_id, {
-                                "status": "completed",
-                                "finished_at": time.time(),
-                                "message": entry.get("message"),
-                                "path": dest_path
-                            })
-                        except Exception as e:
-                            try:
-                                if os.path.exists(dest_path):
-                                    os.remove(dest_path)
-                            except Exception:
-                                pass
-                            _set_download_status(download_id, {
-                                "status": "failed",
-                                "error": f"Verification failed: {e}",
-                                "finished_at": time.time()
-                            })
-            time.sleep(0.2)
-            continue
+def _verify_slot_keys(entry: dict):
+    """Verifications are capped per disk, so several files on one drive don't seek against each other."""
+    try:
+        device = os.stat(os.path.dirname(os.path.abspath(entry.get("dest_path") or ""))).st_dev
+    except OSError:
+        return []
+    return [("device", str(device))]
 
-        download_id = item["download_id"]
-        if _is_cancel_requested(download_id):
-            _set_download_status(download_id, {
-                "status": "cancelled",
-                "message": "Cancelled before download started",
-                "finished_at": time.time()
-            })
-            _clear_cancel_request(download_id)
-            continue
-        _set_download_status(download_id, {"status": "downloading", "started_at": time.time()})
 
-        stop_event = None
+def _verify_pending_item(entry: dict):
+    """Verification worker: check one downloaded file while downloads carry on."""
+    download_id = entry.get("download_id")
+    dest_path = entry.get("dest_path")
+    expected_size = entry.get("expected_size")
+    expected_sha = entry.get("expected_sha")
+    if not download_id or not dest_path:
+        return
+    if _is_cancel_requested(download_id):
+        _set_download_status(download_id, {
+            "status": "cancelled",
+            "message": "Cancelled",
+            "finished_at": time.time()
+        })
+        _clear_cancel_request(download_id)
+        return
+    _set_download_status(download_id, {
+        "status": "verifying",
+        "updated_at": time.time()
+    })
+    try:
+        from .downloader import _verify_file_integrity
+        _verify_file_integrity(
+            dest_path,
+            expected_size,
+            expected_sha,
+            entry.get("actual_sha"),
+            cancel_check=lambda: _is_cancel_requested(download_id),
+        )
+        _set_download_status(download_id, {
+            "status": "completed",
+            "finished_at": time.time(),
+            "message": entry.get("message"),
+            "path": dest_path
+        })
+    except InterruptedError:
+        _set_download_status(download_id, {
+            "status": "cancelled",
+            "message": "Cancelled during verification",
+            "finished_at": time.time()
+        })
+        _clear_cancel_request(download_id)
+    except Exception as e:
         try:
-            download_mode = str(item.get("download_mode") or "").strip().lower()
-            if download_mode == "folder":
-                folder_info = _build_parsed_folder_download_info(item)
-                def folder_status_cb(phase_text: str):
-                    phase_value = str(phase_text or "").strip()
-                    _set_download_status(download_id, {
-                        "status": "downloading",
-                        "phase": phase_value or "downloading",
-                        "updated_at": time.time()
-                    })
-                msg, path = run_download_folder(
-                    folder_info["parsed"],
-                    item.get("folder", ""),
-                    remote_subfolder_path=folder_info["remote_subfolder_path"],
-                    last_segment=folder_info["last_segment"],
-                    sync=True,
-                    status_cb=folder_status_cb,
-                    cancel_check=lambda: _is_cancel_requested(download_id),
-                )
-                if _is_cancel_requested(download_id):
-                    _set_download_status(download_id, {
-                        "status": "cancelled",
-                        "message": "Cancelled",
-                        "finished_at": time.time()
-                    })
-                    _clear_cancel_request(download_id)
-                    _touch_queue_activity()
-                    continue
-                if not path:
-                    raise RuntimeError(msg or "Folder download failed.")
-                _set_download_status(download_id, {
-                    "status": "completed",
-                    "message": msg,
-                    "path": path,
-                    "finished_at": time.time()
-                })
-                _touch_queue_activity()
-                continue
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+        except Exception:
+            pass
+        _set_download_status(download_id, {
+            "status": "failed",
+            "error": f"Verification failed: {e}",
+            "finished_at": time.time()
+        })
+
+
+def _process_shard_set_item(item: dict, parsed: dict, shard_set: list):
+    """Run a sharded checkpoint as one queue entry; each shard is a row under "children"."""
+    download_id = item["download_id"]
+    total_bytes = sum(int(entry.get("size") or 0) for entry in shard_set)
+    _set_download_status(download_id, {
+        "status": "downloading",
+        "downloaded_bytes": 0,
+        "total_bytes": total_bytes,
+        "file_count": len(shard_set),
+        "children": [
+            {"path": entry["path"], "status": "queued", "downloaded_bytes": 0, "total_bytes": entry.get("size")}
+            for entry in shard_set
+        ],
+        "updated_at": time.time()
+    })
+
+    def status_cb(phase: str):
+        if _is_cancel_requested(download_id):
+            return
+        _set_download_status(download_id, {
+            "status": "downloading",
+            "phase": str(phase or "").strip() or "downloading",
+            "updated_at": time.time()
+        })
 
-            overwrite = bool(item.get("overwrite"))
-            item_url = str(item.get("url") or "").strip()
-            is_hf_file_download = bool(item.get("hf_repo") and item.get("hf_path"))
-            if not is_hf_file_download and item_url:
-                is_hf_file_download = _is_supported_hf_link(item_url)
+    def progress_cb(payload: dict):
+        if _is_cancel_requested(download_id):
+            return
+        data = payload if isinstance(payload, dict) else {}
+        _set_download_status(download_id, {
+            "status": "downloading",
+            "downloaded_bytes": data.get("downloaded_bytes", 0),
+            "total_bytes": data.get("total_bytes"),
+            "speed_bps": data.get("speed_bps"),
+            "eta_seconds": data.get("eta_seconds"),
+            "files_done": data.get("files_done"),
+            "children": data.get("children") or [],
+            "updated_at": time.time()
+        })
 
-            if not is_hf_file_download:
-                if not _is_direct_http_url(item_url):
-                    raise RuntimeError("URL must be a valid http(s) link for direct file downloads.")
+    msg, path = run_download_shard_set(
+        parsed,
+        item["folder"],
+        shard_set,
+        sync=True,
+        overwrite=bool(item.get("overwrite")),
+        status_cb=status_cb,
+        cancel_check=lambda: _is_cancel_requested(download_id),
+        progress_cb=progress_cb,
+    )
+    if _is_cancel_requested(download_id) or not path:
+        _set_download_status(download_id, {
+            "status": "cancelled",
+            "message": "Cancelled",
+            "finished_at": time.time()
+        })
+        _clear_cancel_request(download_id)
+        return
+    _set_download_status(download_id, {
+        "status": "completed",
+        "message": msg,
+        "path": path,
+        "children": [
+            {"path": entry["path"], "status": "done", "downloaded_bytes": entry.get("size"), "total_bytes": entry.get("size")}
+            for entry in shard_set
+        ],
+        "finished_at": time.time()
+    })
+
+
+def _process_download_item(item: dict):
+    download_id = item["download_id"]
+    if _is_cancel_requested(download_id):
+        _set_download_status(download_id, {
+            "status": "cancelled",
+            "message": "Cancelled before download started",
+            "finished_at": time.time()
+        })
+        _clear_cancel_request(download_id)
+        return
+    _set_download_status(download_id, {"status": "downloading", "phase": "downloading", "started_at": time.time()})
 
+    try:
+        download_mode = str(item.get("download_mode") or "").strip().lower()
+        if download_mode == "folder":
+            folder_info = _build_parsed_folder_download_info(item)
+            def folder_status_cb(phase_text: str):
+                phase_value = str(phase_text or "").strip()
                 _set_download_status(download_id, {
                     "status": "downloading",
-                    "downloaded_bytes": 0,
-                    "total_bytes": None,
+                    "phase": phase_value or "downloading",
                     "updated_at": time.time()
                 })
-
-                def direct_status_cb(phase: str):
-                    if _is_cancel_requested(download_id):
-                        return
-                    phase_text = str(phase or "").strip()
-                    phase_lower = phase_text.lower()
-                    status_value = "downloading"
-                    if phase_lower in ("finalizing", "cancelling", "cancelled", "failed"):
-                        status_value = phase_lower
-                    _set_download_status(download_id, {
-                        "status": status_value,
-                        "phase": phase_text or status_value,
-                        "updated_at": time.time()
-                    })
-
-                def direct_progress_cb(payload: dict):
-                    if _is_cancel_requested(download_id):
-                        return
-                    data = payload if isinstance(payload, dict) else {}
-                    phase_text = str(data.get("phase") or "downloading").strip()
-                    phase_lower = phase_text.lower()
-                    status_value = "downloading" if phase_lower not in ("finalizing", "cancelling") else phase_lower
-                    _set_download_status(download_id, {
-                        "status": status_value,
-                        "downloaded_bytes": data.get("downloaded_bytes", 0),
-                        "total_bytes": data.get("total_bytes"),
-                        "speed_bps": data.get("speed_bps"),
-                        "eta_seconds": data.get("eta_seconds"),
-                        "phase": phase_text,
-                        "updated_at": time.time()
-                    })
-
-                msg, path = run_download_url(
-                    item_url,
-                    item["folder"],
-                    sync=True,
-                    overwrite=overwrite,
-                    target_filename=item.get("target_filename"),
-                    status_cb=direct_status_cb,
-                    progress_cb=direct_progress_cb,
-                    cancel_check=lambda: _is_cancel_requested(download_id),
-                )
+            def folder_progress_cb(payload: dict):
                 if _is_cancel_requested(download_id):
-                    try:
-                        if path and os.path.exists(path):
-                            os.remove(path)
-                    except Exception:
-                        pass
-                    _set_download_status(download_id, {
-                        "status": "cancelled",
-                        "message": "Cancelled",
-                        "finished_at": time.time()
-                    })
-                    _clear_cancel_request(download_id)
-                    _touch_queue_activity()
-                    continue
-                if not path:
-                    raise RuntimeError(msg or "Direct URL download failed.")
+                    return
+                data = payload if isinstance(payload, dict) else {}
+                # Byte counts only; the phase text stays whatever folder_status_cb last set.
+                # "files" lists the files in flight with their own byte counts and ETA.
                 _set_download_status(download_id, {
-                    "status": "completed",
-                    "message": msg,
-                    "path": path,
+                    "status": "downloading",
+                    "downloaded_bytes": data.get("downloaded_bytes", 0),
+                    "total_bytes": data.get("total_bytes"),
+                    "speed_bps": data.get("speed_bps"),
+                    "eta_seconds": data.get("eta_seconds"),
+                    "files": data.get("files") or [],
+                    "files_done": data.get("files_done"),
+                    "file_count": data.get("file_count"),
+                    "sync_plan": data.get("plan"),
+                    "updated_at": time.time()
+                })
+            msg, path = run_download_folder(
+                folder_info["parsed"],
+                item.get("folder", ""),
+                remote_subfolder_path=folder_info["remote_subfolder_path"],
+                last_segment=folder_info["last_segment"],
+                sync=True,
+                status_cb=folder_status_cb,
+                cancel_check=lambda: _is_cancel_requested(download_id),
+                progress_cb=folder_progress_cb,
+                prune=bool(item.get("prune")),
+            )
+            if _is_cancel_requested(download_id):
+                _set_download_status(download_id, {
+                    "status": "cancelled",
+                    "message": "Cancelled",
                     "finished_at": time.time()
                 })
-                _touch_queue_activity()
-                continue
+                _clear_cancel_request(download_id)
+                return
+            if not path:
+                raise RuntimeError(msg or "Folder download failed.")
+            _set_download_status(download_id, {
+                "status": "completed",
+                "message": msg,
+                "path": path,
+                "files": [],
+                "finished_at": time.time()
+            })
+            return
+
+        overwrite = bool(item.get("overwrite"))
+        item_url = str(item.get("url") or "").strip()
+        is_hf_file_download = bool(item.get("hf_repo") and item.get("hf_path"))
+        if not is_hf_file_download and item_url:
+            is_hf_file_download = _is_supported_hf_link(item_url)
+
+        if not is_hf_file_download:
+            if not _is_direct_http_url(item_url):
+                raise RuntimeError("URL must be a valid http(s) link for direct file downloads.")
 
-            parsed = _build_parsed_download_info(item)
-            token = get_token()
-            remote_filename = parsed["file"]
-            if parsed.get("subfolder"):
-                remote_filename = f"{parsed['subfolder'].strip('/')}/{parsed['file']}"
-            expected_size, _, etag = get_remote_file_metadata(
-                parsed["repo"],
-                remote_filename,
-                revision=parsed.get("revision"),
-                token=token or None
-            )
             _set_download_status(download_id, {
                 "status": "downloading",
                 "downloaded_bytes": 0,
-                "total_bytes": expected_size,
+                "total_bytes": None,
                 "updated_at": time.time()
             })
 
-            def monitor_progress(stop_event, download_id, expected_size, blob_path, incomplete_path, filename, defer_verify):
-                last_bytes = None
-                last_time = time.time()
-                ema_speed = None
-                last_report = time.time()
-                last_change = time.time()
-                last_stall_log = time.time()
-                waiting_logged = False
-                try:
-                    while not stop_event.is_set():
-                        if _is_cancel_requested(download_id):
-                            return
-                        bytes_now = None
-                        used_incomplete_path = incomplete_path
-                        if incomplete_path and os.path.exists(incomplete_path):
-                            bytes_now = os.path.getsize(incomplete_path)
-                        else:
-                            # Try to find a temporary file like <blob_path>.<uuid>.incomplete
-                            # or <blob_path>*.incomplete in the parent directory
-                            if blob_path:
-                                blob_dir = os.path.dirname(blob_path)
-                                etag = os.path.basename(blob_path)
-                                if os.path.isdir(blob_dir) and etag:
-                                    try:
-                                        candidates = []
-                                        for name in os.listdir(blob_dir):
-                                            if name.startswith(etag) and name.endswith(".incomplete"):
-                                                full_path = os.path.join(blob_dir, name)
-                                                if os.path.isfile(full_path):
-                                                    candidates.append(full_path)
-                                        if candidates:
-                                            # Use the most recently modified candidate
-                                            latest_candidate = max(candidates, key=os.path.getmtime)
-                                            bytes_now = os.path.getsize(latest_candidate)
-                                            used_incomplete_path = latest_candidate
-                                    except Exception:
-                                        pass
-                        if bytes_now is None and blob_path and os.path.exists(blob_path):
-                            bytes_now = os.path.getsize(blob_path)
-
-                        if bytes_now is not None:
-                            now = time.time()
-                            if now - last_report >= 5:
-                                blob_label = "incomplete" if (used_incomplete_path and os.path.exists(used_incomplete_path)) else "blob"
-                                size_label = bytes_now
-                                total_label = expected_size if expected_size is not None else "unknown"
-                                print(f"[DEBUG] monitor_progress {filename}: {size_label}/{total_label} bytes ({blob_label})")
-                                last_report = now
-                            if last_bytes is None or bytes_now != last_bytes:
-                                last_change = now
-                            if expected_size and bytes_now >= expected_size:
-                                _set_download_status(download_id, {
-                                    "status": "downloading" if defer_verify else "verifying",
-                                    "downloaded_bytes": bytes_now,
-                                    "total_bytes": expected_size,
-                                    "speed_bps": 0,
-                                    "eta_seconds": None,
-                                    "phase": "finalizing" if defer_verify else "verifying",
-                                    "updated_at": now
-                                })
-                                return
-                            if expected_size:
-                                near_done = expected_size - bytes_now <= max(8 * 1024 * 1024, int(expected_size * 0.0005))
-                                stalled = (now - last_change) >= 15
-                                if near_done and stalled:
-                                    print(f"[DEBUG] monitor_progress {filename}: stalled near completion, switching to verifying")
-                                    _set_download_status(download_id, {
-                                        "status": "downloading" if defer_verify else "verifying",
-                                        "downloaded_bytes": bytes_now,
-                                        "total_bytes": expected_size,
-                                        "speed_bps": 0,
-                                        "eta_seconds": None,
-                                        "phase": "finalizing" if defer_verify else "verifying",
-                                        "updated_at": now
-                                    })
-                                    return
-                            if last_bytes is None:
-                                inst_speed = 0
-                            else:
-                                delta = bytes_now - last_bytes
-                                dt = now - last_time
-                                inst_speed = (delta / dt) if dt > 0 else 0
-                            ema_speed = inst_speed if ema_speed is None else (0.2 * inst_speed + 0.8 * ema_speed)
-                            stalled_for = now - last_change
-                            if stalled_for >= 30 and not waiting_logged:
-                                print(f"[DEBUG] monitor_progress {filename}: waiting for data (no size change for {stalled_for:.0f}s)")
-                                waiting_logged = True
-                            if bytes_now != last_bytes:
-                                waiting_logged = False
-                            if bytes_now == last_bytes and (now - last_change) >= 10 and (now - last_stall_log) >= 10:
-                                stall_for = now - last_change
-                                total_label = expected_size if expected_size is not None else "unknown"
-                                print(f"[DEBUG] monitor_progress {filename}: stalled at {bytes_now}/{total_label} for {stall_for:.0f}s")
-                                last_stall_log = now
-                            eta_seconds = None
-                            if expected_size and ema_speed and ema_speed > 0:
-                                eta_seconds = max(0, (expected_size - bytes_now) / ema_speed)
-                            if stalled_for >= 30:
-                                ema_speed = 0
-                                eta_seconds = None
-                            _set_download_status(download_id, {
-                                "status": "downloading",
-                                "downloaded_bytes": bytes_now,
-                                "total_bytes": expected_size,
-                                "speed_bps": ema_speed,
-                                "eta_seconds": eta_seconds,
-                                "phase": "waiting_for_data" if stalled_for >= 30 else "downloading",
-                                "updated_at": now
-                            })
-                            last_bytes = bytes_now
-                            last_time = now
-                        time.sleep(0.5)
-                except Exception:
-                    return
-
-            if etag:
-                stop_event = threading.Event()
-                blob_path, incomplete_path = get_blob_paths(parsed["repo"], etag)
-                threading.Thread(
-                    target=monitor_progress,
-                    args=(stop_event, download_id, expected_size, blob_path, incomplete_path, remote_filename, VERIFY_AFTER_QUEUE),
-                    daemon=True
-                ).start()
-
-            def status_cb(phase: str):
+            def direct_status_cb(phase: str):
                 if _is_cancel_requested(download_id):
                     return
+                phase_text = str(phase or "").strip()
+                phase_lower = phase_text.lower()
+                status_value = "downloading"
+                if phase_lower in ("finalizing", "cancelling", "cancelled", "failed"):
+                    status_value = phase_lower
                 _set_download_status(download_id, {
-                    "status": phase,
-                    "phase": phase,
+                    "status": status_value,
+                    "phase": phase_text or status_value,
                     "updated_at": time.time()
                 })
-            if VERIFY_AFTER_QUEUE:
-                msg, path, info = run_download(
-                    parsed,
-                    item["folder"],
-                    sync=True,
-                    defer_verify=True,
-                    overwrite=overwrite,
-                    return_info=True,
-                    target_filename=item.get("target_filename"),
-                    status_cb=status_cb,
-                    cancel_check=lambda: _is_cancel_requested(download_id),
-                )
+
+            def direct_progress_cb(payload: dict):
                 if _is_cancel_requested(download_id):
-                    try:
-                        if path and os.path.exists(path):
-                            os.remove(path)
-                    except Exception:
-                        pass
-                    _set_download_status(download_id, {
-                        "status": "cancelled",
-                        "message": "Cancelled",
-                        "finished_at": time.time()
-                    })
-                    _clear_cancel_request(download_id)
-                    _touch_queue_activity()
-                    continue
+                    return
+                data = payload if isinstance(payload, dict) else {}
+                phase_text = str(data.get("phase") or "downloading").strip()
+                phase_lower = phase_text.lower()
+                status_value = "downloading" if phase_lower not in ("finalizing", "cancelling") else phase_lower
                 _set_download_status(download_id, {
-                    "status": "downloaded",
-                    "message": msg,
-                    "path": path,
+                    "status": status_value,
+                    "downloaded_bytes": data.get("downloaded_bytes", 0),
+                    "total_bytes": data.get("total_bytes"),
+                    "speed_bps": data.get("speed_bps"),
+                    "eta_seconds": data.get("eta_seconds"),
+                    "phase": phase_text,
                     "updated_at": time.time()
                 })
-                _touch_queue_activity()
-                should_enqueue_verify = bool(path) and not bool(info.get("skip_verify"))
-                if should_enqueue_verify:
-                    with pending_verifications_lock:
-                        pending_verifications.append({
-                            "download_id": download_id,
-                            "dest_path": path,
-                            "expected_size": info.get("expected_size"),
-                            "expected_sha": info.get("expected_sha"),
-                            "message": msg
-                        })
-            else:
-                msg, path = run_download(
-                    parsed,
-                    item["folder"],
-                    sync=True,
-                    overwrite=overwrite,
-                    target_filename=item.get("target_filename"),
-                    status_cb=status_cb,
-                    cancel_check=lambda: _is_cancel_requested(download_id),
-                )
-                if _is_cancel_requested(download_id):
-                    try:
-                        if path and os.path.exists(path):
-                            os.remove(path)
-                    except Exception:
-                        pass
-                    _set_download_status(download_id, {
-                        "status": "cancelled",
-                        "message": "Cancelled",
-                        "finished_at": time.time()
-                    })
-                    _clear_cancel_request(download_id)
-                    _touch_queue_activity()
-                    continue
+
+            msg, path = run_download_url(
+                item_url,
+                item["folder"],
+                sync=True,
+                overwrite=overwrite,
+                target_filename=item.get("target_filename"),
+                status_cb=direct_status_cb,
+                progress_cb=direct_progress_cb,
+                cancel_check=lambda: _is_cancel_requested(download_id),
+            )
+            if _is_cancel_requested(download_id):
+                try:
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                except Exception:
+                    pass
                 _set_download_status(download_id, {
-                    "status": "completed",
-                    "message": msg,
-                    "path": path,
+                    "status": "cancelled",
+                    "message": "Cancelled",
                     "finished_at": time.time()
                 })
-                _touch_queue_activity()
-        except Exception as e:
+                _clear_cancel_request(download_id)
+                return
+            if not path:
+                raise RuntimeError(msg or "Direct URL download failed.")
+            _set_download_status(download_id, {
+                "status": "completed",
+                "message": msg,
+                "path": path,
+                "finished_at": time.time()
+            })
+            return
+
+        parsed = _build_parsed_download_info(item)
+        token = get_token()
+        remote_filename = _parsed_remote_filename(parsed)
+        _prefetch_queued_repo_metadata(parsed, token)
+        shard_set = None
+        if shard_set_key(remote_filename):
+            try:
+                shard_set = find_shard_set(parsed)
+            except Exception as e:
+                print(f"[DEBUG] Could not resolve the shard set of {remote_filename}, downloading it alone: {e}")
+        if shard_set:
+            _process_shard_set_item(item, parsed, shard_set)
+            return
+        expected_size, _, _ = get_remote_file_metadata(
+            parsed["repo"],
+            remote_filename,
+            revision=parsed.get("revision"),
+            token=token or None
+        )
+        _set_download_status(download_id, {
+            "status": "downloading",
+            "downloaded_bytes": 0,
+            "total_bytes": expected_size,
+            "updated_at": time.time()
+        })
+
+        def status_cb(phase: str):
+            if _is_cancel_requested(download_id):
+                return
+            _set_download_status(download_id, {
+                "status": phase,
+                "phase": phase,
+                "updated_at": time.time()
+            })
+
+        def hf_progress_cb(payload: dict):
+            if _is_cancel_requested(download_id):
+                return
+            data = payload if isinstance(payload, dict) else {}
+            _set_download_status(download_id, {
+                "status": "downloading",
+                "downloaded_bytes": data.get("downloaded_bytes", 0),
+                "total_bytes": data.get("total_bytes") or expected_size,
+                "speed_bps": data.get("speed_bps"),
+                "eta_seconds": data.get("eta_seconds"),
+                "phase": str(data.get("phase") or "downloading"),
+                "updated_at": time.time()
+            })
+        if VERIFY_AFTER_QUEUE:
+            msg, path, info = run_download(
+                parsed,
+                item["folder"],
+                sync=True,
+                defer_verify=True,
+                overwrite=overwrite,
+                return_info=True,
+                target_filename=item.get("target_filename"),
+                status_cb=status_cb,
+                cancel_check=lambda: _is_cancel_requested(download_id),
+                progress_cb=hf_progress_cb,
+            )
+            if _is_cancel_requested(download_id):
+                try:
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                except Exception:
+                    pass
+                _set_download_status(download_id, {
+                    "status": "cancelled",
+                    "message": "Cancelled",
+                    "finished_at": time.time()
+                })
+                _clear_cancel_request(download_id)
+                return
+            downloaded_fields = {
+                "status": "downloaded",
+                "message": msg,
+                "path": path,
+                "phase_timings": info.get("phase_timings"),
+                "updated_at": time.time()
+            }
+            if info.get("saved_bytes"):
+                # Linked to an identical local file (content_index) instead of downloading.
+                downloaded_fields.update({
+                    "saved_bytes": info["saved_bytes"],
+                    "deduplicated_from": info.get("deduplicated_from"),
+                    "downloaded_bytes": info["saved_bytes"],
+                    "total_bytes": info["saved_bytes"],
+                    "phase": f"Linked local copy ({info['saved_bytes'] / (1024 ** 3):.2f} GB saved)",
+                })
+            _set_download_status(download_id, downloaded_fields)
+            should_enqueue_verify = bool(path) and not bool(info.get("skip_verify"))
+            if should_enqueue_verify:
+                with pending_verifications_lock:
+                    pending_verifications.append({
+                        "download_id": download_id,
+                        "dest_path": path,
+                        "expected_size": info.get("expected_size"),
+                        "expected_sha": info.get("expected_sha"),
+                        "actual_sha": info.get("actual_sha"),
+                        "message": msg
+                    })
+        else:
+            msg, path = run_download(
+                parsed,
+                item["folder"],
+                sync=True,
+                overwrite=overwrite,
+                target_filename=item.get("target_filename"),
+                status_cb=status_cb,
+                cancel_check=lambda: _is_cancel_requested(download_id),
+                progress_cb=hf_progress_cb,
+            )
             if _is_cancel_requested(download_id):
+                try:
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                except Exception:
+                    pass
                 _set_download_status(download_id, {
                     "status": "cancelled",
                     "message": "Cancelled",
                     "finished_at": time.time()
                 })
                 _clear_cancel_request(download_id)
-                continue
-            failure_fields = {
-                "status": "failed",
-                "error": str(e),
+                return
+            _set_download_status(download_id, {
+                "status": "completed",
+                "message": msg,
+                "path": path,
                 "finished_at": time.time()
-            }
-            try:
-                failure_fields.update(_classify_download_failure(item, str(e)))
-            except Exception:
-                pass
-            _set_download_status(download_id, failure_fields)
-        finally:
-            if stop_event:
-                stop_event.set()
+            })
+    except Exception as e:
+        if _is_cancel_requested(download_id):
+            _set_download_status(download_id, {
+                "status": "cancelled",
+                "message": "Cancelled",
+                "finished_at": time.time()
+            })
+            _clear_cancel_request(download_id)
+            return
+        if isinstance(e, InsufficientDiskSpaceError) and e.retryable:
+            _hold_download_for_disk_space(item, str(e))
+            return
+        failure_fields = {
+            "status": "failed",
+            "error": str(e),
+            "finished_at": time.time()
+        }
+        try:
+            failure_fields.update(_classify_download_failure(item, str(e)))
+        except Exception:
+            pass
+        _set_download_status(download_id, failure_fields)
+
+
+def _hold_download_for_disk_space(item: dict, reason: str):
+    """Put an item back at the end of the queue until running downloads have given back their space."""
+    item["not_before"] = time.time() + DISK_SPACE_RECHECK_SECONDS
+    with download_queue_lock:
+        download_queue.append(item)
+    _set_download_status(item["download_id"], {
+        "status": "queued",
+        "phase": reason,
+        "updated_at": time.time()
+    })
+
+
+def _download_slot_keys(item: dict) -> list:
+    """Scheduler slots an item occupies: its host and, for Hub downloads, its repo."""
+    repo_id = _repo_id_from_item(item)
+    if repo_id:
+        return [("host", HUGGINGFACE_HOST), ("repo", repo_id.lower())]
+    host = urlparse(str(item.get("url") or "").strip()).hostname or ""
+    return [("host", host.lower())]
+
+
+download_scheduler = DownloadScheduler(
+    download_queue,
+    download_queue_lock,
+    _download_slot_keys,
+    {"host": DOWNLOAD_PER_HOST_LIMIT, "repo": DOWNLOAD_PER_REPO_LIMIT},
+)
+verification_scheduler = DownloadScheduler(
+    pending_verifications,
+    pending_verifications_lock,
+    _verify_slot_keys,
+    {"device": VERIFY_PER_DEVICE_LIMIT},
+)
+
 
 def _start_download_worker():
     global download_worker_running
     if download_worker_running:
         return
     download_worker_running = True
-    threading.Thread(target=_download_worker, daemon=True).start()
+    run_workers(
+        download_scheduler,
+        _process_download_item,
+        DOWNLOAD_WORKERS,
+        keep_running=lambda: download_worker_running,
+    )
+    run_workers(
+        verification_scheduler,
+        _verify_pending_item,
+        VERIFY_WORKERS,
+        keep_running=lambda: download_worker_running,
+    )
 
 async def folder_structure(request):
     """Return the list of model subfolders"""
@@ -2751,15 +3020,63 @@ async def get_disk_space(request):
             from .file_manager import get_comfy_root
             path = get_comfy_root()
         total, used, free = shutil.disk_usage(path)
+        reserved = reserved_bytes(path)
         return web.json_response({
             "total": total,
             "used": used,
-            "free": free
+            "free": free,
+            # Still to be written by admitted downloads on this volume.
+            "reserved": reserved,
+            "available": max(0, free - reserved)
         })
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
 
+SHA256_HEX_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def _mirror_file_response(request, sha: str):
+    """Stream an indexed local file to a peer (Range requests included), or 404."""
+    path = find_file(sha) if sha else None
+    if not path:
+        return web.Response(status=404)
+    size = os.path.getsize(path)
+    try:
+        range_header = request.http_range
+    except ValueError:
+        return web.Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+    if range_header.start is not None or range_header.stop is not None:
+        start, stop, _ = range_header.indices(size)
+        size = max(0, stop - start)
+    note_served(size)
+    return web.FileResponse(path, headers={MIRROR_SHA_HEADER: sha})
+
+
+async def mirror_file_by_sha(request):
+    """Peer mirror: a local model file by SHA256 (HF_DOWNLOADER_SERVE_MIRROR)."""
+    if not SERVE_MIRROR:
+        return web.Response(status=404)
+    if not is_authorized(request.headers):
+        return web.Response(status=403)
+    sha = str(request.match_info.get("sha") or "").strip().lower()
+    if not SHA256_HEX_RE.fullmatch(sha):
+        return web.Response(status=400)
+    return await asyncio.to_thread(_mirror_file_response, request, sha)
+
+
+async def mirror_file_by_url(request):
+    """Peer mirror: the file this instance last downloaded from ?url=."""
+    if not SERVE_MIRROR:
+        return web.Response(status=404)
+    if not is_authorized(request.headers):
+        return web.Response(status=403)
+    url = str(request.query.get("url") or "").strip()
+    if not url:
+        return web.Response(status=400)
+    return await asyncio.to_thread(_mirror_file_response, request, sha_for_source(url))
+
+
 async def upload_chunk(request):
     try:
         reader = await request.multipart()
@@ -2844,42 +3161,70 @@ def _bind_route_target(target, method: str, path: str, handler):
     raise RuntimeError("Unsupported route target type.")
 
 
+# Pre-journal state file; migrated into the journal on first load.
 DOWNLOAD_STATE_PATH = os.path.join("user", "default", "hf_download_queue.json")
-DOWNLOAD_STATE_VERSION = 1
+DOWNLOAD_JOURNAL_PATH = os.path.join("user", "default", "hf_download_journal.jsonl")
+DOWNLOAD_PERSISTED_STATUSES = {"queued", "downloading", "copying", "cleaning_cache", "finalizing", "interrupted"}
+DOWNLOAD_FINISHED_STATUSES = {"completed", "failed", "cancelled"}
+# Finished entries are kept for the status panel this long, and never more than this many.
+DOWNLOAD_STATUS_RETENTION_SECONDS = _env_int("HF_DOWNLOADER_STATUS_RETENTION_HOURS", 6, 0) * 3600
+DOWNLOAD_STATUS_MAX_FINISHED = 200
+download_state_store = DownloadStateStore(DOWNLOAD_JOURNAL_PATH, legacy_path=DOWNLOAD_STATE_PATH)
+# Re-queue downloads that were active at shutdown instead of waiting for the user to resume them.
+AUTO_RESUME_INTERRUPTED = _env_flag("HF_DOWNLOADER_AUTO_RESUME", default=True)
+# Hash local model files into the content index in the background (paused while downloads run),
+# so identical weights requested under another name are linked instead of downloaded.
+CONTENT_INDEX_BACKGROUND = _env_flag("HF_DOWNLOADER_INDEX_EXISTING", default=True)
+CONTENT_INDEX_START_DELAY_SECONDS = 60
+CONTENT_INDEX_RESCAN_SECONDS = 3600
+content_indexer_started = False
 _ORPHAN_TEMP_SUFFIXES = (".tmp_copy", ".part")
 _ORPHAN_MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf")
 
-def _cleanup_orphaned_download_files():
-    """Remove temp and 0-byte placeholder files left by interrupted downloads."""
+def _model_scan_dirs() -> set:
+    """Every configured model folder, plus the default models root."""
     try:
-        try:
-            import folder_paths as _fp
-        except ImportError:
-            _fp = None
-
-        base_types = []
-        if _fp and hasattr(_fp, "folder_names_and_paths"):
-            for k in _fp.folder_names_and_paths.keys():
-                if k not in ("custom_nodes", "user", "input", "output", "temp"):
-                    base_types.append(k)
-        else:
-            base_types = ["checkpoints", "clip", "diffusion_models", "vae", "loras", "controlnet",
-                          "upscale_models", "text_encoders", "style_models", "embeddings"]
+        import folder_paths as _fp
+    except ImportError:
+        _fp = None
 
-        dirs_to_scan = set()
-        for bt in base_types:
-            if _fp and hasattr(_fp, "get_folder_paths"):
-                try:
-                    for p in _fp.get_folder_paths(bt):
-                        if os.path.isdir(p):
-                            dirs_to_scan.add(p)
-                except Exception:
-                    pass
+    base_types = []
+    if _fp and hasattr(_fp, "folder_names_and_paths"):
+        for k in _fp.folder_names_and_paths.keys():
+            if k not in ("custom_nodes", "user", "input", "output", "temp"):
+                base_types.append(k)
+    else:
+        base_types = ["checkpoints", "clip", "diffusion_models", "vae", "loras", "controlnet",
+                      "upscale_models", "text_encoders", "style_models", "embeddings"]
+
+    dirs_to_scan = set()
+    for bt in base_types:
+        if _fp and hasattr(_fp, "get_folder_paths"):
+            try:
+                for p in _fp.get_folder_paths(bt):
+                    if os.path.isdir(p):
+                        dirs_to_scan.add(p)
+            except Exception:
+                pass
+
+    # Always check default models root too
+    dirs_to_scan.add(_get_models_root())
+    return dirs_to_scan
 
-        # Always check default models root too
-        dirs_to_scan.add(_get_models_root())
 
+def _cleanup_orphaned_download_files():
+    """
+    Remove temp and 0-byte placeholder files left by interrupted downloads.
+    Partial downloads with a fresh sidecar are kept so they can resume, and so
+    is everything belonging to a file another process holds a lease on (a
+    models folder shared by several instances). Finished .safetensors/.gguf
+    files get the structural check in the background; corrupt ones are only
+    reported, never removed.
+    """
+    try:
+        dirs_to_scan = _model_scan_dirs()
         cleaned = 0
+        to_check = []
         for scan_dir in dirs_to_scan:
             try:
                 for dirpath, dirnames, filenames in os.walk(scan_dir):
@@ -2888,12 +3233,41 @@ def _cleanup_orphaned_download_files():
                     if rel != "." and rel.count(os.sep) >= 1:
                         dirnames.clear()
                         continue
+                    leased = active_lease_names(dirpath)
+                    # huggingface_hub staging folders resume like .part files; drop stale ones
+                    for dname in list(dirnames):
+                        if not dname.endswith(HF_STAGE_DIR_SUFFIX):
+                            continue
+                        dirnames.remove(dname)
+                        if dname[1:-len(HF_STAGE_DIR_SUFFIX)] in leased:
+                            continue
+                        dpath = os.path.join(dirpath, dname)
+                        try:
+                            if time.time() - os.path.getmtime(dpath) >= PARTIAL_MAX_AGE_SECONDS > 0:
+                                shutil.rmtree(dpath, ignore_errors=True)
+                                print(f"[DEBUG] Startup cleanup: removed stale staging folder {dpath}")
+                                cleaned += 1
+                        except Exception as e:
+                            print(f"[DEBUG] Startup cleanup: failed to process {dpath}: {e}")
                     for fname in filenames:
                         fpath = os.path.join(dirpath, fname)
+                        if fname in leased or any(fname.startswith(f".{name}.") for name in leased):
+                            continue
                         try:
                             lower_name = fname.lower()
+                            # Keep resumable partial downloads; drop sidecars whose .part is gone
+                            if lower_name.endswith(".part") and is_resumable_partial(fpath):
+                                continue
+                            if lower_name.endswith(".part" + PARTIAL_SIDECAR_SUFFIX):
+                                if not os.path.exists(fpath[: -len(PARTIAL_SIDECAR_SUFFIX)]):
+                                    os.remove(fpath)
+                                    cleaned += 1
+                                continue
                             # Remove orphaned temp files
                             if any(lower_name.endswith(s) for s in _ORPHAN_TEMP_SUFFIXES):
+                                sidecar_path = fpath + PARTIAL_SIDECAR_SUFFIX
+                                if lower_name.endswith(".part") and os.path.exists(sidecar_path):
+                                    os.remove(sidecar_path)
                                 os.remove(fpath)
                                 print(f"[DEBUG] Startup cleanup: removed orphaned temp file {fpath}")
                                 cleaned += 1
@@ -2904,97 +3278,145 @@ def _cleanup_orphaned_download_files():
                                     os.remove(fpath)
                                     print(f"[DEBUG] Startup cleanup: removed 0-byte placeholder {fpath}")
                                     cleaned += 1
+                                elif is_checkable(fpath):
+                                    to_check.append(fpath)
                         except Exception as e:
                             print(f"[DEBUG] Startup cleanup: failed to process {fpath}: {e}")
             except Exception as e:
                 print(f"[DEBUG] Startup cleanup: failed to scan {scan_dir}: {e}")
         if cleaned:
             print(f"[DEBUG] Startup cleanup: removed {cleaned} orphaned file(s)")
+        if to_check:
+            threading.Thread(
+                target=_check_model_structure, args=(to_check,), name="hf-structural-check", daemon=True
+            ).start()
     except Exception as e:
         print(f"[DEBUG] Startup orphan cleanup failed: {e}")
 
 
-def _persist_download_state():
-    """Save active (non-terminal) downloads to disk for crash recovery."""
-    try:
-        with download_status_lock:
-            active_items = []
-            for did, info in download_status.items():
-                status = str(info.get("status") or "").strip().lower()
-                if status in ("queued", "downloading", "copying", "cleaning_cache", "finalizing"):
-                    active_items.append({
-                        "download_id": did,
-                        "retry_payload": info.get("retry_payload"),
-                        "folder": info.get("folder"),
-                        "download_mode": info.get("download_mode"),
-                        "filename": info.get("filename"),
-                        "display_name": info.get("display_name"),
-                        "destination_key": info.get("destination_key"),
-                        "total_bytes": info.get("total_bytes"),
-                        "status": status,
-                        "started_at": info.get("started_at"),
-                    })
-        if not active_items:
-            try:
-                if os.path.exists(DOWNLOAD_STATE_PATH):
-                    os.remove(DOWNLOAD_STATE_PATH)
-            except Exception:
-                pass
-            return
-        state = {
-            "version": DOWNLOAD_STATE_VERSION,
-            "saved_at": time.time(),
-            "items": active_items,
-        }
-        os.makedirs(os.path.dirname(DOWNLOAD_STATE_PATH), exist_ok=True)
-        tmp_path = DOWNLOAD_STATE_PATH + ".tmp"
-        with open(tmp_path, "w") as f:
-            json.dump(state, f)
-        os.replace(tmp_path, DOWNLOAD_STATE_PATH)
-    except Exception as e:
-        print(f"[DEBUG] Failed to persist download state: {e}")
+def _check_model_structure(paths: list):
+    corrupt = [path for path in paths if structural_problem(path)]
+    if corrupt:
+        print(
+            f"[DEBUG] Startup check: {len(corrupt)} of {len(paths)} model file(s) look corrupt; "
+            "see /download_stats or the model explorer"
+        )
+
+
+def _requeue_retry_payload(payload: dict, original_id: str = "") -> str:
+    """Queue a new download from a stored retry payload and return its download id."""
+    new_id = f"dl_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+    item = dict(payload)
+    item["download_id"] = new_id
+    item["filename"] = item.get("filename") or item.get("display_name") or "download"
+    item["display_name"] = item.get("display_name") or item.get("filename") or "download"
+    item["folder"] = item.get("folder") or "checkpoints"
+    item["download_mode"] = item.get("download_mode") or "file"
+    destination_key = _download_destination_key(item)
+    item["destination_key"] = destination_key
+    retry_payload = _build_retry_payload(item)
+    with download_queue_lock:
+        download_queue.append(item)
+    fields = {
+        "status": "queued",
+        "filename": item["filename"],
+        "display_name": item["display_name"],
+        "folder": item["folder"],
+        "download_mode": item["download_mode"],
+        "destination_key": destination_key,
+        "retry_payload": retry_payload,
+        "queued_at": time.time(),
+    }
+    if original_id:
+        fields["original_download_id"] = original_id
+    _set_download_status(new_id, fields)
+    return new_id
 
 
 def _load_interrupted_downloads():
-    """Load previously active downloads as 'interrupted' entries for the UI."""
-    if not os.path.exists(DOWNLOAD_STATE_PATH):
-        return
+    """
+    Restore downloads that were active when the previous session ended. With
+    AUTO_RESUME_INTERRUPTED they are queued again straight away (partial bytes on
+    disk are picked up by the downloaders); otherwise they are listed as
+    'interrupted' entries for the UI.
+    """
     try:
-        with open(DOWNLOAD_STATE_PATH, "r") as f:
-            state = json.load(f)
-        items = state.get("items", [])
-        if not items:
+        records = download_state_store.load()
+        if not records:
             return
-        with download_status_lock:
-            for item in items:
-                old_id = item.get("download_id", "")
-                new_id = f"resumed_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
-                download_status[new_id] = {
-                    "status": "interrupted",
-                    "filename": item.get("filename", ""),
-                    "display_name": item.get("display_name", ""),
-                    "folder": item.get("folder", ""),
-                    "download_mode": item.get("download_mode", "file"),
-                    "destination_key": item.get("destination_key", ""),
-                    "total_bytes": item.get("total_bytes"),
-                    "retry_payload": item.get("retry_payload"),
-                    "interrupted_at": time.time(),
-                    "original_download_id": old_id,
-                }
-        print(f"[DEBUG] Loaded {len(items)} interrupted download(s) from previous session")
+        items = [dict(record, download_id=download_id) for download_id, record in records.items()]
+        resumed = 0
+        for item in items:
+            old_id = item.get("download_id", "")
+            payload = item.get("retry_payload")
+            download_state_store.delete(old_id)
+            if AUTO_RESUME_INTERRUPTED and isinstance(payload, dict) and payload:
+                _requeue_retry_payload(payload, original_id=item.get("original_download_id") or old_id)
+                resumed += 1
+                continue
+            new_id = f"resumed_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+            _set_download_status(new_id, {
+                "status": "interrupted",
+                "filename": item.get("filename", ""),
+                "display_name": item.get("display_name", ""),
+                "folder": item.get("folder", ""),
+                "download_mode": item.get("download_mode", "file"),
+                "destination_key": item.get("destination_key", ""),
+                "total_bytes": item.get("total_bytes"),
+                "retry_payload": payload,
+                "interrupted_at": time.time(),
+                "original_download_id": item.get("original_download_id") or old_id,
+            })
+        print(f"[DEBUG] Loaded {len(items)} interrupted download(s) from previous session ({resumed} resumed)")
+        if resumed:
+            _start_download_worker()
     except Exception as e:
         print(f"[DEBUG] Failed to load interrupted downloads: {e}")
-    finally:
+
+
+def _iter_indexable_model_files():
+    seen = set()
+    for scan_dir in _model_scan_dirs():
+        for dirpath, dirnames, filenames in os.walk(scan_dir):
+            # Skip staging folders and other hidden state.
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for fname in filenames:
+                if fname.startswith(".") or not fname.lower().endswith(_ORPHAN_MODEL_EXTENSIONS):
+                    continue
+                fpath = os.path.realpath(os.path.join(dirpath, fname))
+                if fpath not in seen:
+                    seen.add(fpath)
+                    yield fpath
+
+
+def _content_indexer_loop():
+    time.sleep(CONTENT_INDEX_START_DELAY_SECONDS)
+    while True:
         try:
-            os.remove(DOWNLOAD_STATE_PATH)
-        except Exception:
-            pass
+            added = index_files(
+                _iter_indexable_model_files(),
+                should_pause=lambda: download_scheduler.running() > 0 or verification_scheduler.running() > 0,
+            )
+            if added:
+                print(f"[DEBUG] Content index: hashed {added} local model file(s)")
+        except Exception as e:
+            print(f"[DEBUG] Content index scan failed: {e}")
+        time.sleep(CONTENT_INDEX_RESCAN_SECONDS)
+
+
+def _start_content_indexer():
+    global content_indexer_started
+    if content_indexer_started or not CONTENT_INDEX_BACKGROUND:
+        return
+    content_indexer_started = True
+    threading.Thread(target=_content_indexer_loop, name="hf-content-index", daemon=True).start()
 
 
 def setup(app_or_server):
     # --- Download crash protection: startup recovery ---
     _cleanup_orphaned_download_files()
     _load_interrupted_downloads()
+    _start_content_indexer()
 
     def _safe_add_route(method: str, path: str, handler):
         try:
@@ -3121,8 +3543,10 @@ def setup(app_or_server):
                     continue
                 item["destination_key"] = destination_key
                 retry_payload = _build_retry_payload(item)
-                
-                if download_mode == "file":
+                shard_key = _shard_set_key_for_item(item) if download_mode == "file" else ""
+
+                # A shard set appears in the model folder only once all of it is there.
+                if download_mode == "file" and not shard_key:
                     try:
                         target_dir = resolve_target_dir(folder)
                         os.makedirs(target_dir, exist_ok=True)
@@ -3143,12 +3567,11 @@ def setup(app_or_server):
                     "download_mode": download_mode,
                     "destination_key": destination_key,
                     "retry_payload": retry_payload,
+                    "shard_set": shard_key.split("|", 1)[-1] or None,
                     "queued_at": time.time()
                 })
                 queued.append({"download_id": download_id, "filename": filename})
 
-            if queued:
-                _touch_queue_activity()
             _start_download_worker()
             return web.json_response({"queued": queued, "rejected": rejected})
         except Exception as e:
@@ -3231,15 +3654,46 @@ def setup(app_or_server):
         return web.json_response({"status": "cancelled", "download_id": download_id})
 
     async def download_status_endpoint(request):
-        """Get current status of downloads."""
+        """
+        Get current status of downloads. With ?since=<version> only entries changed
+        after that version are returned (plus removed ids), or 304 if nothing changed.
+        """
         ids_param = request.query.get("ids", "")
         ids = [x for x in ids_param.split(",") if x]
+        since_param = request.query.get("since")
+        if since_param is not None:
+            try:
+                since = int(since_param)
+            except ValueError:
+                since = -1
+            if since == download_status_version:
+                return web.Response(status=304)
+            return web.json_response(_download_status_delta(since, ids))
         with download_status_lock:
             if ids:
                 filtered = {i: download_status.get(i) for i in ids if i in download_status}
             else:
                 filtered = dict(download_status)
-        return web.json_response({"downloads": filtered})
+            version = download_status_version
+        return web.json_response({"downloads": filtered, "version": version})
+
+    async def download_stats_endpoint(request):
+        """Counters from the downloader's caches and worker pool, for diagnostics."""
+        return web.json_response({
+            "access_cache": get_access_cache_stats(),
+            "repo_metadata": get_repo_metadata_stats(),
+            "hub_workers": get_hub_worker_stats(),
+            "scheduler": download_scheduler.stats(),
+            "verification": verification_scheduler.stats(),
+            "state_journal": download_state_store.stats(),
+            "rate_limit": rate_limiter.stats(),
+            "disk_space": get_disk_space_stats(),
+            "content_index": get_content_index_stats(),
+            "leases": get_download_lease_stats(),
+            "mirrors": get_mirror_stats(),
+            "http": get_http_pool_stats(),
+            "integrity": get_integrity_stats(),
+        })
 
     async def search_status_endpoint(request):
         request_id = request.query.get("request_id", "")
@@ -3655,9 +4109,7 @@ def setup(app_or_server):
                 "URL must target a specific Hugging Face file (resolve/blob/file).",
             )
 
-        remote_filename = parsed["file"]
-        if parsed.get("subfolder"):
-            remote_filename = f"{parsed['subfolder'].strip('/')}/{parsed['file']}"
+        remote_filename = _parsed_remote_filename(parsed)
         size, _, _ = get_remote_file_metadata(
             parsed["repo"],
             remote_filename,
@@ -3806,13 +4258,12 @@ def setup(app_or_server):
             else:
                 to_remove = []
             for did in to_remove:
-                download_status.pop(did, None)
+                _remove_download_status_locked(did)
                 dismissed.append(did)
-        # Clean up the state file if no interrupted items remain
-        try:
-            _persist_download_state()
-        except Exception:
-            pass
+        if dismissed:
+            _push_download_status({}, dismissed)
+        for did in dismissed:
+            download_state_store.delete(did)
         return web.json_response({"dismissed": dismissed})
 
     async def resume_interrupted(request):
@@ -3836,31 +4287,13 @@ def setup(app_or_server):
                 payload = info.get("retry_payload")
                 if payload and isinstance(payload, dict):
                     to_resume.append((did, payload))
-                    download_status.pop(did, None)
+                    _remove_download_status_locked(did)
+        if to_resume:
+            _push_download_status({}, [did for did, _ in to_resume])
         queued_ids = []
         for old_id, payload in to_resume:
-            new_id = f"dl_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
-            item = dict(payload)
-            item["download_id"] = new_id
-            item["filename"] = item.get("filename") or item.get("display_name") or "download"
-            item["display_name"] = item.get("display_name") or item.get("filename") or "download"
-            item["folder"] = item.get("folder") or "checkpoints"
-            item["download_mode"] = item.get("download_mode") or "file"
-            destination_key = _download_destination_key(item)
-            item["destination_key"] = destination_key
-            retry_payload = _build_retry_payload(item)
-            with download_queue_lock:
-                download_queue.append(item)
-            _set_download_status(new_id, {
-                "status": "queued",
-                "filename": item["filename"],
-                "display_name": item["display_name"],
-                "folder": item["folder"],
-                "download_mode": item["download_mode"],
-                "destination_key": destination_key,
-                "retry_payload": retry_payload,
-                "queued_at": time.time(),
-            })
+            download_state_store.delete(old_id)
+            new_id = _requeue_retry_payload(payload)
             queued_ids.append({"download_id": new_id, "original_id": old_id})
         if queued_ids:
             _start_download_worker()
@@ -3878,6 +4311,9 @@ def setup(app_or_server):
     _safe_add_route("POST", "/dismiss_interrupted", dismiss_interrupted)
     _safe_add_route("POST", "/resume_interrupted", resume_interrupted)
     _safe_add_route("GET", "/download_status", download_status_endpoint)
+    _safe_add_route("GET", "/download_stats", download_stats_endpoint)
+    _safe_add_route("GET", f"{MIRROR_ROUTE}/sha256/{{sha}}", mirror_file_by_sha)
+    _safe_add_route("GET", f"{MIRROR_ROUTE}/url", mirror_file_by_url)
     _safe_add_route("GET", "/search_status", search_status_endpoint)
     _safe_add_route("GET", "/model_library", model_library_endpoint)
     _safe_add_route("GET", MODEL_LIBRARY_ASSET_ROUTE_BASE, hf_model_library_assets_list)
@@ -4344,6 +4780,10 @@ async def model_explorer_list_groups(request):
                 "local_only": bool(row.get("local_only")),
                 "installed": bool(installed_info.get("installed")),
                 "model_path": installed_info.get("widget_path"),
+                "integrity_problem": (
+                    structural_problem(str(installed_info.get("absolute_path") or ""))
+                    if installed_info.get("installed") else None
+                ),
             }
             grouped[group_key]["variants"].append(variant)
             if variant["installed"]: